@@ -0,0 +1,209 @@
+"""
+Micro-benchmarks for the CPU-side hot paths of each agent: item extraction,
+catalog lookup, cart totals and summaries, document selection, knowledge
+chunk retrieval, JSON repair of guard and classifier output, and Mistral
+prompt formatting.
+
+    python -m benchmarks.bench_agents
+    python -m benchmarks.bench_agents --save-baseline benchmarks/bench_agents_baseline.json
+    python -m benchmarks.bench_agents --check benchmarks/bench_agents_baseline.json --threshold 0.25
+
+With --check, the run exits with status 1 when any case is slower than the
+baseline by more than the threshold, so catalog growth or a slower parser
+shows up before it reaches every turn.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+from python_code.api.agents.fake_bedrock import FakeBedrockRuntime
+from python_code.api.agents.order_taking_agent import OrderTakingAgent
+from python_code.api.agents.details_agent import DetailsAgent
+from python_code.api.agents.guard_agent import GuardAgent
+from python_code.api.agents.classification_agent import ClassificationAgent
+from python_code.api.agents.knowledge_index import KnowledgeIndex
+from python_code.api.agents.utils import _build_request_body
+
+SHORT_MESSAGES = ["add 2 peace lily", "how much is aloe vera", "checkout"]
+LONG_MESSAGES = [
+    "Hi! I'd like to order 2 peace lily, 3 aloe vera and 1 snake plant for my new flat, and could you "
+    "also tell me whether the rubber tree does well in low light? " * 3,
+    "what are your store timings and do you deliver to my area, I am looking for a gift that is easy "
+    "to care for and the price should not be too high " * 3,
+]
+
+GUARD_OUTPUTS = [
+    '{"chain_of_thought": "Plant question", "decision": "allowed", "message": ""}',
+    'Sure! Here is my answer:\n```json\n{"chain_of_thought": "Off topic", "decision": "not allowed", '
+    '"message": "I can only help with plants",}\n```\nLet me know if you need anything else.',
+    "I think this is allowed because the user asks about plants, decision: allowed",
+]
+CLASSIFIER_OUTPUTS = [
+    '{"chain_of_thought": "Wants to buy", "decision": "order_taking_agent", "message": ""}',
+    "```\n{'chain_of_thought': 'Asks the price', 'decision': 'details_agent', 'message': ''}\n```",
+    "decision => details agent",
+]
+
+PLANT_WORDS = ["Lily", "Fern", "Palm", "Cactus", "Ivy", "Orchid", "Basil", "Mint", "Tulsi", "Jade",
+               "Aloe", "Ficus", "Rose", "Jasmine", "Begonia", "Calathea", "Pothos", "Yucca"]
+ADJECTIVES = ["Golden", "Dwarf", "Variegated", "Giant", "Red", "Silver", "Weeping", "Creeping",
+              "Wild", "Royal", "Painted", "Velvet", "Blue", "Marble", "Miniature", "Fragrant"]
+
+
+def make_catalog(size, agent, seed=7):
+    """The agent's real catalog followed by synthetic products up to `size` entries"""
+    products = list(agent.products[:size])
+    categories = {category: list(names) for category, names in agent.product_categories.items()}
+    rng = random.Random(seed)
+    for index in range(len(products), size):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(PLANT_WORDS)} {rng.choice(PLANT_WORDS)} {index}"
+        products.append({"name": name, "price": rng.choice([50, 100, 150, 200, 300])})
+        categories.setdefault(rng.choice(list(categories)), []).append(name)
+    return products, categories
+
+
+def make_cart(lines, products, seed=7):
+    rng = random.Random(seed)
+    cart = []
+    for product in rng.sample(products, min(lines, len(products))):
+        cart.append({"category": "Plants", "name": product["name"], "price": product["price"],
+                     "quantity": rng.randint(1, 5)})
+    return cart
+
+
+def make_history(turns):
+    messages = [{"role": "system", "content": "You are a helpful plant shop assistant. " * 20}]
+    for index in range(turns):
+        messages.append({"role": "user", "content": LONG_MESSAGES[index % len(LONG_MESSAGES)]})
+        messages.append({"role": "assistant", "content": "Here is what I found for you. " * 10})
+    return messages
+
+
+def measure(fn, min_time=0.05, repeats=5):
+    """Best per-call time in microseconds over several auto-sized runs"""
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or iterations >= 1_000_000:
+            break
+        iterations *= 10 if elapsed < min_time / 10 else 2
+    best = elapsed / iterations
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        best = min(best, (time.perf_counter() - started) / iterations)
+    return best * 1e6
+
+
+def cases(catalog_sizes, cart_sizes):
+    """Yield (name, callable) for every benchmark case"""
+    client = FakeBedrockRuntime(latency_ms=0)
+    order_agent = OrderTakingAgent(client=client)
+    details_agent = DetailsAgent(client=client)
+    guard_agent = GuardAgent(client=client)
+    classification_agent = ClassificationAgent(client=client)
+
+    real_catalog = OrderTakingAgent(client=client)
+    for size in catalog_sizes:
+        order_agent.products, order_agent.product_categories = make_catalog(size, real_catalog)
+        products = order_agent.products
+        for length, messages in (("short", SHORT_MESSAGES), ("long", LONG_MESSAGES)):
+            yield (f"order.extract_items/catalog={size}/{length}",
+                   lambda messages=messages: [order_agent._extract_items(m) for m in messages])
+        last = products[-1]["name"]
+        yield (f"order.find_product/catalog={size}/exact_last",
+               lambda last=last: order_agent._find_product_in_catalog(last))
+        yield (f"order.find_product/catalog={size}/missing",
+               lambda: order_agent._find_product_in_catalog("blue moon orchid of the andes"))
+
+    for lines in cart_sizes:
+        cart = make_cart(lines, order_agent.products)
+        yield (f"order.calculate_total/cart={lines}",
+               lambda cart=cart: order_agent._calculate_total(cart, ["WELCOME10", "FREESHIP"]))
+        totals = order_agent._calculate_total(cart, ["WELCOME10"])
+        yield (f"order.format_cart_summary/cart={lines}",
+               lambda cart=cart, totals=totals: order_agent._format_cart_summary(cart, totals))
+
+    for length, messages in (("short", SHORT_MESSAGES), ("long", LONG_MESSAGES)):
+        yield (f"details.select_documents/{length}",
+               lambda messages=messages: [details_agent._select_relevant_documents(m) for m in messages])
+        # Misspelt words take the BM25 intent index
+        typos = [m.replace("price", "prise").replace("store", "stroe") for m in messages]
+        yield (f"details.select_documents/{length}_typos",
+               lambda typos=typos: [details_agent._select_relevant_documents(m) for m in typos])
+
+    documents = {name: data["content"] for name, data in details_agent.knowledge_base.items()}
+    for retrieval in ("bm25", "hybrid"):
+        index = KnowledgeIndex(documents, retrieval=retrieval)
+        for length, messages in (("short", SHORT_MESSAGES), ("long", LONG_MESSAGES)):
+            yield (f"knowledge.search/{retrieval}/{length}",
+                   lambda index=index, messages=messages: [index.search(m) for m in messages])
+
+    yield "guard.clean_json_output", lambda: [guard_agent.clean_json_output(o) for o in GUARD_OUTPUTS]
+    yield ("classification.clean_json_output",
+           lambda: [classification_agent.clean_json_output(o) for o in CLASSIFIER_OUTPUTS])
+
+    for turns in (1, 10, 50):
+        history = make_history(turns)
+        yield f"utils.format_prompt/turns={turns}", lambda history=history: _build_request_body(history, 0.2, 512)
+
+
+def compare(results, baseline, threshold):
+    """Cases slower than the baseline by more than `threshold` (a fraction)"""
+    regressions = []
+    for name, micros in results.items():
+        before = baseline.get(name)
+        if before and micros > before * (1 + threshold):
+            regressions.append((name, before, micros))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark the agents' local hot paths")
+    parser.add_argument("--catalog-sizes", type=int, nargs="*", default=[40, 1000, 100000])
+    parser.add_argument("--cart-sizes", type=int, nargs="*", default=[1, 50, 500])
+    parser.add_argument("--filter", default=None, help="Only run cases whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Seconds per timed run")
+    parser.add_argument("--save-baseline", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--check", default=None, help="Baseline JSON to check against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown for --check (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.check:
+        with open(args.check, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    print(f"{'case':<52} {'us/call':>12} {'baseline':>12} {'change':>8}")
+    for name, fn in cases(args.catalog_sizes, args.cart_sizes):
+        if args.filter and args.filter not in name:
+            continue
+        micros = measure(fn, args.min_time)
+        results[name] = round(micros, 3)
+        before = baseline.get(name)
+        change = f"{micros / before - 1:+.0%}" if before else ""
+        print(f"{name:<52} {micros:>12.1f} {before if before else '':>12} {change:>8}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+        print(f"\nbaseline saved to {args.save_baseline}")
+
+    if args.check:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}:")
+            for name, before, after in regressions:
+                print(f"  {name}: {before:.1f} -> {after:.1f} us/call")
+            sys.exit(1)
+        print(f"\nno regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare building the guard and classifier prompts from a deep copy of the
+history with building them from a read-only MessageView.
+
+    python -m benchmarks.bench_history --sizes 10 100 1000
+"""
+import time
+import argparse
+from copy import deepcopy
+from python_code.api.agents.history import MessageView
+
+
+def make_history(size, cart_items=20):
+    """Alternating user and assistant messages; replies carry cart memory"""
+    cart = [{"category": "Plants", "name": f"Plant {i}", "price": 100, "quantity": 2} for i in range(cart_items)]
+    messages = []
+    for i in range(size):
+        if i % 2 == 0:
+            messages.append({"role": "user", "content": f"add 2 of plant {i} to my cart"})
+        else:
+            messages.append({
+                "role": "assistant",
+                "content": "I've added them to your cart.",
+                "memory": {"agent": "order_taking_agent", "action": "add_to_cart",
+                           "cart": deepcopy(cart), "discount_codes": ["WELCOME10"]}
+            })
+    return messages
+
+
+def with_deepcopy(messages, window):
+    copied = deepcopy(messages)
+    return [{"role": "system", "content": "prompt"}] + copied[-window:]
+
+
+def with_view(messages, window):
+    return [{"role": "system", "content": "prompt"}, *MessageView(messages, window=window)]
+
+
+def timed(fn, messages, window, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(messages, window)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark history copies against read-only views")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10, 100, 1000])
+    parser.add_argument("--cart-items", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} {'agent':>15} {'deepcopy us':>12} {'view us':>9} {'speedup':>8}")
+    for size in args.sizes:
+        messages = make_history(size, args.cart_items)
+        for agent, window in (("guard", 3), ("classification", 5)):
+            copy_us = timed(with_deepcopy, messages, window, args.iterations)
+            view_us = timed(with_view, messages, window, args.iterations)
+            print(f"{size:>8} {agent:>15} {copy_us:>12.1f} {view_us:>9.2f} {copy_us / view_us:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare the shared KeywordEngine with the per-site keyword scans it replaced.
+
+    python -m benchmarks.bench_keywords --iterations 20000 --large 1000 10000
+"""
+import re
+import time
+import random
+import string
+import argparse
+from python_code.api.agents.keyword_engine import KeywordEngine, get_keyword_engine
+
+
+MESSAGES = [
+    "hi",
+    "What are your store timings?",
+    "how much does the snake plant cost",
+    "add 2 peace lily and a jade plant to my cart please",
+    "I'd like to checkout now, apply code WELCOME10",
+    "Can you recommend a plant for a low light bedroom that is easy to care for and safe for pets?",
+    "what have I added so far? show me the items in my basket " * 4,
+]
+
+PRICE_KEYWORDS = {'price', 'cost', 'rate', 'pricing', 'prince', 'pice', 'how much', 'hw much', 'amount', '$$'}
+STORE_KEYWORDS = {
+    'store', 'shop', 'location', 'address', 'hour', 'time', 'timing', 'timmings', 'opening', 'close',
+    'deliver', 'delivery', 'about', 'locate', 'branch', 'outlet', 'schedule', 'openhour'
+}
+
+
+def legacy_scans(message):
+    """The checks one turn used to run: router, details agent and order agent"""
+    lower = message.lower()
+    words = set(lower.split())
+    return (
+        any(kw in lower for kw in ["order", "buy", "purchase", "add", "cart", "checkout"]),
+        any(kw in message.lower() for kw in ["order", "buy", "purchase", "add to cart", "checkout"]),
+        any(word in PRICE_KEYWORDS for word in words),
+        any(word in STORE_KEYWORDS for word in words),
+        bool(re.search(r'\b(checkout|place\s+order|pay|finish|complete\s+order)\b', message.lower())),
+        bool(re.search(r'\b(cart|basket|order|what.*added|what.*ordered|show.*items)\b', message.lower())),
+    )
+
+
+def timed(fn, messages, iterations):
+    started = time.perf_counter()
+    for i in range(iterations):
+        fn(messages[i % len(messages)])
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def synthetic_intents(size, intents=6, seed=3):
+    rng = random.Random(seed)
+    word = lambda: "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+    return {f"intent_{i}": [word() for _ in range(size)] for i in range(intents)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the keyword/intent engine")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--large", type=int, nargs="*", default=[100, 1000, 10000],
+                        help="Synthetic keywords per intent for the large-set comparison")
+    args = parser.parse_args()
+
+    engine = get_keyword_engine()
+    print("bundled keyword lists (one turn's checks), microseconds per message:")
+    print(f"  legacy scans:   {timed(legacy_scans, MESSAGES, args.iterations):8.2f}")
+    print(f"  keyword engine: {timed(engine.match, MESSAGES, args.iterations):8.2f}")
+
+    for size in args.large:
+        intents = synthetic_intents(size)
+        started = time.perf_counter()
+        large_engine = KeywordEngine(intents)
+        compile_ms = (time.perf_counter() - started) * 1000
+        lists = list(intents.values())
+        scan = lambda message: [any(kw in message.lower() for kw in keywords) for keywords in lists]
+        iterations = max(100, args.iterations // max(1, size // 10))
+        print(f"{len(intents)} intents x {size} keywords (engine compile {compile_ms:.1f} ms), microseconds per message:")
+        print(f"  any(kw in text): {timed(scan, MESSAGES, iterations):10.2f}")
+        print(f"  keyword engine:  {timed(large_engine.match, MESSAGES, iterations):10.2f}")
+
+
+if __name__ == "__main__":
+    main()
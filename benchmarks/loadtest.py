@@ -0,0 +1,290 @@
+"""
+Replay multi-turn conversations against RouterAgent (in this process) or
+the HTTP service and report throughput, latency percentiles per stage and
+per agent, errors and the routing distribution.
+
+    python -m benchmarks.loadtest --conversations 200 --concurrency 16
+    python -m benchmarks.loadtest --rate 20 --fake-latency-ms 300
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --concurrency 32
+    python -m benchmarks.loadtest --compare benchmarks/results/<earlier run>.json
+
+The corpus is JSONL, one conversation per line:
+{"id": "...", "turns": ["first user message", "second", ...]}
+
+Each run is saved as JSON under benchmarks/results/ so later runs can be
+compared against it with --compare.
+"""
+import os
+import json
+import time
+import uuid
+import argparse
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "conversations.jsonl")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def load_corpus(path):
+    conversations = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, list):
+                entry = {"turns": entry}
+            conversations.append({"id": entry.get("id", str(len(conversations))), "turns": entry["turns"]})
+    return conversations
+
+
+def percentiles(values):
+    """Nearest-rank p50/p95/p99 in milliseconds"""
+    if not values:
+        return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    ordered = sorted(values)
+    pick = lambda p: round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3)
+    return {"count": len(ordered), "p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99)}
+
+
+class InProcessTarget:
+    """Runs turns through a RouterAgent in this process"""
+    name = "in_process"
+
+    def __init__(self):
+        from python_code.api.agents.router import RouterAgent
+        from python_code.api.agents.tracing import get_tracer
+
+        self.router = RouterAgent()
+        get_tracer().reset()
+
+    def start(self, conversation_id):
+        from python_code.api.agents.session_state import ConversationState
+        return {"messages": [], "state": ConversationState()}
+
+    def send(self, session, content):
+        session["messages"].append({"role": "user", "content": content})
+        try:
+            response = self.router.process_message(session["messages"], state=session["state"])
+        except Exception:
+            session["messages"].pop()
+            raise
+        session["messages"].append(response)
+        return response
+
+    def finish(self, session):
+        pass
+
+    def stage_stats(self):
+        return self.router.latency_report()
+
+
+class HTTPTarget:
+    """Runs turns through the HTTP service with ChatClient"""
+    name = "http"
+
+    def __init__(self, url, timeout=60):
+        from python_code.api.client import ChatClient
+        self.client = ChatClient(url, timeout=timeout)
+        self.run_id = uuid.uuid4().hex[:8]
+
+    def start(self, conversation_id):
+        return {"session_id": f"loadtest-{self.run_id}-{conversation_id}"}
+
+    def send(self, session, content):
+        return self.client.send_message(session["session_id"], content)
+
+    def finish(self, session):
+        try:
+            self.client.delete_session(session["session_id"])
+        except RuntimeError:
+            pass
+
+    def stage_stats(self):
+        # Server-side histograms cover everything since the server started
+        stats = self.client.stats()
+        if "latency" in stats:
+            return stats["latency"]
+        return {f"worker{worker['worker']}/{stage}": values
+                for worker in stats.get("workers", [])
+                for stage, values in worker.get("latency", {}).items()}
+
+
+def run(target, corpus, conversations, concurrency, rate=None):
+    """
+    Replay `conversations` conversations, cycling through the corpus.
+
+    Without a rate, `concurrency` conversations run back to back (closed
+    loop). With a rate, conversations start at a fixed number per second
+    regardless of how fast earlier ones finish (open loop), and the report
+    includes how late they started when the pool was saturated.
+    """
+    lock = threading.Lock()
+    turn_latencies = []
+    agent_latencies = defaultdict(list)
+    routes = Counter()
+    errors = Counter()
+    start_delays = []
+
+    def replay(index, scheduled_at):
+        conversation = corpus[index % len(corpus)]
+        if scheduled_at is not None:
+            with lock:
+                start_delays.append(max(0.0, time.perf_counter() - scheduled_at))
+        session = target.start(f"{conversation['id']}-{index}")
+        for content in conversation["turns"]:
+            started = time.perf_counter()
+            try:
+                response = target.send(session, content)
+            except Exception as e:
+                with lock:
+                    errors[type(e).__name__] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            agent = response.get("memory", {}).get("agent", "unknown")
+            with lock:
+                turn_latencies.append(elapsed)
+                agent_latencies[agent].append(elapsed)
+                routes[agent] += 1
+        target.finish(session)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for index in range(conversations):
+            scheduled_at = None
+            if rate:
+                scheduled_at = started + index / rate
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(replay, index, scheduled_at))
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    turns = len(turn_latencies)
+    failed = sum(errors.values())
+    report = {
+        "turns": turns,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_turns_per_s": round(turns / elapsed, 2) if elapsed else 0.0,
+        "latency": percentiles(turn_latencies),
+        "agents": {agent: percentiles(values) for agent, values in sorted(agent_latencies.items())},
+        "stages": target.stage_stats(),
+        "errors": {"count": failed, "rate": round(failed / (turns + failed), 4) if turns + failed else 0.0,
+                   "by_type": dict(errors)},
+        "routing": {agent: {"count": count, "share": round(count / turns, 4)} for agent, count in routes.most_common()},
+    }
+    if rate:
+        report["start_delay"] = percentiles(start_delays)
+    return report
+
+
+def print_report(result):
+    report = result["report"]
+    config = result["config"]
+    print(f"\ntarget={config['target']} runtime={config['runtime']} conversations={config['conversations']} "
+          f"concurrency={config['concurrency']} rate={config['rate']}")
+    print(f"turns: {report['turns']} in {report['elapsed_s']:.2f}s ({report['throughput_turns_per_s']:.1f} turns/s)")
+    latency = report["latency"]
+    print(f"turn latency ms: p50={latency['p50_ms']:.1f} p95={latency['p95_ms']:.1f} p99={latency['p99_ms']:.1f}")
+    if "start_delay" in report:
+        delay = report["start_delay"]
+        print(f"start delay ms: p50={delay['p50_ms']:.1f} p95={delay['p95_ms']:.1f} p99={delay['p99_ms']:.1f}")
+    errors = report["errors"]
+    print(f"errors: {errors['count']} ({errors['rate']:.2%}) {errors['by_type'] or ''}")
+
+    print("\nper agent:")
+    for agent, stats in report["agents"].items():
+        share = report["routing"].get(agent, {}).get("share", 0.0)
+        print(f"  {agent:<24} n={stats['count']:<6} {share:>6.1%}  p50={stats['p50_ms']:.1f} "
+              f"p95={stats['p95_ms']:.1f} p99={stats['p99_ms']:.1f} ms")
+    print("\nper stage:")
+    for stage, stats in report["stages"].items():
+        print(f"  {stage:<32} n={stats['count']:<6} p50={stats['p50_ms']:.1f} "
+              f"p95={stats['p95_ms']:.1f} p99={stats['p99_ms']:.1f} ms")
+
+
+def save(result, path=None):
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def compare(baseline, current):
+    """Print how the current run moved against a saved one"""
+    def delta(old, new):
+        return f"{new - old:+.1f} ({(new - old) / old:+.1%})" if old else f"{new - old:+.1f}"
+
+    old, new = baseline["report"], current["report"]
+    print(f"\ncompared with {baseline['started_at']} ({baseline['config']['target']}, {baseline['config']['runtime']}):")
+    print(f"  throughput turns/s  {old['throughput_turns_per_s']:.1f} -> {new['throughput_turns_per_s']:.1f}  "
+          f"{delta(old['throughput_turns_per_s'], new['throughput_turns_per_s'])}")
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        print(f"  turn {key:<14} {old['latency'][key]:.1f} -> {new['latency'][key]:.1f}  "
+              f"{delta(old['latency'][key], new['latency'][key])}")
+    print(f"  error rate          {old['errors']['rate']:.2%} -> {new['errors']['rate']:.2%}")
+    for stage in sorted(set(old["stages"]) & set(new["stages"])):
+        before, after = old["stages"][stage]["p95_ms"], new["stages"][stage]["p95_ms"]
+        print(f"  {stage + ' p95':<19} {before:.1f} -> {after:.1f}  {delta(before, after)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay conversations against RouterAgent or the HTTP service")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSONL file of conversations")
+    parser.add_argument("--conversations", type=int, default=100, help="Conversations to replay (cycles the corpus)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Conversations in flight at once")
+    parser.add_argument("--rate", type=float, default=None, help="Start this many conversations per second")
+    parser.add_argument("--url", default=None, help="Replay against the HTTP service instead of in-process")
+    parser.add_argument("--runtime", choices=["fake", "bedrock"], default="fake",
+                        help="Bedrock client for in-process runs")
+    parser.add_argument("--fake-latency-ms", type=float, default=None, help="FAKE_BEDROCK_LATENCY_MS for the fake runtime")
+    parser.add_argument("--output", default=None, help="Where to save the result (default: benchmarks/results/)")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--compare", default=None, help="Saved result to compare against")
+    args = parser.parse_args()
+
+    if args.url is None:
+        # Must be set before the router builds its Bedrock client
+        if args.runtime == "fake":
+            os.environ["BEDROCK_RUNTIME"] = "fake"
+            if args.fake_latency_ms is not None:
+                os.environ["FAKE_BEDROCK_LATENCY_MS"] = str(args.fake_latency_ms)
+        else:
+            os.environ.pop("BEDROCK_RUNTIME", None)
+
+    corpus = load_corpus(args.corpus)
+    target = HTTPTarget(args.url) if args.url else InProcessTarget()
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    report = run(target, corpus, args.conversations, args.concurrency, args.rate)
+    result = {
+        "started_at": started_at,
+        "config": {
+            "target": args.url or target.name,
+            "runtime": "server" if args.url else args.runtime,
+            "corpus": os.path.basename(args.corpus),
+            "conversations": args.conversations,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "fake_latency_ms": args.fake_latency_ms,
+        },
+        "report": report,
+    }
+
+    print_report(result)
+    if not args.no_save:
+        print(f"\nsaved to {save(result, args.output)}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
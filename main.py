@@ -1,8 +1,16 @@
 # main.py
+import os
+import uuid
 import streamlit as st
 from python_code.api.agents.router import RouterAgent
+from python_code.api.agents.session_state import ConversationState
+from python_code.api.client import ChatClient
 import json
 
+# When set, the app is a client of the HTTP service (python_code/api/server.py)
+# instead of running the agents in this process
+API_URL = os.getenv("PLANTIFY_API_URL")
+
 
 # Modified CSS with better contrast
 # Set page configuration first
@@ -73,12 +81,24 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize session state
+@st.cache_resource
+def get_router():
+    """One router per process: its agents, knowledge index and clients are shared by all sessions"""
+    return RouterAgent()
+
+
 if "messages" not in st.session_state:
     st.session_state.messages = [
         {"role": "assistant", "content": "Hi there! I'm Plantify 🌿, your plant shopping assistant. 🌸 How can I help you today?"}
     ]
-if "router" not in st.session_state:
-    st.session_state.router = RouterAgent()
+if API_URL:
+    if "api_client" not in st.session_state:
+        st.session_state.api_client = ChatClient(API_URL)
+        st.session_state.session_id = uuid.uuid4().hex
+else:
+    if "conversation_state" not in st.session_state:
+        # Cart and routing context, updated incrementally by the router
+        st.session_state.conversation_state = ConversationState.from_messages(st.session_state.messages)
 
 # Display chat messages
 for message in st.session_state.messages:
@@ -104,23 +124,25 @@ if user_input:
     with st.chat_message("user", avatar="👤"):
         st.markdown(user_input)
 
-    # Get bot response with loading animation
-    with st.spinner("🌱 Growing a response..."):
+    # Stream bot response, with a loading animation while the message is routed
+    with st.chat_message("assistant", avatar="🌻"):
         try:
-            response = st.session_state.router.process_message(st.session_state.messages)
+            with st.spinner("🌱 Growing a response..."):
+                if API_URL:
+                    response = st.session_state.api_client.stream_message(st.session_state.session_id, user_input)
+                else:
+                    response = get_router().stream_message(
+                        st.session_state.messages, state=st.session_state.conversation_state
+                    )
+            response["content"] = st.write_stream(response["content"])
         except Exception as e:
             response = {
                 "role": "assistant",
                 "content": "🌧️ Oops! There was a little shower of problems. Please try again!",
                 "memory": {"error": str(e)}
             }
+            st.markdown(response["content"])
 
-    # Add assistant response to chat history
-    st.session_state.messages.append(response)
-
-    # Display assistant response
-    with st.chat_message("assistant", avatar="🌻"):
-        st.markdown(response["content"])
         if response.get("memory"):
             with st.expander("Technical Details"):
                 mem = response["memory"].copy()
@@ -129,6 +151,9 @@ if user_input:
                     mem.pop("documents_used", None)
                 st.json(mem)
 
+    # Add assistant response to chat history
+    st.session_state.messages.append(response)
+
 # Sidebar with additional information
 with st.sidebar:
     st.markdown("""
@@ -1,5 +1,23 @@
-from .guard_agent import GuardAgent
-from .classification_agent import ClassificationAgent
-from .details_agent import DetailsAgent
-from .order_taking_agent import OrderTakingAgent
-from .agent_protocol import AgentProtocol
\ No newline at end of file
+import importlib
+
+# Agents are imported on first access, so importing the package (or the
+# router) does not load every agent module and its dependencies
+_EXPORTS = {
+    "GuardAgent": ".guard_agent",
+    "ClassificationAgent": ".classification_agent",
+    "DetailsAgent": ".details_agent",
+    "OrderTakingAgent": ".order_taking_agent",
+    "AgentProtocol": ".agent_protocol",
+    "AsyncAgentProtocol": ".agent_protocol",
+    "AgentRegistry": ".registry",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
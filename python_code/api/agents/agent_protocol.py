@@ -1,7 +1,7 @@
 from typing import Protocol, Any, Dict, List, Optional, Union
 
 class AgentProtocol(Protocol):
-    def get_response(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def get_response(self, messages: List[Dict[str, Any]], state: Optional[Any] = None) -> Dict[str, Any]:
         """Get a response from the agent based on the conversation history.
         
         Args:
@@ -9,6 +9,9 @@ class AgentProtocol(Protocol):
                 - role (str): 'user' or 'assistant'
                 - content (str): The message content
                 - memory (Optional[Dict]): Agent-specific memory (optional)
+            state: Optional ConversationState of the session; agents that
+                need the cart or routing context read it instead of
+                replaying the memory of every message
                 
         Returns:
             Dictionary containing:
@@ -18,4 +21,14 @@ class AgentProtocol(Protocol):
                     - agent (str): Agent type identifier
                     - [agent-specific fields]
         """
-        ...
\ No newline at end of file
+        ...
+
+
+class AsyncAgentProtocol(Protocol):
+    async def get_response_async(self, messages: List[Dict[str, Any]], state: Optional[Any] = None) -> Dict[str, Any]:
+        """Async variant of AgentProtocol.get_response.
+        
+        Takes the same conversation history and returns the same response
+        dictionary, but awaits model calls instead of blocking the thread.
+        """
+        ...
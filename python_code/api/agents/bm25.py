@@ -0,0 +1,149 @@
+import re
+import math
+from collections import Counter
+from functools import lru_cache
+
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "be", "do", "does", "did", "i", "me", "my", "you",
+    "your", "we", "our", "it", "its", "to", "of", "for", "in", "on", "at", "and", "or", "what",
+    "which", "who", "how", "can", "could", "would", "will", "please", "this", "that", "with"
+})
+_SUFFIXES = ("ational", "ations", "ation", "ings", "ing", "ies", "ied", "ness", "ers", "er",
+             "ed", "es", "ly", "s")
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """Light suffix-stripping stemmer: enough to match "timings" with "timing" and "hours" with "hour" """
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            stemmed = word[:-len(suffix)]
+            if suffix in ("ies", "ied"):
+                stemmed += "y"
+            elif suffix == "es" and not stemmed.endswith(("s", "x", "z", "ch", "sh")):
+                # "prices" -> "price", but "boxes" -> "box"
+                stemmed += "e"
+            return stemmed
+    return word
+
+
+def _words(text):
+    """(word, stem) pairs of the lowercased text, without stop words"""
+    return [(word, stem(word)) for word in _WORD.findall(text.lower()) if word not in STOP_WORDS]
+
+
+def tokenize(text):
+    """Lowercased, stemmed word tokens without stop words"""
+    return [term for _, term in _words(text)]
+
+
+def _deletions(term):
+    """term with each single character removed"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring.
+
+    Query terms that are not in the vocabulary are expanded to vocabulary
+    terms one edit away (insertion, deletion, substitution or adjacent
+    transposition), found through a precomputed deletion neighbourhood, so
+    "prise" and "stroe" still match "price" and "store". Both the stemmed
+    and the unstemmed forms are compared, since a typo can hide a suffix
+    ("timngs" is one edit from "timing"). Expanded terms count with
+    typo_weight of a real match.
+
+    Args:
+        documents: Iterable of (doc_id, text)
+        k1, b: BM25 term-frequency saturation and length normalisation
+        typo_weight: Weight of a typo-expanded term (0 disables expansion)
+        min_typo_length: Shortest query term that is expanded
+    """
+    def __init__(self, documents=(), k1=1.5, b=0.75, typo_weight=0.7, min_typo_length=4):
+        self.k1 = k1
+        self.b = b
+        self.typo_weight = typo_weight
+        self.min_typo_length = min_typo_length
+
+        self.doc_ids = []
+        self._lengths = []
+        self._postings = {}
+        self._surface = {}
+        for doc_id, text in documents:
+            self._add(doc_id, text)
+
+        count = len(self.doc_ids)
+        self._average_length = sum(self._lengths) / count if count else 0.0
+        self._idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+        self._neighbours = {}
+        if typo_weight:
+            for term, words in self._surface.items():
+                for form in words | {term}:
+                    if len(form) >= min_typo_length - 1:
+                        for variant in _deletions(form) | {form}:
+                            self._neighbours.setdefault(variant, set()).add(term)
+
+    def _add(self, doc_id, text):
+        position = len(self.doc_ids)
+        words = _words(text)
+        for word, term in words:
+            self._surface.setdefault(term, set()).add(word)
+        self.doc_ids.append(doc_id)
+        self._lengths.append(len(words))
+        for term, frequency in Counter(term for _, term in words).items():
+            self._postings.setdefault(term, {})[position] = frequency
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def expand(self, term, word=None):
+        """{vocabulary term: weight} for one stemmed query term (and its unstemmed word)"""
+        if term in self._postings:
+            return {term: 1.0}
+        if not self.typo_weight:
+            return {}
+        matches = set()
+        for form in {term, word or term}:
+            if len(form) >= self.min_typo_length:
+                for variant in _deletions(form) | {form}:
+                    matches |= self._neighbours.get(variant, set())
+        return {match: self.typo_weight for match in matches}
+
+    def scores(self, query):
+        """{doc_id: BM25 score} of every document matching the query"""
+        totals = {}
+        for (word, term), query_weight in Counter(_words(query)).items():
+            for vocabulary_term, weight in self.expand(term, word).items():
+                idf = self._idf[vocabulary_term] * weight * query_weight
+                for position, frequency in self._postings[vocabulary_term].items():
+                    length_norm = 1 - self.b + self.b * self._lengths[position] / (self._average_length or 1)
+                    totals[position] = totals.get(position, 0.0) + idf * frequency * (self.k1 + 1) / (
+                        frequency + self.k1 * length_norm)
+        return {self.doc_ids[position]: score for position, score in totals.items()}
+
+    def search(self, query, k=10):
+        """The k best (doc_id, score) pairs, best first"""
+        return sorted(self.scores(query).items(), key=lambda item: -item[1])[:k]
+
+
+def combine_scores(lexical, semantic, lexical_weight=0.5):
+    """
+    Blend BM25 and vector similarity scores ({doc_id: score} each), after
+    scaling each to [0, 1] by its best score. A document missing from one
+    side scores 0 there.
+    """
+    def normalise(scores):
+        best = max(scores.values(), default=0.0)
+        return {doc_id: score / best for doc_id, score in scores.items()} if best > 0 else {}
+
+    lexical, semantic = normalise(lexical), normalise(semantic)
+    return {
+        doc_id: lexical_weight * lexical.get(doc_id, 0.0) + (1 - lexical_weight) * semantic.get(doc_id, 0.0)
+        for doc_id in lexical.keys() | semantic.keys()
+    }
@@ -0,0 +1,273 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class ModelCallError(Exception):
+    """Raised when a model call fails and the call policy gives up"""
+
+
+class DeadlineExceeded(ModelCallError):
+    """Raised when a model call does not finish within its deadline"""
+
+
+# Bedrock error codes worth retrying (throttling and transient server faults)
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"
+}
+TRANSIENT_ERROR_CODES = {
+    "ServiceUnavailableException", "InternalServerException", "ModelNotReadyException",
+    "ModelTimeoutException", "RequestTimeout", "RequestTimeoutException"
+}
+# botocore network exceptions, matched by class name to keep botocore optional
+TRANSIENT_EXCEPTIONS = {
+    "EndpointConnectionError", "ConnectTimeoutError", "ReadTimeoutError",
+    "ConnectionClosedError", "ConnectionError", "TimeoutError"
+}
+
+
+def classify_error(error):
+    """
+    Classify a model call error as "throttled", "transient" or "fatal".
+    Only throttled and transient errors are retried.
+    """
+    response = getattr(error, "response", None)
+    code = response.get("Error", {}).get("Code") if isinstance(response, dict) else None
+    if code in THROTTLING_ERROR_CODES:
+        return "throttled"
+    if code in TRANSIENT_ERROR_CODES:
+        return "transient"
+    if any(cls.__name__ in TRANSIENT_EXCEPTIONS for cls in type(error).__mro__):
+        return "transient"
+    return "fatal"
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds)"""
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, percent):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_policy_executor():
+    """Threads that run attempts under a deadline or hedge"""
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("BEDROCK_MAX_CONNECTIONS", 50)),
+                    thread_name_prefix="bedrock-policy"
+                )
+    return _hedge_executor
+
+
+class CallPolicy:
+    """
+    Deadline, retry and hedging policy for a model call.
+
+    Args:
+        deadline: Total seconds allowed for the call including retries,
+            or None for no deadline
+        max_attempts: Attempts before giving up (1 disables retries)
+        base_delay: Backoff base in seconds; attempt n sleeps a random
+            time in [0, min(max_delay, base_delay * 2**n)] (full jitter)
+        max_delay: Upper bound of a single backoff sleep
+        hedge: Fire a second, identical request when the first is slower
+            than the observed hedge_percentile latency and take whichever
+            answers first. Never fired on a retry after throttling.
+        hedge_percentile: Latency percentile that triggers the hedge
+        hedge_delay: Hedge delay used until min_hedge_samples latencies
+            have been observed
+        min_hedge_samples: Samples needed before the percentile is trusted
+
+    Attempts run on a shared thread pool when there is a deadline or a
+    hedge. Threads cannot be interrupted, so an attempt still running at the
+    deadline, or a losing hedge, keeps its connection until the model answers
+    or BEDROCK_READ_TIMEOUT passes. The pool has BEDROCK_MAX_CONNECTIONS
+    threads, which bounds how many such attempts can pile up; they are
+    counted as "abandoned".
+    """
+    def __init__(self, deadline=None, max_attempts=1, base_delay=0.25, max_delay=4.0,
+                 hedge=False, hedge_percentile=95, hedge_delay=2.0, min_hedge_samples=20):
+        self.deadline = deadline
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.min_hedge_samples = min_hedge_samples
+
+        self.latency = LatencyTracker()
+        self._stats_lock = threading.Lock()
+        self.counters = {
+            "calls": 0, "failures": 0, "retries": 0, "throttled": 0, "transient": 0,
+            "fatal": 0, "deadline_exceeded": 0, "hedges_fired": 0, "hedge_wins": 0, "abandoned": 0
+        }
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.counters[name] += amount
+
+    def hedge_after(self):
+        """Seconds to wait before firing the hedged request"""
+        if len(self.latency) < self.min_hedge_samples:
+            return self.hedge_delay
+        return self.latency.percentile(self.hedge_percentile)
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _remaining(self, started):
+        if self.deadline is None:
+            return None
+        return self.deadline - (time.monotonic() - started)
+
+    def execute(self, call):
+        """
+        Run call() under this policy and return its result.
+
+        Raises:
+            DeadlineExceeded: the deadline passed before a result arrived
+            ModelCallError: a fatal error, or retries were exhausted
+        """
+        self._count("calls")
+        started = time.monotonic()
+        last_error = None
+        kind = None
+
+        for attempt in range(self.max_attempts):
+            remaining = self._remaining(started)
+            if remaining is not None and remaining <= 0:
+                break
+            if attempt:
+                self._count("retries")
+
+            try:
+                attempt_started = time.monotonic()
+                # A hedge would only add load to a throttled endpoint
+                result = self._attempt(call, remaining, hedge=self.hedge and kind != "throttled")
+                self.latency.record(time.monotonic() - attempt_started)
+                return result
+            except DeadlineExceeded:
+                self._count("deadline_exceeded")
+                self._count("failures")
+                raise
+            except Exception as e:
+                last_error = e
+                kind = classify_error(e)
+                self._count(kind)
+                if kind == "fatal" or attempt == self.max_attempts - 1:
+                    break
+
+                delay = self.backoff(attempt)
+                remaining = self._remaining(started)
+                if remaining is not None:
+                    delay = min(delay, max(0.0, remaining))
+                time.sleep(delay)
+
+        self._count("failures")
+        if last_error is None:
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded(f"Model call exceeded its {self.deadline}s deadline")
+        raise ModelCallError(f"Model call failed: {last_error}") from last_error
+
+    def _attempt(self, call, remaining, hedge=False):
+        """One attempt, possibly hedged, bounded by the remaining deadline"""
+        if not hedge and remaining is None:
+            return call()
+
+        started = time.monotonic()
+        executor = _get_policy_executor()
+        primary = executor.submit(call)
+        pending = {primary}
+
+        if hedge:
+            hedge_after = self.hedge_after()
+            if remaining is not None:
+                hedge_after = min(hedge_after, remaining)
+            done, _ = wait(pending, timeout=hedge_after)
+            if not done:
+                pending.add(executor.submit(call))
+                self._count("hedges_fired")
+
+        error = None
+        while pending:
+            timeout = None if remaining is None else max(0.0, remaining - (time.monotonic() - started))
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Threads cannot be interrupted; their results are discarded
+                self._count("abandoned", sum(1 for future in pending if not future.cancel()))
+                raise DeadlineExceeded(f"Model call exceeded its {self.deadline}s deadline")
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    self._count("abandoned", sum(1 for other in pending if not other.cancel()))
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self.counters)
+        stats["p50_latency"] = self.latency.percentile(50)
+        stats["p95_latency"] = self.latency.percentile(95)
+        return stats
+
+
+# Per-agent defaults; hedging doubles the requests of every slow call, so it
+# is opt-in per agent (<AGENT>_CALL_HEDGE)
+DEFAULT_POLICIES = {
+    "guard_agent": {"deadline": 6.0, "max_attempts": 3, "hedge": False},
+    "classification_agent": {"deadline": 6.0, "max_attempts": 3, "hedge": False},
+    "details_agent": {"deadline": 20.0, "max_attempts": 2, "hedge": False},
+    "order_taking_agent": {"deadline": 20.0, "max_attempts": 2, "hedge": False},
+}
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_call_policy(agent_name):
+    """
+    Return the shared CallPolicy for an agent. Defaults come from
+    DEFAULT_POLICIES and can be overridden per agent, e.g. for guard_agent:
+        GUARD_AGENT_CALL_DEADLINE, GUARD_AGENT_CALL_MAX_ATTEMPTS, GUARD_AGENT_CALL_HEDGE
+    """
+    with _policies_lock:
+        policy = _policies.get(agent_name)
+        if policy is None:
+            settings = dict(DEFAULT_POLICIES.get(agent_name, {}))
+            prefix = agent_name.upper()
+            if os.getenv(f"{prefix}_CALL_DEADLINE"):
+                settings["deadline"] = float(os.getenv(f"{prefix}_CALL_DEADLINE")) or None
+            if os.getenv(f"{prefix}_CALL_MAX_ATTEMPTS"):
+                settings["max_attempts"] = int(os.getenv(f"{prefix}_CALL_MAX_ATTEMPTS"))
+            if os.getenv(f"{prefix}_CALL_HEDGE"):
+                settings["hedge"] = os.getenv(f"{prefix}_CALL_HEDGE").lower() in ("1", "true", "yes")
+            policy = _policies[agent_name] = CallPolicy(**settings)
+        return policy
@@ -1,48 +1,99 @@
 from dotenv import load_dotenv
 import os
-import json
-from copy import deepcopy
-import boto3
-from .utils import get_chatbot_response
+from .call_policy import get_call_policy, ModelCallError
+from .history import MessageView
+from .json_extractor import extract_json, JSONExtractionError
+from .llm_cache import get_agent_cache
+from .session_state import ConversationState
+from .tracing import get_tracer, annotate
+from .utils import get_chatbot_response, get_chatbot_response_async, get_bedrock_client
 
 load_dotenv()
 
+# What the built-in answering agents handle, as shown in the routing prompt
+AGENT_DESCRIPTIONS = {
+    "details_agent": """This agent handles questions only about:
+   - Plant shop location
+   - Plant shop working hours
+   - Plant shop history
+   - Delivery locations
+   - Product collection and inventory
+   - Prices of products""",
+    "order_taking_agent": """This agent manages conversations where the user wants to place an order or is completing a purchase.
+   - This includes ANY intent to buy, add to cart, checkout, or modify an order
+   - ANY message with words like "order", "add", "buy", "purchase", or "get" followed by a plant name
+   - Also includes follow-up messages during an ordering process
+   - Any message about quantities, ordering, adding plants/products
+   - Any message that continues an ongoing order conversation""",
+}
+
+
 class ClassificationAgent():
-    def __init__(self):
-        self.client = boto3.client(
-            service_name='bedrock-runtime',
-            region_name=os.getenv("AWS_REGION", "us-east-1")
-        )
+    OUTPUT_SCHEMA = {
+        "chain_of_thought": {"default": ""},
+        "decision": {"choices": ["details_agent", "order_taking_agent"]},
+        "message": {"default": ""}
+    }
+    PARSE_FAILURE_REASON = "Failed to parse response - defaulting to details agent"
+
+    def __init__(self, client=None, call_limiter=None):
+        # Shared, pooled bedrock-runtime client
+        self.client = client or get_bedrock_client()
         self.model_name = os.getenv("BEDROCK_MODEL_NAME", "mistral.mistral-7b-instruct-v0:2")
-    
-    def get_response(self, messages):
-        messages = deepcopy(messages)
+        # Optional ModelCallLimiter for the async API
+        self.call_limiter = call_limiter
+        # Shared response cache, if this agent is opted in (LLM_CACHE_AGENTS)
+        self.response_cache = get_agent_cache("classification_agent")
+        # Deadline, retry and hedging policy for this agent's model calls
+        self.call_policy = get_call_policy("classification_agent")
+        # Per-stage spans and latency histograms
+        self.tracer = get_tracer()
+        # Optional local intent model (INTENT_MODEL_PATH); the LLM is only
+        # asked when its confidence is below INTENT_CONFIDENCE_THRESHOLD
+        # (imported only when configured, as it loads numpy)
+        self.intent_model = None
+        if os.getenv("INTENT_MODEL_PATH"):
+            from .intent_model import load_intent_model
+            self.intent_model = load_intent_model()
+        self.confidence_threshold = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", 0.85))
+        # Agents the model can choose; the router sets the registered ones
+        self.output_schema = self.OUTPUT_SCHEMA
+        self._routes = {name: None for name in self.OUTPUT_SCHEMA["decision"]["choices"]}
+        self._agent_list = self._format_agents(self._routes)
+
+    def set_routes(self, routes):
+        """
+        Offer these answering agents to the model.
 
+        Args:
+            routes: {agent name: description}; built-in agents have their own
+                description, others without one are listed by name
+        """
+        if routes == self._routes or not routes:
+            return
+        schema = dict(self.OUTPUT_SCHEMA)
+        schema["decision"] = {"choices": list(routes)}
+        self._agent_list = self._format_agents(routes)
+        self.output_schema = schema
+        self._routes = dict(routes)
+
+    def _format_agents(self, routes):
+        return "\n\n".join(
+            f"{number}. **{name}**:  \n   {AGENT_DESCRIPTIONS.get(name) or description or ''}".rstrip()
+            for number, (name, description) in enumerate(routes.items(), start=1)
+        )
+    
+    def _build_messages(self, messages, context=None):
         # Extract conversation context
-        context = self._extract_conversation_context(messages)
+        context = self._format_context(context or self._conversation_context(messages))
         
         system_prompt = f"""<<SYS>>
 You are a helpful AI assistant working for a Plant Shop application.
 
 Your main task is to decide which specialized agent should handle the user's message.  
-There are two agents you can choose from:
+There are {len(self._routes)} agents you can choose from:
 
-1. **details_agent**:  
-   This agent handles questions only about:
-   - Plant shop location
-   - Plant shop working hours
-   - Plant shop history
-   - Delivery locations
-   - Product collection and inventory
-   - Prices of products
-
-2. **order_taking_agent**:  
-   This agent manages conversations where the user wants to place an order or is completing a purchase.
-   - This includes ANY intent to buy, add to cart, checkout, or modify an order
-   - ANY message with words like "order", "add", "buy", "purchase", or "get" followed by a plant name
-   - Also includes follow-up messages during an ordering process
-   - Any message about quantities, ordering, adding plants/products
-   - Any message that continues an ongoing order conversation
+{self._agent_list}
 
 Conversation Context: {context}
 
@@ -50,7 +101,7 @@ You must output your answer in the following strict JSON format:
 
 {{
     "chain_of_thought": "Explain why you chose a specific agent based on the user's message",
-    "decision": "details_agent | order_taking_agent",
+    "decision": "{' | '.join(self._routes)}",
     "message": ""
 }}
 
@@ -62,64 +113,120 @@ IMPORTANT RULES:
 - Follow the JSON format exactly without adding any extra text outside of it.
 <</SYS>>"""
         
-        # Format messages for Mistral - include up to last 5 messages for context
-        formatted_messages = [{"role": "system", "content": system_prompt}] + messages[-5:]
-
-        chatbot_output = get_chatbot_response(
-            client=self.client,
-            model_name=self.model_name,
-            messages=formatted_messages,
-            temperature=0.2  # Lower temperature for more consistent routing
-        )
+        # Format messages for Mistral - include up to last 5 messages for context,
+        # as a read-only view instead of a copy of the whole history
+        return [{"role": "system", "content": system_prompt}, *MessageView(messages, window=5)]
+
+    def get_response(self, messages, state=None):
+        context = self._conversation_context(messages, state)
+
+        # Confident local predictions skip the model call entirely
+        local_output = self._classify_locally(messages, context)
+        if local_output is not None:
+            return self.postprocess(local_output)
+
+        formatted_messages = self._build_messages(messages, context)
+
+        try:
+            chatbot_output = get_chatbot_response(
+                client=self.client,
+                model_name=self.model_name,
+                messages=formatted_messages,
+                temperature=0.2,  # Lower temperature for more consistent routing
+                cache=self.response_cache,
+                policy=self.call_policy
+            )
+        except ModelCallError:
+            # An empty output falls back to the default decision below
+            chatbot_output = ""
 
         # Clean and verify JSON output
-        chatbot_output = self.clean_json_output(chatbot_output)
-        output = self.postprocess(chatbot_output)
+        with self.tracer.span("post_process", agent="classification_agent"):
+            chatbot_output = self.clean_json_output(chatbot_output)
+            self._log_decision(messages, context, chatbot_output)
+            output = self.postprocess(chatbot_output)
         return output
-    
-    def _extract_conversation_context(self, messages):
-        """Extract context from previous messages to improve routing decisions"""
-        context = {
-            "in_ordering_process": False,
-            "last_agent": None,
-            "has_cart_items": False
+
+    async def get_response_async(self, messages, state=None):
+        context = self._conversation_context(messages, state)
+
+        local_output = self._classify_locally(messages, context)
+        if local_output is not None:
+            return self.postprocess(local_output)
+
+        formatted_messages = self._build_messages(messages, context)
+
+        try:
+            chatbot_output = await get_chatbot_response_async(
+                client=self.client,
+                model_name=self.model_name,
+                messages=formatted_messages,
+                temperature=0.2,
+                limiter=self.call_limiter,
+                cache=self.response_cache,
+                policy=self.call_policy
+            )
+        except ModelCallError:
+            chatbot_output = ""
+
+        with self.tracer.span("post_process", agent="classification_agent"):
+            chatbot_output = self.clean_json_output(chatbot_output)
+            self._log_decision(messages, context, chatbot_output)
+            return self.postprocess(chatbot_output)
+
+    def _classify_locally(self, messages, context):
+        """
+        Route with the local intent model when it is confident enough.
+        Returns an output dict, or None to fall back to the LLM.
+        """
+        if self.intent_model is None:
+            return None
+        decision, confidence = self.intent_model.predict(messages[-1]['content'], context)
+        annotate(local_confidence=round(confidence, 4))
+        if confidence < self.confidence_threshold or decision not in self._routes:
+            return None
+        return {
+            "chain_of_thought": f"Local intent model, confidence {confidence:.2f}",
+            "decision": decision,
+            "message": ""
         }
-        
-        # Analyze previous messages to detect ongoing order context
-        for msg in messages:
-            if msg.get("role") == "assistant" and msg.get("memory"):
-                memory = msg.get("memory", {})
-                agent = memory.get("agent")
-                
-                # Track which agent handled previous messages
-                if agent:
-                    context["last_agent"] = agent
-                
-                # Check if ordering process is active
-                if agent == "order_taking_agent":
-                    context["in_ordering_process"] = True
-                    
-                    # Check if cart has items
-                    if "cart" in memory and memory["cart"]:
-                        context["has_cart_items"] = True
-        
-        # Convert to string representation for prompt
+
+    def _log_decision(self, messages, context, output):
+        """Record parsed LLM decisions as training data for the local model"""
+        if output.get("chain_of_thought") != self.PARSE_FAILURE_REASON and os.getenv("ROUTING_LOG_PATH"):
+            from .intent_model import log_routing_decision
+            log_routing_decision(messages[-1]['content'], context, output["decision"])
+    
+    def _conversation_context(self, messages, state=None):
+        """
+        Routing context (ordering flag, last agent, cart) from the session's
+        ConversationState, or replayed from the transcript without one
+        """
+        if state is None:
+            state = ConversationState.from_messages(messages)
+        return state.context()
+
+    def _format_context(self, context):
+        """Convert to string representation for prompt"""
         return (
             f"Previous agent: {context['last_agent'] or 'None'}. "
             f"{'User is in an ordering process. ' if context['in_ordering_process'] else ''}"
             f"{'User has items in cart. ' if context['has_cart_items'] else ''}"
         )
 
+    def _extract_conversation_context(self, messages):
+        """Conversation context as the string used in the routing prompt"""
+        return self._format_context(self._conversation_context(messages))
+
     def clean_json_output(self, output):
         """Ensure the output is valid JSON"""
         try:
-            # Remove any markdown code blocks
-            output = output.replace("```json", "").replace("```", "").strip()
-            return json.loads(output)
-        except json.JSONDecodeError:
+            # Extract and repair the JSON locally, then validate the decision
+            return extract_json(output, schema=self.output_schema)
+        except JSONExtractionError:
             # Fallback to details agent if parsing fails
             return {
-                "chain_of_thought": "Failed to parse response - defaulting to details agent",
+                "chain_of_thought": self.PARSE_FAILURE_REASON,
                 "decision": "details_agent",
                 "message": ""
             }
@@ -1,60 +1,61 @@
 import os
 import json
-import numpy as np
-import boto3
+import time
 from dotenv import load_dotenv
 from copy import deepcopy
-from .utils import get_chatbot_response
-from datetime import datetime
-from difflib import get_close_matches
+from .bm25 import BM25Index
+from .call_policy import get_call_policy
+from .keyword_engine import get_keyword_engine
+from .knowledge_index import format_context
+from .knowledge_store import KnowledgeStore
+from .llm_cache import get_agent_cache
+from .semantic_cache import get_semantic_cache
+from .tracing import get_tracer
+from .utils import get_chatbot_response, get_chatbot_response_async, stream_chatbot_response, stream_answer, get_bedrock_client
 
 load_dotenv()
 
 class DetailsAgent():
-    def __init__(self):
-        # Initialize chat model client
-        self.client = boto3.client(
-            service_name='bedrock-runtime',
-            region_name=os.getenv("AWS_REGION", "us-east-1")
-        )
+    DEFAULT_KNOWLEDGE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "products"))
+    MISSING_INFO_RESPONSE = "This information isn't available in our records. Please visit www.plantify.com for details."
+
+    def __init__(self, client=None, call_limiter=None):
+        # Shared, pooled bedrock-runtime client
+        self.client = client or get_bedrock_client()
         self.chat_model_id = os.getenv("BEDROCK_MODEL_NAME", "mistral.mistral-7b-instruct-v0:2")
+        # Optional ModelCallLimiter for the async API
+        self.call_limiter = call_limiter
+        # Shared response cache, if this agent is opted in (LLM_CACHE_AGENTS)
+        self.response_cache = get_agent_cache("details_agent")
+        # Deadline, retry and hedging policy for this agent's model calls
+        self.call_policy = get_call_policy("details_agent")
+        # Per-stage spans and latency histograms
+        self.tracer = get_tracer()
+        # Shared keyword/intent engine (lists live in intent_keywords.json)
+        self.keywords = get_keyword_engine()
+        # BM25 over each intent's single keywords, for typos the lists do not cover
+        self.intent_index = BM25Index(
+            (intent, " ".join(kw.rstrip("*") for kw in self.keywords.intents[intent] if not kw.startswith("re:")))
+            for intent in ("price", "store")
+        )
         
-        # Load knowledge documents directly
-        self.knowledge_base = self._load_knowledge_documents(
+        # Knowledge documents, chunked and indexed; changed files are
+        # re-indexed in the background and swapped in (KNOWLEDGE_POLL_INTERVAL)
+        knowledge_dir = os.getenv("KNOWLEDGE_BASE_DIR", self.DEFAULT_KNOWLEDGE_DIR)
+        self.knowledge_store = KnowledgeStore(
             documents={
-                "about_us": r"A:\NLP Projects\Chatbot\python_code\Experiments\Plantify_about_us.txt",
-                "price_list": r"A:\NLP Projects\Chatbot\python_code\Experiments\price_list_text.txt"
+                "about_us": os.path.join(knowledge_dir, "Plantify_about_us.txt"),
+                "price_list": os.path.join(knowledge_dir, "price_list_text.txt")
             }
         )
+        # Answers to earlier questions with the same meaning, per knowledge
+        # version (SEMANTIC_CACHE); None when disabled
+        self.semantic_cache = get_semantic_cache(self.knowledge_store.snapshot.index.embedder)
 
-    def _load_knowledge_documents(self, documents):
-        """Load and validate knowledge documents"""
-        knowledge = {}
-        try:
-            for doc_name, doc_path in documents.items():
-                if not os.path.exists(doc_path):
-                    raise FileNotFoundError(f"Document not found: {doc_path}")
-                
-                with open(doc_path, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                
-                if not content:
-                    raise ValueError(f"Empty document: {doc_path}")
-                
-                knowledge[doc_name] = {
-                    "content": content,
-                    "path": doc_path,
-                    "last_modified": os.path.getmtime(doc_path)
-                }
-            
-            print("Loaded knowledge documents:")
-            for doc_name, data in knowledge.items():
-                print(f"- {doc_name}: {len(data['content'])} chars, last modified {datetime.fromtimestamp(data['last_modified'])}")
-            
-            return knowledge
-        except Exception as e:
-            print(f"Failed to load knowledge base: {e}")
-            raise
+    @property
+    def knowledge_base(self):
+        """Documents of the current knowledge snapshot"""
+        return self.knowledge_store.snapshot.documents
 
     def _select_relevant_documents(self, user_message):
         """Determine relevant documents with typo tolerance and context awareness"""
@@ -62,42 +63,19 @@ class DetailsAgent():
             if not isinstance(user_message, str) or not user_message.strip():
                 return list(self.knowledge_base.keys())
 
-            query_lower = user_message.lower()
-            relevant_docs = []
-            
-            # Define keyword groups with common variants/typos
-            price_keywords = {
-                'price', 'cost', 'rate', 'pricing', 'prince', 'pice', 
-                'how much', 'hw much', 'amount', '$$'
-            }
-            
-            store_keywords = {
-                'store', 'shop', 'location', 'address', 'hour', 'time', 'timing',
-                'timmings', 'opening', 'close', 'deliver', 'delivery', 'about',
-                'locate', 'branch', 'outlet', 'schedule', 'openhour'
-            }
+            # One scan finds every intent; exact keywords first, then
+            # stemmed, typo-expanded terms through the intent index
+            intents = self.keywords.intents_in(user_message)
+            if not intents & {"price", "store"}:
+                intents = set(self.intent_index.scores(user_message))
 
-            # Split query into words and find close matches
-            query_words = set(query_lower.split())
-            threshold = 0.8  # Similarity threshold for typos
-            
-            # Check price-related queries
-            price_matches = get_close_matches(query_lower, price_keywords, n=3, cutoff=threshold)
-            if any(word in query_words or pm in price_keywords for pm in price_matches):
-                relevant_docs.append("price_list")
+            relevant_docs = []
+            if "price" in intents:
                 # If we found price match, don't check other categories
-                return relevant_docs
-
-            # Check store-related queries
-            store_matches = get_close_matches(query_lower, store_keywords, n=5, cutoff=threshold)
-            store_words = query_words.union(set(store_matches))
-            if any(sw in store_keywords for sw in store_words):
+                return ["price_list"]
+            if "store" in intents:
                 relevant_docs.append("about_us")
 
-            # Special case: Combined price+store queries
-            if not relevant_docs and ('store' in query_words and 'price' in query_words):
-                return ["price_list", "about_us"]
-
             # Fallback for empty matches
             return relevant_docs if relevant_docs else list(self.knowledge_base.keys())
 
@@ -106,86 +84,234 @@ class DetailsAgent():
             # Fail-safe return
             return list(self.knowledge_base.keys())
 
-    def get_response(self, messages):
-        user_message = messages[-1]['content']
-        
-        try:
-            # Check for order-related keywords - redirect to order agent
-            order_keywords = ["order", "buy", "purchase", "add to cart", "checkout"]
-            if any(kw in user_message.lower() for kw in order_keywords):
-                return {
-                    "role": "assistant",
-                    "content": "I'd be happy to help you place an order. Could you please specify which plants you'd like to purchase?",
-                    "memory": {
-                        "agent": "details_agent",
-                        "action": "order_redirect",
-                        "needs_rerouting": True  # Flag for rerouting
-                    }
-                }
+    def _is_order_request(self, user_message):
+        """Check for order-related keywords that belong to the order agent"""
+        return self.keywords.has_intent(user_message, "order_redirect")
 
-            # Existing document processing logic
-            relevant_docs = self._select_relevant_documents(user_message)
-            print(f"Selected documents: {relevant_docs}")
-
-            context = []
-            for doc_name in relevant_docs:
-                doc_data = self.knowledge_base[doc_name]
-                context.append(
-                    f"===== {doc_name.upper().replace('_', ' ')} =====\n"
-                    f"{doc_data['content']}\n"
-                )
-
-            prompt = f"""<<SYS>>
+    def _order_redirect_response(self):
+        return {
+            "role": "assistant",
+            "content": "I'd be happy to help you place an order. Could you please specify which plants you'd like to purchase?",
+            "memory": {
+                "agent": "details_agent",
+                "action": "order_redirect",
+                "needs_rerouting": True  # Flag for rerouting
+            }
+        }
+
+    def _error_response(self, error):
+        print(f"DetailsAgent error: {str(error)}")
+        return {
+            "role": "assistant",
+            "content": "I'm having trouble accessing that information. Please try again later.",
+            "memory": {
+                "agent": "details_agent",
+                "error": str(error)
+            }
+        }
+
+    def _cached_answer(self, user_message):
+        """The answer to an earlier question like this one, from the current knowledge version"""
+        if self.semantic_cache is None:
+            return None
+        with self.tracer.span("semantic_cache", agent="details_agent") as span:
+            version = self.knowledge_store.current().version
+            answer, similarity = self.semantic_cache.lookup(user_message, version)
+            if span is not None:
+                span.set_attribute("hit", answer is not None)
+                if similarity is not None:
+                    span.set_attribute("similarity", round(similarity, 4))
+        if answer is not None:
+            answer["memory"]["semantic_cache"] = {"similarity": round(similarity, 4)}
+        return answer
+
+    def _remember_answer(self, user_message, answer, started):
+        """Cache a model answer; missing-info answers are not cached"""
+        if self.semantic_cache is None or answer["content"] == self.MISSING_INFO_RESPONSE:
+            return
+        self.semantic_cache.store(user_message, answer, answer["memory"]["knowledge_version"],
+                                  (time.perf_counter() - started) * 1000)
+
+    def _build_prompt(self, user_message):
+        """
+        Retrieve the best chunks of the relevant documents, within the
+        token budget, and build the answering prompt
+        """
+        with self.tracer.span("retrieve", agent="details_agent") as span:
+            # One snapshot for the whole turn, even if a reload swaps in a newer one
+            snapshot = self.knowledge_store.current()
+            selected_docs = self._select_relevant_documents(user_message)
+            results = snapshot.index.search(user_message, documents=selected_docs)
+            if not results:
+                results = snapshot.index.search(user_message)
+            relevant_docs = list(dict.fromkeys(chunk.doc_name for chunk, _ in results))
+            if span is not None:
+                span.set_attribute("knowledge_version", snapshot.version)
+                span.set_attribute("documents", ",".join(relevant_docs))
+                span.set_attribute("chunks", len(results))
+                span.set_attribute("context_tokens", sum(chunk.tokens for chunk, _ in results))
+        print(f"Selected documents: {relevant_docs} ({len(results)} chunks)")
+
+        context = format_context(results)
+
+        prompt = f"""<<SYS>>
     You are a factual Plantify assistant. Rules:
     1. Answer ONLY using provided documents
     2. For questions about ordering plants: suggest the user make a clear order request
     3. For missing info: "Please visit www.plantify.com for details"
 
     DOCUMENTS:
-    {"".join(context)}
+    {context}
     <</SYS>>
 
     Question: {user_message}
 
     Concise answer:"""
 
+        return prompt, relevant_docs, snapshot.version
+
+    def get_response(self, messages, state=None):
+        user_message = messages[-1]['content']
+        
+        try:
+            # Check for order-related keywords - redirect to order agent
+            if self._is_order_request(user_message):
+                return self._order_redirect_response()
+
+            cached = self._cached_answer(user_message)
+            if cached is not None:
+                return cached
+
+            # Existing document processing logic
+            started = time.perf_counter()
+            prompt, relevant_docs, knowledge_version = self._build_prompt(user_message)
+
             # Get response with proper error handling
             response = get_chatbot_response(
                 client=self.client,
                 model_name=self.chat_model_id,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.1,
-                max_tokens=300
+                max_tokens=300,
+                cache=self.response_cache,
+                policy=self.call_policy
             ).strip()
 
-            # Validate response quality
-            invalid_phrases = [
-                "i don't know", "not available", 
-                "no information", "not mentioned"
-            ]
-            if not response or any(phrase in response.lower() for phrase in invalid_phrases):
-                response = "This information isn't available in our records. Please visit www.plantify.com for details."
-
-            return {
-                "role": "assistant",
-                "content": response,
-                "memory": {
-                    "agent": "details_agent",
-                    "sources": relevant_docs,
-                    "documents_used": len(relevant_docs)
-                }
-            }
+            with self.tracer.span("post_process", agent="details_agent"):
+                answer = self._answer_response(response, relevant_docs, knowledge_version)
+            self._remember_answer(user_message, answer, started)
+            return answer
+
+        except Exception as e:
+            return self._error_response(e)
+
+    async def get_response_async(self, messages, state=None):
+        user_message = messages[-1]['content']
+
+        try:
+            if self._is_order_request(user_message):
+                return self._order_redirect_response()
+
+            cached = self._cached_answer(user_message)
+            if cached is not None:
+                return cached
+
+            started = time.perf_counter()
+            prompt, relevant_docs, knowledge_version = self._build_prompt(user_message)
+
+            response = await get_chatbot_response_async(
+                client=self.client,
+                model_name=self.chat_model_id,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.1,
+                max_tokens=300,
+                limiter=self.call_limiter,
+                cache=self.response_cache,
+                policy=self.call_policy
+            )
+
+            with self.tracer.span("post_process", agent="details_agent"):
+                answer = self._answer_response(response.strip(), relevant_docs, knowledge_version)
+            self._remember_answer(user_message, answer, started)
+            return answer
 
         except Exception as e:
-            print(f"DetailsAgent error: {str(e)}")
-            return {
-                "role": "assistant",
-                "content": "I'm having trouble accessing that information. Please try again later.",
-                "memory": {
-                    "agent": "details_agent",
-                    "error": str(e)
-                }
+            return self._error_response(e)
+
+    def _answer_response(self, response, relevant_docs, knowledge_version):
+        # Validate response quality
+        invalid_phrases = [
+            "i don't know", "not available", 
+            "no information", "not mentioned"
+        ]
+        if not response or any(phrase in response.lower() for phrase in invalid_phrases):
+            response = self.MISSING_INFO_RESPONSE
+
+        return {
+            "role": "assistant",
+            "content": response,
+            "memory": {
+                "agent": "details_agent",
+                "sources": relevant_docs,
+                "documents_used": len(relevant_docs),
+                "knowledge_version": knowledge_version
             }
+        }
+
+    def stream_response(self, messages, state=None):
+        """
+        Streaming variant of get_response.
+        
+        Returns the usual response dict, but "content" is an iterator of text
+        chunks when the answer comes from the model. Answer-quality checks
+        that need the full text cannot run mid-stream; only an empty answer
+        is replaced by the missing-info message.
+        """
+        user_message = messages[-1]['content']
+
+        try:
+            if self._is_order_request(user_message):
+                return self._order_redirect_response()
+
+            cached = self._cached_answer(user_message)
+            if cached is not None:
+                return cached
+
+            started = time.perf_counter()
+            prompt, relevant_docs, knowledge_version = self._build_prompt(user_message)
+        except Exception as e:
+            return self._error_response(e)
+
+        chunks = stream_chatbot_response(
+            client=self.client,
+            model_name=self.chat_model_id,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.1,
+            max_tokens=300,
+            cache=self.response_cache,
+            policy=self.call_policy
+        )
+
+        memory = {
+            "agent": "details_agent",
+            "sources": relevant_docs,
+            "documents_used": len(relevant_docs),
+            "knowledge_version": knowledge_version
+        }
+        return {
+            "role": "assistant",
+            "content": self._stream_answer(chunks, user_message, memory, started),
+            "memory": memory
+        }
+
+    def _stream_answer(self, chunks, user_message=None, memory=None, started=None):
+        """Yield the answer text, and cache the answer once the model stream has finished"""
+        def remember(text):
+            # Same quality check as a buffered answer before it is reused
+            answer = self._answer_response(text, memory["sources"], memory["knowledge_version"])
+            self._remember_answer(user_message, answer, started)
+
+        return stream_answer(chunks, self.MISSING_INFO_RESPONSE, remember if user_message is not None else None)
             
         
     def postprocess(self, output):
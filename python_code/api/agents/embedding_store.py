@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # No cross-process lock: workers may embed the same texts once each
+    fcntl = None
+
+
+DEFAULT_CACHE_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".embedding_cache")
+)
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Embeddings persisted by content hash, so each distinct text is embedded
+    once, ever.
+
+    Vectors live in a float32 .npy file that is memory-mapped read-only, and
+    their content hashes in a small JSON id index, one row per hash. Texts
+    not in the store are embedded together in one batched call and appended.
+    Worker processes map the same file, so its pages are shared, and take a
+    file lock while embedding so a text is embedded by one worker only.
+
+    An append writes a new numbered vector file and then atomically replaces
+    the index, which names the current vector file. A mapped file is never
+    replaced (Windows refuses to), so a reader never sees an index that
+    refers to rows its vector file does not have. Vector files older than
+    the previous one are deleted on a later append, once nothing maps them.
+
+    Args:
+        embedder: Object with embed(list of texts) -> normalised 2D array
+            and embed_query(text) -> normalised vector
+        directory: Where the files live (KNOWLEDGE_EMBEDDING_CACHE_DIR)
+        name: File name stem; defaults to the embedder's name, so vectors of
+            different models are never mixed
+    """
+    def __init__(self, embedder, directory=None, name=None):
+        self.embedder = embedder
+        self.directory = directory or DEFAULT_CACHE_DIR
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", name or getattr(embedder, "name", type(embedder).__name__))
+        self.name = name
+        self.vectors_path = None
+        self.index_path = os.path.join(self.directory, f"{name}.json")
+        self._lock_path = os.path.join(self.directory, f"{name}.lock")
+
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._vectors = None
+        self._generation = 0
+        self._index_signature = None
+        self.hits = 0
+        self.misses = 0
+        self.embed_calls = 0
+        self.write_errors = 0
+
+        started = time.perf_counter()
+        self._load()
+        self.load_ms = (time.perf_counter() - started) * 1000
+
+    def _load(self):
+        """Map the files in, if they changed since the last load"""
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._index_signature:
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            ids = index["ids"]
+            vectors_path = os.path.join(self.directory, index.get("vectors", f"{self.name}.npy"))
+            vectors = np.load(vectors_path, mmap_mode="r")
+            if vectors.dtype != np.float32 or vectors.ndim != 2 or len(vectors) < len(ids):
+                raise ValueError(f"vectors {vectors.dtype} {vectors.shape} do not match {len(ids)} ids")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring embedding store {self.index_path}: {e}")
+            return
+        self._vectors = vectors
+        self.vectors_path = vectors_path
+        self._generation = int(index.get("generation", 0))
+        self._rows = {content: row for row, content in enumerate(ids)}
+        self._index_signature = signature
+
+    def _file_lock(self):
+        """Exclusive lock shared with other processes using the same store, or None"""
+        if fcntl is None:
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            lock_file = open(self._lock_path, "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            return lock_file
+        except OSError as e:
+            print(f"Embedding store lock unavailable: {e}")
+            return None
+
+    def _append(self, hashes, vectors):
+        """Write the store with vectors added for hashes, and map it back in"""
+        ids = sorted(self._rows, key=self._rows.get)
+        stored = self._vectors[:len(ids)] if ids else None
+        if stored is not None and stored.shape[1] != vectors.shape[1]:
+            print(f"Embedding dimension changed ({stored.shape[1]} -> {vectors.shape[1]}), "
+                  f"starting a new store at {self.index_path}")
+            ids, stored = [], None
+        combined = vectors if stored is None else np.concatenate([stored, vectors])
+
+        generation = self._generation + 1
+        vectors_file = f"{self.name}.{generation}.npy"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # A new file each time: the current one may be mapped, here or by another worker
+            with open(os.path.join(self.directory, vectors_file), "wb") as f:
+                np.save(f, np.ascontiguousarray(combined, dtype=np.float32))
+            suffix = f".{os.getpid()}.tmp"
+            with open(self.index_path + suffix, 'w', encoding='utf-8') as f:
+                json.dump({"dimension": int(combined.shape[1]), "vectors": vectors_file,
+                           "generation": generation, "ids": ids + list(hashes)}, f)
+            os.replace(self.index_path + suffix, self.index_path)
+        except OSError as e:
+            self.write_errors += 1
+            print(f"Failed to write embedding store {self.index_path}: {e}")
+            return
+        self._load()
+        self._remove_old_files(generation)
+
+    def _remove_old_files(self, generation):
+        """Delete vector files older than the previous generation; those still mapped are retried later"""
+        pattern = re.compile(rf"{re.escape(self.name)}(?:\.(\d+))?\.npy$")
+        for file_name in os.listdir(self.directory):
+            match = pattern.match(file_name)
+            if match and int(match.group(1) or 0) < generation - 1:
+                try:
+                    os.remove(os.path.join(self.directory, file_name))
+                except OSError:
+                    pass
+
+    def embed(self, texts):
+        """Vectors for texts, embedding only those not already stored"""
+        texts = list(texts)
+        hashes = [content_hash(text) for text in texts]
+
+        with self._lock:
+            missing = {content: text for content, text in zip(hashes, texts) if content not in self._rows}
+            computed = {}
+            if missing:
+                lock_file = self._file_lock()
+                try:
+                    # Another worker may have embedded them while we waited
+                    self._load()
+                    missing = {content: text for content, text in missing.items() if content not in self._rows}
+                    if missing:
+                        vectors = np.asarray(self.embedder.embed(list(missing.values())), dtype=np.float32)
+                        self.embed_calls += 1
+                        computed = dict(zip(missing, vectors))
+                        self._append(list(missing), vectors)
+                finally:
+                    if lock_file is not None:
+                        lock_file.close()
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+
+            if not texts:
+                dimension = self._vectors.shape[1] if self._vectors is not None else 0
+                return np.empty((0, dimension), dtype=np.float32)
+            if all(content in self._rows for content in hashes):
+                return np.asarray(self._vectors[[self._rows[content] for content in hashes]])
+            # The store could not be written; serve this call from memory
+            return np.vstack([computed[content] if content in computed else self._vectors[self._rows[content]]
+                              for content in hashes])
+
+    def embed_query(self, text):
+        """Vector for a search query; stored if known, but never added to the store"""
+        row = self._rows.get(content_hash(text))
+        if row is not None:
+            # A copy, so the caller does not keep the mapped file open
+            return np.array(self._vectors[row])
+        return self.embedder.embed_query(text)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "rows": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "embed_calls": self.embed_calls,
+            "write_errors": self.write_errors,
+            "load_ms": round(self.load_ms, 3),
+            "path": self.vectors_path,
+        }
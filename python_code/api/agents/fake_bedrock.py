@@ -0,0 +1,248 @@
+import os
+import re
+import io
+import json
+import time
+import random
+import threading
+
+
+class FakeClientError(Exception):
+    """Mimics botocore's ClientError so call policies classify it the same way"""
+    def __init__(self, code, operation_name="InvokeModel"):
+        self.response = {"Error": {"Code": code, "Message": f"Injected {code}"}}
+        self.operation_name = operation_name
+        super().__init__(f"An error occurred ({code}) when calling the {operation_name} operation: Injected {code}")
+
+
+GUARD_MARKER = "determine if the user's question or request is allowed"
+CLASSIFIER_MARKER = "decide which specialized agent should handle"
+DETAILS_MARKER = "You are a factual Plantify assistant"
+
+BLOCKED_TOPICS = [
+    "politic", "election", "news", "movie", "cricket", "football", "celebrity",
+    "stock", "bitcoin", "weather", "owner", "staff", "salary", "girlfriend", "boyfriend"
+]
+ORDER_WORDS = ["order", "buy", "purchase", "add", "cart", "checkout", "get me", "want"]
+
+
+def _last_user_message(prompt):
+    question = re.search(r"Question:\s*(.*?)\n", prompt)
+    if question:
+        return question.group(1).strip()
+    turns = re.findall(r"\[INST\]\s*(.*?)\s*\[/INST\]", prompt, re.S)
+    return turns[-1] if turns else prompt
+
+
+def rule_based_completion(prompt):
+    """
+    Produce a plausible completion for the prompts this project sends:
+    JSON decisions for the guard and classifier, a document-grounded
+    sentence for the details agent and a canned shop reply otherwise.
+    """
+    user_message = _last_user_message(prompt)
+    lowered = user_message.lower()
+
+    if GUARD_MARKER in prompt:
+        blocked = any(topic in lowered for topic in BLOCKED_TOPICS)
+        return json.dumps({
+            "chain_of_thought": "Off-topic request" if blocked else "Plant shop related request",
+            "decision": "not allowed" if blocked else "allowed",
+            "message": "Sorry, I can't help you with that. Can I help you with something else?" if blocked else ""
+        })
+
+    if CLASSIFIER_MARKER in prompt:
+        ordering = any(word in lowered for word in ORDER_WORDS)
+        return json.dumps({
+            "chain_of_thought": "Ordering intent" if ordering else "Information request",
+            "decision": "order_taking_agent" if ordering else "details_agent",
+            "message": ""
+        })
+
+    if DETAILS_MARKER in prompt:
+        # Answer with the document line sharing the most words with the question
+        documents = prompt.split("DOCUMENTS:", 1)[-1].split("Question:", 1)[0]
+        query_words = set(re.findall(r"[a-z]+", lowered)) - {"the", "a", "an", "is", "are", "what", "do", "you", "your"}
+        best_line, best_score = None, 0
+        for line in documents.splitlines():
+            line = line.strip(" *-=\t")
+            if len(line) < 12:
+                continue
+            score = len(query_words & set(re.findall(r"[a-z]+", line.lower())))
+            if score > best_score:
+                best_line, best_score = line, score
+        return best_line or "Please visit www.plantify.com for details"
+
+    return (
+        "Happy to help with your plants! You can ask me to add items like "
+        "'2 peace lily' to your cart, or ask about our store and prices."
+    )
+
+
+class FakeBedrockRuntime:
+    """
+    Drop-in stand-in for a boto3 bedrock-runtime client.
+
+    Implements invoke_model and invoke_model_with_response_stream with the
+    Mistral response shape (outputs[0].text), so agents run offline with no
+    AWS credentials. Latency, errors and completions are configurable,
+    which makes routing and order logic measurable in CI and load tests.
+
+    Args:
+        latency_ms: Median latency of a call (time to first token when streaming)
+        latency_distribution: "fixed", "uniform" (0.5x-1.5x) or "lognormal"
+        latency_sigma: Shape of the lognormal distribution
+        error_rate: Probability that a call raises an injected error
+        error_codes: Error codes to inject, e.g. ThrottlingException
+        stream_chunk_words: Words per streamed chunk
+        stream_chunk_delay_ms: Delay between streamed chunks
+        responder: Callable(prompt) -> completion text
+        seed: Seed for reproducible latency and error sampling
+    """
+    def __init__(self, latency_ms=300, latency_distribution="lognormal", latency_sigma=0.4,
+                 error_rate=0.0, error_codes=("ThrottlingException",), stream_chunk_words=3,
+                 stream_chunk_delay_ms=15, responder=None, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.stream_chunk_words = stream_chunk_words
+        self.stream_chunk_delay_ms = stream_chunk_delay_ms
+        self.responder = responder or rule_based_completion
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.stream_calls = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls):
+        """Configure from FAKE_BEDROCK_* environment variables"""
+        return cls(
+            latency_ms=float(os.getenv("FAKE_BEDROCK_LATENCY_MS", 300)),
+            latency_distribution=os.getenv("FAKE_BEDROCK_LATENCY_DISTRIBUTION", "lognormal"),
+            error_rate=float(os.getenv("FAKE_BEDROCK_ERROR_RATE", 0)),
+            seed=int(os.getenv("FAKE_BEDROCK_SEED")) if os.getenv("FAKE_BEDROCK_SEED") else None
+        )
+
+    def _sample_latency(self):
+        with self._lock:
+            if self.latency_distribution == "fixed":
+                ms = self.latency_ms
+            elif self.latency_distribution == "uniform":
+                ms = self._random.uniform(0.5 * self.latency_ms, 1.5 * self.latency_ms)
+            else:
+                ms = self.latency_ms * self._random.lognormvariate(0, self.latency_sigma)
+        return ms / 1000
+
+    def _maybe_fail(self, operation_name):
+        with self._lock:
+            fail = self.error_rate and self._random.random() < self.error_rate
+            code = self._random.choice(self.error_codes) if fail else None
+            if fail:
+                self.errors += 1
+        if fail:
+            raise FakeClientError(code, operation_name)
+
+    def _complete(self, body):
+        request = json.loads(body)
+        text = self.responder(request.get("prompt", ""))
+        # Respect max_tokens roughly, counting words as tokens
+        words = text.split(" ")
+        return " ".join(words[:request.get("max_tokens", 512)])
+
+    def invoke_model(self, body, modelId, accept='application/json', contentType='application/json'):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self._sample_latency())
+        self._maybe_fail("InvokeModel")
+        payload = {"outputs": [{"text": self._complete(body), "stop_reason": "stop"}]}
+        return {
+            "body": io.BytesIO(json.dumps(payload).encode("utf-8")),
+            "contentType": "application/json"
+        }
+
+    def invoke_model_with_response_stream(self, body, modelId, accept='application/json', contentType='application/json'):
+        with self._lock:
+            self.stream_calls += 1
+        self._maybe_fail("InvokeModelWithResponseStream")
+        return {
+            "body": self._stream_events(self._complete(body)),
+            "contentType": "application/json"
+        }
+
+    def _stream_events(self, text):
+        time.sleep(self._sample_latency())
+        words = text.split(" ")
+        for start in range(0, len(words), self.stream_chunk_words):
+            chunk = " ".join(words[start:start + self.stream_chunk_words])
+            if start:
+                chunk = " " + chunk
+                time.sleep(self.stream_chunk_delay_ms / 1000)
+            payload = {"outputs": [{"text": chunk, "stop_reason": None}]}
+            yield {"chunk": {"bytes": json.dumps(payload).encode("utf-8")}}
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "stream_calls": self.stream_calls, "errors": self.errors}
+
+
+SAMPLE_CONVERSATIONS = [
+    ["What are your opening hours?", "Where is your store located?"],
+    ["add 2 peace lily", "also add 1 aloe vera", "apply code WELCOME10", "checkout"],
+    ["How much does the snake plant cost?", "buy 1 snake plant", "show my cart"],
+    ["Who will win the next election?"],
+    ["Do you deliver to Hardoi?", "I want some herbs for my kitchen"],
+]
+
+
+def main():
+    """Measure RouterAgent.process_message throughput against the fake runtime"""
+    import argparse
+    from concurrent.futures import ThreadPoolExecutor
+    from .router import RouterAgent
+    from .singleflight import get_singleflight
+
+    parser = argparse.ArgumentParser(description="Benchmark RouterAgent against a fake Bedrock runtime")
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    client = FakeBedrockRuntime(latency_ms=args.latency_ms, error_rate=args.error_rate, seed=args.seed)
+    router = RouterAgent(client=client)
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def run_conversation(index):
+        messages = []
+        for turn in SAMPLE_CONVERSATIONS[index % len(SAMPLE_CONVERSATIONS)]:
+            messages.append({"role": "user", "content": turn})
+            started = time.perf_counter()
+            messages.append(router.process_message(messages))
+            with latencies_lock:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(run_conversation, range(args.conversations)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pick = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+    print(f"turns: {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.1f} turns/s)")
+    print(f"latency ms: p50={pick(50):.1f} p95={pick(95):.1f} p99={pick(99):.1f}")
+    print(f"fake runtime: {client.stats()}")
+    flight = get_singleflight()
+    if flight is not None:
+        print(f"coalesced calls: {flight.stats()}")
+    for stage, stats in router.latency_report().items():
+        print(f"  {stage:<32} n={stats['count']:<5} p50={stats['p50_ms']:.1f} p95={stats['p95_ms']:.1f} p99={stats['p99_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
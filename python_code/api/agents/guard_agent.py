@@ -1,19 +1,38 @@
 import os
-import json
-from copy import deepcopy
-import boto3
-from .utils import get_chatbot_response
+from .call_policy import get_call_policy, ModelCallError
+from .history import MessageView
+from .json_extractor import extract_json, JSONExtractionError
+from .llm_cache import get_agent_cache
+from .tracing import get_tracer, annotate
+from .utils import get_chatbot_response, get_chatbot_response_async, get_bedrock_client
 
 class GuardAgent():
-    def __init__(self):
-        self.client = boto3.client(
-            service_name='bedrock-runtime',
-            region_name=os.getenv("AWS_REGION", "us-east-1")
-        )
+    OUTPUT_SCHEMA = {
+        "chain_of_thought": {"default": ""},
+        "decision": {"choices": ["allowed", "not allowed"]},
+        "message": {"default": ""}
+    }
+
+    def __init__(self, client=None, call_limiter=None):
+        # Shared, pooled bedrock-runtime client
+        self.client = client or get_bedrock_client()
         self.model_name = os.getenv("BEDROCK_MODEL_NAME", "mistral.mistral-7b-instruct-v0:2")
-
-    def get_response(self, message):
-        messages = deepcopy(message)
+        # Optional ModelCallLimiter for the async API
+        self.call_limiter = call_limiter
+        # Shared response cache, if this agent is opted in (LLM_CACHE_AGENTS)
+        self.response_cache = get_agent_cache("guard_agent")
+        # Deadline, retry and hedging policy for this agent's model calls
+        self.call_policy = get_call_policy("guard_agent")
+        # Per-stage spans and latency histograms
+        self.tracer = get_tracer()
+        # Local similarity pre-filter; only ambiguous messages reach the LLM.
+        # Imported here so numpy loads when the guard is built, not on import
+        from .guard_prefilter import get_guard_prefilter
+        self.prefilter = get_guard_prefilter()
+
+    def _build_messages(self, message):
+        # Read-only view of the last 3 messages; nothing is copied
+        recent = MessageView(message, window=3)
 
         system_prompt = """<<SYS>>
 You are a helpful AI assistant for a plant-selling store that offers plants and plant-related products.
@@ -48,43 +67,93 @@ IMPORTANT RULES:
 
 
         # Prepare messages in Mistral format
-        input_messages = [{"role": "system", "content": system_prompt}] + messages[-3:]
+        return [{"role": "system", "content": system_prompt}, *recent]
+
+    def _prefilter_decision(self, message):
+        """
+        Decide clearly allowed or blocked messages locally.
+        Returns an output dict, or None when the LLM guard is needed.
+        """
+        if self.prefilter is None:
+            return None
+        decision, allowed_score, blocked_score = self.prefilter.check(message[-1]['content'])
+        annotate(prefilter=decision or "ambiguous")
+        if decision is None:
+            return None
+        return {
+            "chain_of_thought": f"Local pre-filter (allowed {allowed_score:.2f}, blocked {blocked_score:.2f})",
+            "decision": decision,
+            "message": "" if decision == "allowed" else "Sorry, I can't help you with that. Can I help you with something else?"
+        }
+
+    def _log_decision(self, message, output):
+        """Record parsed LLM decisions as calibration data for the pre-filter"""
+        if os.getenv("GUARD_LOG_PATH") and not output.get("chain_of_thought", "").startswith("Invalid response"):
+            from .guard_prefilter import log_guard_decision
+            log_guard_decision(message[-1]['content'], output["decision"])
+
+    def get_response(self, message, state=None):
+        local_output = self._prefilter_decision(message)
+        if local_output is not None:
+            return self.postprocess(local_output)
+
+        input_messages = self._build_messages(message)
 
         # Get response from Mistral
-        chatbot_output = get_chatbot_response(
-            client=self.client,
-            model_name=self.model_name,
-            messages=input_messages,
-            temperature=0.1  # Lower temperature for more deterministic decisions
-        )
+        try:
+            chatbot_output = get_chatbot_response(
+                client=self.client,
+                model_name=self.model_name,
+                messages=input_messages,
+                temperature=0.1,  # Lower temperature for more deterministic decisions
+                cache=self.response_cache,
+                policy=self.call_policy
+            )
+        except ModelCallError:
+            # An empty output falls back to the default decision below
+            chatbot_output = ""
 
         # Clean and verify the output
-        chatbot_output = self.clean_json_output(chatbot_output)
-        output = self.postprocess(chatbot_output)
+        with self.tracer.span("post_process", agent="guard_agent"):
+            chatbot_output = self.clean_json_output(chatbot_output)
+            self._log_decision(message, chatbot_output)
+            output = self.postprocess(chatbot_output)
 
         return output
 
+    async def get_response_async(self, message, state=None):
+        local_output = self._prefilter_decision(message)
+        if local_output is not None:
+            return self.postprocess(local_output)
+
+        input_messages = self._build_messages(message)
+
+        try:
+            chatbot_output = await get_chatbot_response_async(
+                client=self.client,
+                model_name=self.model_name,
+                messages=input_messages,
+                temperature=0.1,
+                limiter=self.call_limiter,
+                cache=self.response_cache,
+                policy=self.call_policy
+            )
+        except ModelCallError:
+            # An empty output falls back to the default decision below
+            chatbot_output = ""
+
+        with self.tracer.span("post_process", agent="guard_agent"):
+            chatbot_output = self.clean_json_output(chatbot_output)
+            self._log_decision(message, chatbot_output)
+            return self.postprocess(chatbot_output)
+
     def clean_json_output(self, output):
         """Ensure the output is valid JSON with all required fields"""
         try:
-            # Remove any code blocks and whitespace
-            output = output.strip().replace("```json", "").replace("```", "")
-            
-            # Parse JSON
-            parsed = json.loads(output)
-            
-            # Validate required fields
-            required_fields = ["chain_of_thought", "decision", "message"]
-            if not all(field in parsed for field in required_fields):
-                raise ValueError("Missing required fields in JSON output")
-                
-            # Validate decision values
-            if parsed["decision"] not in ["allowed", "not allowed"]:
-                raise ValueError("Invalid decision value")
-                
-            return parsed
+            # Extract and repair the JSON locally, then validate decision values
+            return extract_json(output, schema=self.OUTPUT_SCHEMA)
             
-        except (json.JSONDecodeError, ValueError) as e:
+        except JSONExtractionError as e:
             # Default to allowed for plant-related queries
             return {
                 "chain_of_thought": f"Invalid response: {str(e)}. Defaulting to allowed as safeguard.",
@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import argparse
+import itertools
+import threading
+import numpy as np
+from .text_features import HashingVectorizer
+
+
+# Seed phrases per topic; each topic becomes one centroid
+ALLOWED_TOPICS = {
+    "ordering": [
+        "add 2 peace lily to my cart", "i want to buy a snake plant", "order 3 roses",
+        "add 2 roses", "1 tulsi plant please", "get me some marigold and jasmine",
+        "add aloe vera", "buy vermicompost", "checkout my order", "show my cart",
+        "apply discount code WELCOME10", "i would like to purchase a money plant",
+        "remove the jade plant from my cart", "place my order",
+    ],
+    "store_info": [
+        "what are your opening hours", "where is your store located", "store timings",
+        "do you deliver to lucknow", "what is your address", "when do you close",
+        "how can I contact the shop", "tell me about plantify", "delivery charges",
+    ],
+    "products": [
+        "how much does the snake plant cost", "price of rubber tree", "do you sell cactus",
+        "which fertilizer do you have", "do you have tulsi plant", "what succulents are available",
+        "show me flowering plants", "price list", "is lemon grass in stock",
+    ],
+    "plant_care": [
+        "how often should I water my peace lily", "which plant is good for low light",
+        "recommend indoor plants", "best plants for my balcony", "how to care for a jade plant",
+        "my plant leaves are turning yellow", "which compost is best for roses",
+    ],
+}
+
+BLOCKED_TOPICS = {
+    "politics_news": [
+        "who will win the election", "what do you think about the prime minister",
+        "latest news headlines", "which political party is better", "tell me about the government",
+    ],
+    "entertainment": [
+        "recommend a good movie", "who won the cricket match", "tell me a joke about football",
+        "what is the latest bollywood gossip", "best netflix series", "play some music",
+    ],
+    "personal_staff": [
+        "what is the owner's phone number", "how much salary do your staff get",
+        "is the store owner married", "tell me about the employees personal life",
+        "where does the owner live",
+    ],
+    "unrelated": [
+        "write my homework essay", "solve this math equation", "what is the bitcoin price",
+        "how is the weather today", "write python code for me", "stock market tips",
+    ],
+}
+
+class GuardPrefilter:
+    """
+    Answers clearly allowed and clearly blocked messages without the LLM.
+
+    Each message is compared with allowed-topic and blocked-topic centroids;
+    only the ambiguous middle band is left for the LLM guard.
+
+    Args:
+        embed_fn: Callable(list of texts) -> 2D array of vectors; defaults to
+            a local HashingVectorizer. Cached embeddings from
+            utils.get_embedding can be plugged in here.
+        allow_threshold: Minimum similarity to an allowed centroid to allow
+        block_threshold: Minimum similarity to a blocked centroid to block
+        margin: Required lead of the winning side over the other side
+    """
+    def __init__(self, embed_fn=None, allow_threshold=0.3, block_threshold=0.35, margin=0.1,
+                 allowed_topics=None, blocked_topics=None):
+        self.embed_fn = embed_fn or HashingVectorizer().transform
+        self.allow_threshold = allow_threshold
+        self.block_threshold = block_threshold
+        self.margin = margin
+
+        self.allowed_centroids = self._centroids(allowed_topics or ALLOWED_TOPICS)
+        self.blocked_centroids = self._centroids(blocked_topics or BLOCKED_TOPICS)
+
+        self._lock = threading.Lock()
+        self.counters = {"checked": 0, "allowed_locally": 0, "blocked_locally": 0, "passed_to_llm": 0}
+
+    def _centroids(self, topics):
+        centroids = []
+        for phrases in topics.values():
+            centroid = np.asarray(self.embed_fn(phrases), dtype=np.float32).mean(axis=0)
+            norm = np.linalg.norm(centroid)
+            centroids.append(centroid / norm if norm else centroid)
+        return np.vstack(centroids)
+
+    def scores(self, text):
+        """Best similarity to any allowed and any blocked centroid"""
+        vector = np.asarray(self.embed_fn([text]), dtype=np.float32)[0]
+        return float((self.allowed_centroids @ vector).max()), float((self.blocked_centroids @ vector).max())
+
+    def check(self, text):
+        """
+        Returns:
+            ("allowed" | "not allowed" | None, allowed_score, blocked_score);
+            None means the message is ambiguous and needs the LLM guard
+        """
+        allowed, blocked = self.scores(text)
+        if allowed >= self.allow_threshold and allowed - blocked >= self.margin:
+            decision, counter = "allowed", "allowed_locally"
+        elif blocked >= self.block_threshold and blocked - allowed >= self.margin:
+            decision, counter = "not allowed", "blocked_locally"
+        else:
+            decision, counter = None, "passed_to_llm"
+
+        with self._lock:
+            self.counters["checked"] += 1
+            self.counters[counter] += 1
+        return decision, allowed, blocked
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats["guard_calls_saved"] = stats["allowed_locally"] + stats["blocked_locally"]
+        return stats
+
+
+# Grid searched by calibrate()
+ALLOW_THRESHOLDS = (0.2, 0.25, 0.3, 0.35, 0.4, 0.5)
+BLOCK_THRESHOLDS = (0.25, 0.3, 0.35, 0.4, 0.5, 0.6)
+MARGINS = (0.05, 0.1, 0.15, 0.2, 0.3)
+
+
+def log_guard_decision(message, decision, path=None):
+    """Append an LLM guard decision to GUARD_LOG_PATH as calibration data"""
+    path = path or os.getenv("GUARD_LOG_PATH")
+    if not path:
+        return
+    record = {"message": message, "decision": decision, "timestamp": time.time()}
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Failed to log guard decision: {e}")
+
+
+def read_guard_log(path):
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                if record.get("decision") in ("allowed", "not allowed"):
+                    records.append(record)
+    return records
+
+
+def evaluate(scores, labels, allow_threshold, block_threshold, margin):
+    """
+    Error rates of one threshold setting on labelled messages.
+
+    false_block_rate is the share of allowed messages the pre-filter blocks,
+    false_allow_rate the share of not allowed messages it allows, and
+    coverage the share of all messages it decides without the LLM.
+    """
+    allowed_scores, blocked_scores = scores[:, 0], scores[:, 1]
+    allow = (allowed_scores >= allow_threshold) & (allowed_scores - blocked_scores >= margin)
+    block = ~allow & (blocked_scores >= block_threshold) & (blocked_scores - allowed_scores >= margin)
+    is_allowed = labels == "allowed"
+    allowed_total = int(is_allowed.sum())
+    blocked_total = len(labels) - allowed_total
+    return {
+        "allow_threshold": allow_threshold,
+        "block_threshold": block_threshold,
+        "margin": margin,
+        "false_block_rate": round(float((block & is_allowed).sum()) / allowed_total, 4) if allowed_total else 0.0,
+        "false_allow_rate": round(float((allow & ~is_allowed).sum()) / blocked_total, 4) if blocked_total else 0.0,
+        "coverage": round(float((allow | block).mean()), 4) if len(labels) else 0.0,
+    }
+
+
+def calibrate(records, max_false_block=0.01, max_false_allow=0.02, min_examples=50, prefilter=None):
+    """
+    Pick the thresholds that decide the most messages locally while keeping
+    both error rates within bounds, on messages labelled by the LLM guard
+    (or by hand).
+
+    Returns:
+        Report with the message counts, every setting tried, and the chosen
+        "calibration", which is None when no setting meets the bounds
+
+    Raises:
+        ValueError: With fewer than min_examples messages of either label
+    """
+    labels = np.array([record["decision"] for record in records])
+    counts = {label: int((labels == label).sum()) for label in ("allowed", "not allowed")}
+    scarce = {label: count for label, count in counts.items() if count < min_examples}
+    if scarce:
+        raise ValueError(f"need at least {min_examples} labelled messages per decision, got {counts}")
+
+    prefilter = prefilter or GuardPrefilter()
+    scores = np.array([prefilter.scores(record["message"]) for record in records], dtype=np.float32)
+    settings = [
+        evaluate(scores, labels, allow_threshold, block_threshold, margin)
+        for allow_threshold, block_threshold, margin in itertools.product(ALLOW_THRESHOLDS, BLOCK_THRESHOLDS, MARGINS)
+    ]
+    passing = [setting for setting in settings
+               if setting["false_block_rate"] <= max_false_block and setting["false_allow_rate"] <= max_false_allow]
+    chosen = max(passing, key=lambda setting: setting["coverage"]) if passing else None
+    return {
+        "examples": counts,
+        "max_false_block_rate": max_false_block,
+        "max_false_allow_rate": max_false_allow,
+        "calibration": chosen,
+        "settings": settings,
+    }
+
+
+def load_calibration(path):
+    """Thresholds written by the calibrate command, or None if unusable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            calibration = json.load(f)
+        return {key: float(calibration[key]) for key in ("allow_threshold", "block_threshold", "margin")}
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring guard pre-filter calibration {path}: {e}")
+        return None
+
+
+_prefilter = None
+_prefilter_lock = threading.Lock()
+
+
+def get_guard_prefilter():
+    """
+    Return the shared GuardPrefilter, or None when GUARD_PREFILTER is off.
+    Thresholds come from the calibration file at GUARD_PREFILTER_CALIBRATION;
+    without one the pre-filter stays off.
+    """
+    global _prefilter
+    if os.getenv("GUARD_PREFILTER", "false").lower() not in ("1", "true", "yes"):
+        return None
+    if _prefilter is None:
+        with _prefilter_lock:
+            if _prefilter is None:
+                path = os.getenv("GUARD_PREFILTER_CALIBRATION")
+                calibration = load_calibration(path) if path else None
+                if calibration is None:
+                    print("GUARD_PREFILTER is on but GUARD_PREFILTER_CALIBRATION has no calibration; "
+                          "every message goes to the LLM guard")
+                    return None
+                _prefilter = GuardPrefilter(**calibration)
+    return _prefilter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the guard pre-filter on labelled messages")
+    parser.add_argument("--log", required=True, help="JSONL of {message, decision}, e.g. written via GUARD_LOG_PATH")
+    parser.add_argument("--out", help="Where to write the calibration (GUARD_PREFILTER_CALIBRATION)")
+    parser.add_argument("--max-false-block", type=float, default=0.01,
+                        help="Highest share of allowed messages that may be blocked locally")
+    parser.add_argument("--max-false-allow", type=float, default=0.02,
+                        help="Highest share of not allowed messages that may be allowed locally")
+    parser.add_argument("--min-examples", type=int, default=50, help="Fewest messages per decision")
+    args = parser.parse_args()
+
+    try:
+        report = calibrate(read_guard_log(args.log), args.max_false_block, args.max_false_allow, args.min_examples)
+    except ValueError as e:
+        raise SystemExit(f"Not calibrating: {e}")
+    print(json.dumps(report, indent=2))
+
+    calibration = report["calibration"]
+    if calibration is None:
+        raise SystemExit("No threshold setting meets the error bounds; leave GUARD_PREFILTER off")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({**calibration, "examples": report["examples"], "calibrated_at": time.time()}, f, indent=2)
+        print(f"Calibration saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+from collections.abc import Mapping, Sequence
+
+
+def _freeze(value):
+    """Wrap containers in read-only views; other values are returned as is"""
+    if isinstance(value, (FrozenMapping, FrozenSequence)):
+        return value
+    if isinstance(value, Mapping):
+        return FrozenMapping(value)
+    if isinstance(value, (list, tuple)):
+        return FrozenSequence(value)
+    return value
+
+
+class FrozenMapping(Mapping):
+    """
+    Read-only view of a dict. Nested dicts and lists are wrapped only when
+    they are read, so viewing a message never copies its memory payload.
+    """
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, key):
+        return _freeze(self._data[key])
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"FrozenMapping({self._data!r})"
+
+
+class FrozenSequence(Sequence):
+    """Read-only view of a list; items are wrapped when they are read"""
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(_freeze(item) for item in self._data[index])
+        return _freeze(self._data[index])
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"FrozenSequence({self._data!r})"
+
+
+class MessageView(Sequence):
+    """
+    Read-only, windowed view over a conversation history.
+
+    Creating a view, narrowing it and slicing it are O(1): only the
+    messages an agent actually reads are wrapped, and never copied. A
+    view is a snapshot of the history's length when it was created, so
+    messages appended later are not visible.
+
+    Args:
+        messages: The conversation history (a list or another MessageView)
+        window: Keep only the last `window` messages; None keeps them all
+    """
+    __slots__ = ("_messages", "_start", "_stop")
+
+    def __init__(self, messages, window=None, _bounds=None):
+        if isinstance(messages, MessageView) and _bounds is None:
+            messages, _bounds = messages._messages, (messages._start, messages._stop)
+        self._messages = messages
+        start, stop = _bounds if _bounds is not None else (0, len(messages))
+        if window is not None:
+            start = max(start, stop - window)
+        self._start, self._stop = start, stop
+
+    def window(self, size):
+        """View of the last `size` messages"""
+        return MessageView(self._messages, size, (self._start, self._stop))
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return MessageView(self._messages, None, (self._start + start, self._start + max(start, stop)))
+            return tuple(self[i] for i in range(start, stop, step))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message index out of range")
+        return _freeze(self._messages[self._start + index])
+
+    def __repr__(self):
+        return f"MessageView({len(self)} of {len(self._messages)} messages)"
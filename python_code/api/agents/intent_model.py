@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from .text_features import char_ngrams
+
+
+CONTEXT_FEATURES = [
+    "in_ordering_process",
+    "has_cart_items",
+    "last_agent=order_taking_agent",
+    "last_agent=details_agent",
+    "last_agent=guard_agent",
+]
+
+
+def context_vector(context):
+    """Encode the dict from ClassificationAgent._conversation_context"""
+    context = context or {}
+    last_agent = context.get("last_agent")
+    return np.array([
+        float(bool(context.get("in_ordering_process"))),
+        float(bool(context.get("has_cart_items"))),
+        float(last_agent == "order_taking_agent"),
+        float(last_agent == "details_agent"),
+        float(last_agent == "guard_agent"),
+    ], dtype=np.float32)
+
+
+class IntentClassifier:
+    """
+    Character n-gram TF-IDF plus multinomial logistic regression, in NumPy.
+
+    Scores a message in microseconds so ClassificationAgent only needs the
+    LLM when the local model is unsure.
+
+    Args:
+        max_features: Vocabulary size (most frequent n-grams are kept)
+        l2: L2 regularisation strength
+        epochs: Gradient descent epochs
+        learning_rate: Gradient descent step size
+        min_examples_per_class: Fewest training examples fit() accepts for any label
+    """
+    def __init__(self, max_features=5000, l2=1e-3, epochs=300, learning_rate=0.5, min_examples_per_class=5):
+        self.max_features = max_features
+        self.l2 = l2
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.min_examples_per_class = min_examples_per_class
+
+        self.vocabulary = {}
+        self.idf = None
+        self.weights = None
+        self.bias = None
+        self.labels = []
+
+    def _tfidf(self, text):
+        """Sparse (indices, values) TF-IDF vector, sublinear tf and L2 normalised"""
+        counts = {}
+        for gram in char_ngrams(text):
+            index = self.vocabulary.get(gram)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        if not counts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = (1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))) * self.idf[indices]
+        norm = np.linalg.norm(values)
+        return indices, values / norm if norm else values
+
+    def _sparse_features(self, texts, contexts):
+        """
+        Coordinate-format TF-IDF rows plus the dense context block.
+
+        Returns:
+            (rows, columns, values, context_matrix); memory grows with the
+            number of n-grams present, not examples x vocabulary
+        """
+        rows, columns, values = [], [], []
+        for row, text in enumerate(texts):
+            indices, weights = self._tfidf(text)
+            rows.append(np.full(len(indices), row, dtype=np.int64))
+            columns.append(indices)
+            values.append(weights)
+        context_matrix = np.vstack([context_vector(context) for context in contexts])
+        return np.concatenate(rows), np.concatenate(columns), np.concatenate(values), context_matrix
+
+    def fit(self, texts, contexts, labels):
+        """
+        Build the vocabulary and train on (message, context, label) examples.
+
+        Raises:
+            ValueError: fewer than two labels, or a label with fewer than
+                min_examples_per_class examples; such a model would be
+                confident about every message and take over all routing
+        """
+        counts = {}
+        for label in labels:
+            counts[label] = counts.get(label, 0) + 1
+        if len(counts) < 2:
+            raise ValueError(f"Need examples of at least two labels, got {sorted(counts)}")
+        scarce = {label: count for label, count in counts.items() if count < self.min_examples_per_class}
+        if scarce:
+            raise ValueError(f"Need at least {self.min_examples_per_class} examples per label, got {scarce}")
+
+        document_frequency = {}
+        for text in texts:
+            for gram in set(char_ngrams(text)):
+                document_frequency[gram] = document_frequency.get(gram, 0) + 1
+        kept = sorted(document_frequency, key=lambda g: (-document_frequency[g], g))[:self.max_features]
+        self.vocabulary = {gram: index for index, gram in enumerate(kept)}
+        frequencies = np.array([document_frequency[g] for g in kept], dtype=np.float32)
+        self.idf = (np.log((1 + len(texts)) / (1 + frequencies)) + 1).astype(np.float32)
+
+        self.labels = sorted(set(labels))
+        targets = np.zeros((len(labels), len(self.labels)), dtype=np.float32)
+        targets[np.arange(len(labels)), [self.labels.index(label) for label in labels]] = 1
+
+        rows, columns, values, context_matrix = self._sparse_features(texts, contexts)
+        n_vocab = len(self.vocabulary)
+        self.weights = np.zeros((n_vocab + len(CONTEXT_FEATURES), len(self.labels)), dtype=np.float32)
+        self.bias = np.zeros(len(self.labels), dtype=np.float32)
+        for _ in range(self.epochs):
+            logits = context_matrix @ self.weights[n_vocab:] + self.bias
+            np.add.at(logits, rows, values[:, None] * self.weights[columns])
+            error = (self._softmax(logits) - targets) / len(labels)
+
+            gradient = self.l2 * self.weights
+            np.add.at(gradient, columns, values[:, None] * error[rows])
+            gradient[n_vocab:] += context_matrix.T @ error
+            self.weights -= self.learning_rate * gradient
+            self.bias -= self.learning_rate * error.sum(axis=0)
+        return self
+
+    @staticmethod
+    def _softmax(logits):
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    def predict_proba(self, text, context=None):
+        """Return {label: probability} for one message"""
+        indices, values = self._tfidf(text)
+        logits = values @ self.weights[indices] + context_vector(context) @ self.weights[len(self.vocabulary):] + self.bias
+        return dict(zip(self.labels, self._softmax(logits).tolist()))
+
+    def predict(self, text, context=None):
+        """Return (label, confidence) for one message"""
+        probabilities = self.predict_proba(text, context)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+    def save(self, path):
+        """Serialise the model to a single .npz artifact"""
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez_compressed(
+            path,
+            vocabulary=np.array(json.dumps(vocabulary)),
+            labels=np.array(json.dumps(self.labels)),
+            idf=self.idf,
+            weights=self.weights,
+            bias=self.bias
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            model = cls()
+            vocabulary = json.loads(str(data["vocabulary"]))
+            model.vocabulary = {gram: index for index, gram in enumerate(vocabulary)}
+            model.labels = json.loads(str(data["labels"]))
+            model.idf = data["idf"]
+            model.weights = data["weights"]
+            model.bias = data["bias"]
+        return model
+
+
+def load_intent_model(path=None):
+    """Load the model named by INTENT_MODEL_PATH, or return None if unset or missing"""
+    path = path or os.getenv("INTENT_MODEL_PATH")
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        model = IntentClassifier.load(path)
+    except Exception as e:
+        print(f"Failed to load intent model {path}: {e}")
+        return None
+    if len(model.labels) < 2:
+        print(f"Ignoring intent model {path}: it knows only {model.labels}")
+        return None
+    return model
+
+
+def log_routing_decision(message, context, decision, path=None):
+    """Append an LLM routing decision to ROUTING_LOG_PATH as training data"""
+    path = path or os.getenv("ROUTING_LOG_PATH")
+    if not path:
+        return
+    record = {"message": message, "context": context, "decision": decision, "timestamp": time.time()}
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Failed to log routing decision: {e}")
+
+
+def read_routing_log(path):
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def evaluate(model, records, threshold):
+    """Accuracy against the logged LLM labels, coverage above threshold and latency"""
+    correct = confident = confident_correct = 0
+    latencies = []
+    for record in records:
+        started = time.perf_counter()
+        label, confidence = model.predict(record["message"], record.get("context"))
+        latencies.append(time.perf_counter() - started)
+        hit = label == record["decision"]
+        correct += hit
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += hit
+
+    latencies = np.array(latencies) * 1e6
+    total = len(records) or 1
+    return {
+        "examples": len(records),
+        "accuracy": round(correct / total, 4),
+        "threshold": threshold,
+        "coverage": round(confident / total, 4),
+        "accuracy_above_threshold": round(confident_correct / confident, 4) if confident else None,
+        "latency_us_mean": round(float(latencies.mean()), 1) if len(records) else None,
+        "latency_us_p99": round(float(np.percentile(latencies, 99)), 1) if len(records) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and evaluate the local intent classifier")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    train = subcommands.add_parser("train", help="Train from a routing decision log")
+    train.add_argument("--log", required=True, help="JSONL written via ROUTING_LOG_PATH")
+    train.add_argument("--out", required=True, help="Model artifact path (.npz)")
+    train.add_argument("--test-split", type=float, default=0.2)
+    train.add_argument("--threshold", type=float, default=0.85)
+    train.add_argument("--seed", type=int, default=13)
+    train.add_argument("--min-examples", type=int, default=5, help="Fewest examples per label")
+
+    report = subcommands.add_parser("report", help="Compare a trained model with logged LLM labels")
+    report.add_argument("--log", required=True)
+    report.add_argument("--model", required=True)
+    report.add_argument("--threshold", type=float, default=0.85)
+
+    args = parser.parse_args()
+    records = read_routing_log(args.log)
+
+    if args.command == "train":
+        order = np.random.default_rng(args.seed).permutation(len(records))
+        split = int(len(records) * (1 - args.test_split))
+        train_records = [records[i] for i in order[:split]]
+        test_records = [records[i] for i in order[split:]]
+        if not test_records:
+            raise SystemExit(f"Not training: --test-split {args.test_split} leaves no held-out examples "
+                             f"out of {len(records)}; raise it or log more decisions")
+
+        try:
+            model = IntentClassifier(min_examples_per_class=args.min_examples).fit(
+                [r["message"] for r in train_records],
+                [r.get("context") for r in train_records],
+                [r["decision"] for r in train_records]
+            )
+        except ValueError as e:
+            raise SystemExit(f"Not training: {e}")
+        model.save(args.out)
+        print(f"Trained on {len(train_records)} examples, saved to {args.out}")
+        print(json.dumps(evaluate(model, test_records, args.threshold), indent=2))
+    else:
+        model = IntentClassifier.load(args.model)
+        print(json.dumps(evaluate(model, records, args.threshold), indent=2))
+
+
+if __name__ == "__main__":
+    main()
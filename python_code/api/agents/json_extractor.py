@@ -0,0 +1,198 @@
+import re
+import json
+
+
+class JSONExtractionError(ValueError):
+    """Raised when no valid JSON object can be recovered from model output"""
+
+
+_CODE_FENCE = re.compile(r"```(?:json|JSON)?")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PYTHON_LITERALS = re.compile(r"(?<![\w\"])(True|False|None)(?![\w\"])")
+_UNQUOTED_KEY = re.compile(r"([{,]\s*)([A-Za-z_][\w\-]*)(\s*:)")
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def strip_code_fences(text):
+    """Remove markdown code fences around model output"""
+    return _CODE_FENCE.sub("", text).strip()
+
+
+def _closes_single_quoted(text, index):
+    """A ' ends a single-quoted string only if JSON punctuation follows"""
+    rest = text[index + 1:].lstrip()
+    return not rest or rest[0] in ",:}]"
+
+
+def _balanced_objects(text):
+    """
+    Yield every top-level {...} span in text, in order. Braces inside
+    strings are ignored; an object left open at the end of the text
+    (truncated output) is closed with the missing braces.
+    """
+    depth = 0
+    start = None
+    quote = None
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == "\\":
+                i += 1
+            elif char == quote and (quote == '"' or _closes_single_quoted(text, i)):
+                quote = None
+        elif char in "\"'" and start is not None:
+            quote = char
+        elif char == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif char == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                yield text[start:i + 1]
+                start = None
+        i += 1
+
+    if start is not None and depth:
+        tail = text[start:]
+        if quote:
+            tail += quote
+        yield tail + "}" * depth
+
+
+def _single_to_double_quotes(text):
+    """Convert single-quoted strings to double-quoted ones"""
+    out = []
+    quote = None
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if quote == '"':
+            out.append(char)
+            if char == "\\" and i + 1 < len(text):
+                out.append(text[i + 1])
+                i += 1
+            elif char == '"':
+                quote = None
+        elif quote == "'":
+            if char == "\\" and i + 1 < len(text):
+                nxt = text[i + 1]
+                out.append("'" if nxt == "'" else "\\" + nxt)
+                i += 1
+            elif char == "'" and _closes_single_quoted(text, i):
+                out.append('"')
+                quote = None
+            elif char == '"':
+                out.append('\\"')
+            else:
+                out.append(char)
+        elif char == '"':
+            quote = '"'
+            out.append(char)
+        elif char == "'":
+            quote = "'"
+            out.append('"')
+        else:
+            out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def repair_json(candidate):
+    """
+    Fix the mistakes small models commonly make: single quotes, trailing
+    commas, Python literals and unquoted keys.
+
+    Repairs are applied in stages, least invasive first, and each stage is
+    yielded so the caller can stop at the first one that parses.
+    """
+    repaired = _TRAILING_COMMA.sub(r"\1", _single_to_double_quotes(candidate))
+    yield repaired
+    repaired = _PYTHON_LITERALS.sub(lambda m: _LITERALS[m.group(1)], repaired)
+    yield repaired
+    yield _UNQUOTED_KEY.sub(r'\1"\2"\3', repaired)
+
+
+def _parse(candidate):
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError as e:
+        error = e
+    for repaired in repair_json(candidate):
+        try:
+            return json.loads(repaired)
+        except json.JSONDecodeError as e:
+            error = e
+    raise JSONExtractionError(f"Unrepairable JSON: {error}")
+
+
+def validate_schema(obj, schema):
+    """
+    Check a parsed object against a schema and return the normalised object.
+
+    The schema maps field names to rules:
+        type: expected Python type (default str)
+        choices: allowed values; string values are matched case-insensitively
+        default: value used when the field is missing (otherwise required)
+    """
+    if not isinstance(obj, dict):
+        raise JSONExtractionError("Expected a JSON object")
+
+    result = dict(obj)
+    for field, rule in schema.items():
+        if field not in result:
+            if "default" in rule:
+                result[field] = rule["default"]
+                continue
+            raise JSONExtractionError(f"Missing required field: {field}")
+
+        value = result[field]
+        expected_type = rule.get("type", str)
+        if not isinstance(value, expected_type):
+            raise JSONExtractionError(f"Field {field} should be {expected_type.__name__}")
+
+        choices = rule.get("choices")
+        if choices:
+            normalised = value.strip().lower() if isinstance(value, str) else value
+            if normalised not in choices:
+                raise JSONExtractionError(f"Invalid value for {field}: {value!r}")
+            result[field] = normalised
+    return result
+
+
+def extract_json(text, schema=None):
+    """
+    Recover the first valid JSON object from noisy model output, without
+    another model call.
+
+    Strips code fences, scans for balanced {...} objects, repairs common
+    syntax mistakes and, when a schema is given, returns the first object
+    that satisfies it.
+
+    Raises:
+        JSONExtractionError: no object could be parsed (and validated)
+    """
+    if not isinstance(text, str) or not text.strip():
+        raise JSONExtractionError("Empty model output")
+
+    text = strip_code_fences(text)
+    last_error = JSONExtractionError("No JSON object found in model output")
+
+    for candidate in _balanced_objects(text):
+        try:
+            parsed = _parse(candidate)
+        except JSONExtractionError as e:
+            last_error = e
+            continue
+
+        if schema is None:
+            if isinstance(parsed, dict):
+                return parsed
+            continue
+        try:
+            return validate_schema(parsed, schema)
+        except JSONExtractionError as e:
+            last_error = e
+
+    raise last_error
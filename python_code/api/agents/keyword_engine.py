@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import threading
+from functools import lru_cache
+
+
+DEFAULT_KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_keywords.json")
+
+
+def _normalise(keyword):
+    return " ".join(keyword.rstrip("*").lower().split())
+
+
+class KeywordEngine:
+    """
+    Matches every intent's keywords against a message in one regex pass.
+
+    Keyword specs, per intent:
+        "add to cart"      phrase, matched on word boundaries (so "add" does
+                           not match "address"); runs of spaces match any whitespace
+        "purchas*"         prefix, matches purchase, purchasing, ...
+        "re:show.*items"   raw regular expression
+
+    All literal keywords are merged into one character trie and compiled,
+    together with the raw patterns, into a single zero-width pattern tried
+    at each word start. Each trie leaf ends in an empty marker group whose
+    index maps to the intents of that keyword and of any shorter keyword
+    on the same path, so overlapping keywords ("add" / "add to cart") all
+    report their intents. Raw patterns are only tried at positions where
+    no literal keyword starts.
+
+    Args:
+        intents: Mapping of intent name to keyword specs
+    """
+    def __init__(self, intents):
+        self.intents = {name: list(keywords) for name, keywords in intents.items()}
+        # Marker group index -> intents that matched when it is the last group
+        self._leaf_intents = {}
+        self._group_count = 0
+
+        trie = {}
+        raw_patterns = []
+        for intent, keywords in self.intents.items():
+            for keyword in keywords:
+                if keyword.startswith("re:"):
+                    raw_patterns.append((keyword[3:], intent))
+                    continue
+                text = _normalise(keyword)
+                if not text:
+                    continue
+                node = trie
+                for char in text:
+                    node = node.setdefault(char, {})
+                # A keyword ending in punctuation ("$$") needs no word boundary
+                kind = "prefix" if keyword.endswith("*") or not text[-1].isalnum() else "end"
+                node.setdefault((kind,), set()).add(intent)
+
+        alternatives = [self._trie_regex(trie, frozenset())] if trie else []
+        for pattern, intent in raw_patterns:
+            # Groups inside the raw pattern come before its marker
+            self._group_count += re.compile(pattern).groups
+            alternatives.append(f"(?:{pattern})" + self._marker({intent}))
+
+        self._pattern = re.compile(r"(?<!\w)(?=(?:" + "|".join(alternatives) + "))", re.IGNORECASE)
+        # Router, details and order agents all check the same message in a
+        # turn, so the intent set of recent messages is kept
+        self.intents_in = lru_cache(maxsize=1024)(self._intents_in)
+
+    def _marker(self, intents):
+        self._group_count += 1
+        self._leaf_intents[self._group_count] = frozenset(intents)
+        return "()"
+
+    def _trie_regex(self, node, inherited):
+        """Regex for a trie node; inherited holds intents already matched on the path"""
+        end_intents = node.get(("end",), set())
+        prefix_intents = node.get(("prefix",), set())
+
+        alternatives = []
+        for char in sorted(key for key in node if isinstance(key, str)):
+            carried = inherited | prefix_intents
+            if not (char.isalnum() or char == "_"):
+                carried |= end_intents
+            piece = r"\s+" if char == " " else re.escape(char)
+            alternatives.append(piece + self._trie_regex(node[char], carried))
+        if end_intents:
+            alternatives.append(r"(?!\w)" + self._marker(inherited | end_intents | prefix_intents))
+        if prefix_intents:
+            alternatives.append(r"\w*" + self._marker(inherited | prefix_intents))
+
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    @classmethod
+    def from_file(cls, path=None):
+        with open(path or DEFAULT_KEYWORDS_PATH, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def match(self, text):
+        """Return {intent: [matched terms]} for every intent found in text"""
+        found = {}
+        for match in self._pattern.finditer(text):
+            marker = match.lastindex
+            term = text[match.start():match.start(marker)]
+            for intent in self._leaf_intents[marker]:
+                found.setdefault(intent, []).append(term)
+        return found
+
+    def _intents_in(self, text):
+        """Return the frozenset of intents found in text"""
+        return frozenset(self.match(text))
+
+    def has_intent(self, text, intent):
+        return intent in self.intents_in(text)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_keyword_engine():
+    """Return the shared KeywordEngine built from INTENT_KEYWORDS_PATH or the bundled lists"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = KeywordEngine.from_file(os.getenv("INTENT_KEYWORDS_PATH") or DEFAULT_KEYWORDS_PATH)
+    return _engine
@@ -0,0 +1,354 @@
+import os
+import re
+import time
+import numpy as np
+from .bm25 import BM25Index, combine_scores
+from .embedding_store import DEFAULT_CACHE_DIR, EmbeddingStore
+from .text_features import HashingVectorizer
+
+try:
+    import faiss
+except ImportError:  # NumPy fallback below
+    faiss = None
+
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    """Rough Mistral token count (about 4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class Chunk:
+    """A retrievable piece of one knowledge document"""
+    __slots__ = ("chunk_id", "doc_name", "position", "text", "tokens")
+
+    def __init__(self, doc_name, position, text):
+        self.chunk_id = f"{doc_name}:{position}"
+        self.doc_name = doc_name
+        self.position = position
+        self.text = text
+        self.tokens = estimate_tokens(text)
+
+    def __repr__(self):
+        return f"Chunk({self.chunk_id!r}, {self.tokens} tokens)"
+
+
+def chunk_document(doc_name, text, max_tokens=120):
+    """
+    Split a document into chunks of at most max_tokens, on paragraph
+    boundaries where possible, then on lines and sentences. Short
+    paragraphs are packed together so list-like documents (the price list)
+    do not become one chunk per line.
+    """
+    pieces = []
+    for paragraph in _PARAGRAPH.split(text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if estimate_tokens(line) <= max_tokens:
+                pieces.append(line)
+            else:
+                pieces.extend(s for s in _SENTENCE.split(line) if s)
+
+    chunks, current = [], []
+    for piece in pieces:
+        if current and estimate_tokens("\n".join(current + [piece])) > max_tokens:
+            chunks.append("\n".join(current))
+            current = []
+        current.append(piece)
+    if current:
+        chunks.append("\n".join(current))
+    return [Chunk(doc_name, position, chunk) for position, chunk in enumerate(chunks)]
+
+
+class LocalEmbedder:
+    """Stand-in embedder: hashed words and character n-grams, no service needed"""
+    def __init__(self, dimension=2048):
+        self.dimension = dimension
+        self.name = f"local-{dimension}"
+        self._vectorizer = HashingVectorizer(n_features=dimension)
+
+    def embed(self, texts):
+        return self._vectorizer.transform(list(texts))
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+
+class APIEmbedder:
+    """
+    Embeds with utils.get_embedding (an OpenAI-compatible embeddings API),
+    sending texts in batches.
+    """
+    def __init__(self, client, model_name, batch_size=128):
+        self.client = client
+        self.model_name = model_name
+        self.name = model_name
+        self.batch_size = batch_size
+
+    def embed(self, texts):
+        from .utils import get_embedding
+
+        texts = list(texts)
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(get_embedding(self.client, self.model_name, texts[start:start + self.batch_size]))
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+
+def get_embedder():
+    """
+    KNOWLEDGE_EMBEDDING_MODEL selects an embeddings API model (the openai
+    client reads its own credentials), called with up to
+    KNOWLEDGE_EMBEDDING_BATCH texts at a time; without it the local embedder
+    is used, with KNOWLEDGE_EMBEDDING_DIM dimensions.
+
+    Vectors are kept in an EmbeddingStore under KNOWLEDGE_EMBEDDING_CACHE_DIR,
+    which defaults to python_code/.embedding_cache for an API model and to
+    none (embed on every start) for the local embedder.
+    """
+    model_name = os.getenv("KNOWLEDGE_EMBEDDING_MODEL")
+    if model_name:
+        from openai import OpenAI
+        embedder = APIEmbedder(OpenAI(), model_name, batch_size=int(os.getenv("KNOWLEDGE_EMBEDDING_BATCH", 512)))
+    else:
+        embedder = LocalEmbedder(dimension=int(os.getenv("KNOWLEDGE_EMBEDDING_DIM", 2048)))
+
+    cache_dir = os.getenv("KNOWLEDGE_EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR if model_name else "")
+    if cache_dir:
+        return EmbeddingStore(embedder, cache_dir)
+    return embedder
+
+
+class VectorIndex:
+    """Inner-product search over normalised vectors: FAISS when installed, NumPy otherwise"""
+    def __init__(self, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.size = len(vectors)
+        if faiss is not None:
+            self.backend = "faiss"
+            self._index = faiss.IndexFlatIP(vectors.shape[1])
+            if self.size:
+                self._index.add(vectors)
+        else:
+            self.backend = "numpy"
+            self._vectors = vectors
+
+    def search(self, vector, k):
+        """Return (scores, positions) of the k best matches, best first"""
+        k = min(k, self.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(1, -1)
+        if self.backend == "faiss":
+            scores, positions = self._index.search(vector, k)
+            return scores[0], positions[0]
+        scores = self._vectors @ vector[0]
+        positions = np.argpartition(-scores, k - 1)[:k] if k < self.size else np.arange(self.size)
+        positions = positions[np.argsort(-scores[positions])]
+        return scores[positions], positions
+
+
+class KnowledgeIndex:
+    """
+    Chunked, indexed knowledge documents for DetailsAgent.
+
+    Documents are chunked and indexed once (the ingestion step); each
+    question then retrieves only its best chunks, up to a token budget, so
+    the prompt grows with the question rather than with the knowledge base.
+
+    Chunks are ranked by KNOWLEDGE_RETRIEVAL: "hybrid" blends BM25 and
+    vector similarity (KNOWLEDGE_LEXICAL_WEIGHT of the score is BM25),
+    "vector" uses embeddings only, and "bm25" uses the inverted index only
+    and never calls an embedder.
+
+    Args:
+        documents: {doc_name: text}
+        embedder: Object with embed(list of texts) -> normalised 2D array
+            and embed_query(text) -> normalised vector
+        chunk_tokens: Target chunk size (KNOWLEDGE_CHUNK_TOKENS)
+        previous: An earlier KnowledgeIndex; documents whose text is
+            unchanged reuse its chunks and vectors instead of being re-embedded
+        retrieval: "hybrid", "vector" or "bm25" (KNOWLEDGE_RETRIEVAL)
+    """
+    RETRIEVAL_MODES = ("hybrid", "vector", "bm25")
+
+    def __init__(self, documents, embedder=None, chunk_tokens=None, previous=None, retrieval=None):
+        self.retrieval = (retrieval or os.getenv("KNOWLEDGE_RETRIEVAL", "hybrid")).lower()
+        if self.retrieval not in self.RETRIEVAL_MODES:
+            print(f"Unknown KNOWLEDGE_RETRIEVAL {self.retrieval!r}, using hybrid")
+            self.retrieval = "hybrid"
+        self.lexical_weight = float(os.getenv("KNOWLEDGE_LEXICAL_WEIGHT", 0.5))
+        if self.retrieval == "bm25":
+            self.embedder = None
+        else:
+            self.embedder = embedder or (previous.embedder if previous is not None and previous.embedder
+                                         else get_embedder())
+        self.chunk_tokens = int(chunk_tokens or os.getenv("KNOWLEDGE_CHUNK_TOKENS", 120))
+
+        started = time.perf_counter()
+        reusable = {}
+        if (previous is not None and previous.chunk_tokens == self.chunk_tokens
+                and previous.retrieval == self.retrieval):
+            reusable = previous._parts
+        self._parts = {}
+        self.embedded_documents = []
+        for name, text in documents.items():
+            part = reusable.get(name)
+            if part is None or part[0] != text:
+                part = (text, chunk_document(name, text, self.chunk_tokens), None)
+                self.embedded_documents.append(name)
+            self._parts[name] = part
+
+        # Embed the chunks of every new or changed document in one call
+        if self.embedder is not None and self.embedded_documents:
+            texts = [chunk.text for name in self.embedded_documents for chunk in self._parts[name][1]]
+            vectors = self.embedder.embed(texts)
+            start = 0
+            for name in self.embedded_documents:
+                text, chunks, _ = self._parts[name]
+                self._parts[name] = (text, chunks, vectors[start:start + len(chunks)])
+                start += len(chunks)
+
+        self.chunks = [chunk for _, chunks, _ in self._parts.values() for chunk in chunks]
+        self.index = None
+        if self.embedder is not None:
+            vectors = [vectors for _, chunks, vectors in self._parts.values() if chunks]
+            self.index = VectorIndex(np.vstack(vectors) if vectors else np.empty((0, 1), dtype=np.float32))
+        # Doc ids are positions in self.chunks
+        self.lexical = None
+        if self.retrieval != "vector":
+            self.lexical = BM25Index((position, chunk.text) for position, chunk in enumerate(self.chunks))
+        self.build_ms = (time.perf_counter() - started) * 1000
+
+    def _rank(self, query, fetch):
+        """(position, score) pairs of candidate chunks, best first"""
+        semantic = {}
+        if self.index is not None:
+            scores, positions = self.index.search(self.embedder.embed_query(query), fetch)
+            semantic = {int(position): float(score) for score, position in zip(scores, positions)}
+        if self.lexical is None:
+            return list(semantic.items())
+        lexical = self.lexical.scores(query)
+        if not semantic:
+            return sorted(lexical.items(), key=lambda item: -item[1])
+        combined = combine_scores(lexical, semantic, self.lexical_weight)
+        return sorted(combined.items(), key=lambda item: -item[1])
+
+    def search(self, query, k=None, token_budget=None, documents=None):
+        """
+        The best chunks for query, best first, within token_budget.
+
+        Args:
+            k: Most chunks to return (KNOWLEDGE_TOP_K)
+            token_budget: Most estimated tokens of chunk text (KNOWLEDGE_TOKEN_BUDGET)
+            documents: Only consider chunks of these documents
+
+        Returns:
+            list of (Chunk, score)
+        """
+        k = int(k or os.getenv("KNOWLEDGE_TOP_K", 6))
+        token_budget = int(token_budget or os.getenv("KNOWLEDGE_TOKEN_BUDGET", 600))
+        # Over-fetch when filtering by document, so k candidates remain, and
+        # for hybrid ranking, so BM25 can promote chunks below the vector top k
+        if documents:
+            fetch = len(self.chunks)
+        elif self.lexical is not None:
+            fetch = max(4 * k, 50)
+        else:
+            fetch = k
+
+        selected, used = [], 0
+        for position, score in self._rank(query, fetch):
+            chunk = self.chunks[position]
+            if documents and chunk.doc_name not in documents:
+                continue
+            if used + chunk.tokens > token_budget:
+                continue
+            selected.append((chunk, float(score)))
+            used += chunk.tokens
+            if len(selected) >= k:
+                break
+        return selected
+
+    def stats(self):
+        embedder = self.embedder.embedder if isinstance(self.embedder, EmbeddingStore) else self.embedder
+        stats = {
+            "chunks": len(self.chunks),
+            "retrieval": self.retrieval,
+            "backend": self.index.backend if self.index is not None else None,
+            "embedder": type(embedder).__name__ if embedder is not None else None,
+            "build_ms": round(self.build_ms, 3),
+        }
+        if isinstance(self.embedder, EmbeddingStore):
+            stats["embedding_store"] = self.embedder.stats()
+        return stats
+
+
+def format_context(results):
+    """Group retrieved chunks by document, in their original order, for the prompt"""
+    by_document = {}
+    for chunk, _ in sorted(results, key=lambda result: (result[0].doc_name, result[0].position)):
+        by_document.setdefault(chunk.doc_name, []).append(chunk.text)
+    return "".join(
+        f"===== {doc_name.upper().replace('_', ' ')} =====\n" + "\n".join(texts) + "\n"
+        for doc_name, texts in by_document.items()
+    )
+
+
+def main():
+    """Compare prompt context size of whole documents and retrieved chunks as documents are added"""
+    import argparse
+    import random
+    from .details_agent import DetailsAgent
+    from .fake_bedrock import FakeBedrockRuntime
+
+    parser = argparse.ArgumentParser(description="Build the knowledge index and inspect retrieval")
+    parser.add_argument("--query", action="append", default=None)
+    parser.add_argument("--extra-documents", type=int, nargs="*", default=[0, 10, 100])
+    parser.add_argument("--retrieval", choices=KnowledgeIndex.RETRIEVAL_MODES, default=None)
+    args = parser.parse_args()
+    queries = args.query or ["What are your opening hours?", "How much is the peace lily?",
+                             "Do you deliver to Hardoi?"]
+
+    agent = DetailsAgent(client=FakeBedrockRuntime(latency_ms=0))
+    base = {name: data["content"] for name, data in agent.knowledge_base.items()}
+    rng = random.Random(7)
+    words = " ".join(base.values()).split()
+
+    for extra in args.extra_documents:
+        documents = dict(base)
+        for index in range(extra):
+            documents[f"care_guide_{index}"] = "\n\n".join(
+                " ".join(rng.choice(words) for _ in range(80)) for _ in range(6)
+            )
+        index = KnowledgeIndex(documents, retrieval=args.retrieval)
+        whole = sum(estimate_tokens(text) for text in documents.values())
+        print(f"\n{len(documents)} documents, {index.stats()}")
+        print(f"  whole-document context: {whole} tokens")
+        for query in queries:
+            started = time.perf_counter()
+            results = index.search(query)
+            elapsed = (time.perf_counter() - started) * 1000
+            tokens = sum(chunk.tokens for chunk, _ in results)
+            print(f"  {query!r}: {len(results)} chunks, {tokens} tokens, {elapsed:.2f} ms, "
+                  f"top={results[0][0].chunk_id if results else None}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import os
+import time
+import threading
+from datetime import datetime
+from .knowledge_index import KnowledgeIndex
+
+
+class KnowledgeSnapshot:
+    """One immutable version of the knowledge base: its documents and their index"""
+    def __init__(self, version, documents, index):
+        self.version = version
+        self.documents = documents
+        self.index = index
+
+
+class KnowledgeStore:
+    """
+    Knowledge documents that reload while requests are being served.
+
+    current() returns the latest snapshot and, at most every poll_interval
+    seconds, stats the document files. When a file's mtime or size has
+    changed, a background thread re-reads it, re-chunks and re-embeds only
+    the documents whose text changed, and swaps the new snapshot in with a
+    single assignment. Requests keep using the snapshot they started with,
+    and never wait for a reload.
+
+    Args:
+        documents: {doc_name: path}
+        embedder: Passed to KnowledgeIndex
+        poll_interval: Seconds between file checks (KNOWLEDGE_POLL_INTERVAL, 0 = never)
+    """
+    def __init__(self, documents, embedder=None, poll_interval=None):
+        self.paths = dict(documents)
+        self.poll_interval = float(poll_interval if poll_interval is not None
+                                   else os.getenv("KNOWLEDGE_POLL_INTERVAL", 2))
+        self._reload_lock = threading.Lock()
+        self._reloading = False
+        self._last_check = time.monotonic()
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_reload_ms = None
+        self.reloaded_at = None
+
+        started = time.perf_counter()
+        self._signatures = self._stat_all()
+        documents = self._load_documents()
+        self.snapshot = KnowledgeSnapshot(1, documents, KnowledgeIndex(
+            {doc_name: data["content"] for doc_name, data in documents.items()}, embedder=embedder
+        ))
+        self.load_ms = (time.perf_counter() - started) * 1000
+
+    def _stat_all(self):
+        signatures = {}
+        for doc_name, path in self.paths.items():
+            try:
+                stat = os.stat(path)
+                signatures[doc_name] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                signatures[doc_name] = None
+        return signatures
+
+    def _read_document(self, path):
+        """Read and validate one knowledge document"""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Document not found: {path}")
+
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read().strip()
+
+        if not content:
+            raise ValueError(f"Empty document: {path}")
+
+        return {"content": content, "path": path, "last_modified": os.path.getmtime(path)}
+
+    def _load_documents(self):
+        """Load and validate every knowledge document"""
+        try:
+            knowledge = {doc_name: self._read_document(path) for doc_name, path in self.paths.items()}
+
+            print("Loaded knowledge documents:")
+            for doc_name, data in knowledge.items():
+                print(f"- {doc_name}: {len(data['content'])} chars, last modified {datetime.fromtimestamp(data['last_modified'])}")
+
+            return knowledge
+        except Exception as e:
+            print(f"Failed to load knowledge base: {e}")
+            raise
+
+    def current(self):
+        """The latest snapshot; starts a background reload when a document has changed"""
+        if self.poll_interval and time.monotonic() - self._last_check >= self.poll_interval:
+            self.check()
+        return self.snapshot
+
+    def check(self, wait=False):
+        """
+        Stat the documents now and reload any that changed.
+
+        Args:
+            wait: Reload in this thread instead of in the background
+
+        Returns:
+            bool: True if a reload was started
+        """
+        self._last_check = time.monotonic()
+        signatures = self._stat_all()
+        changed = [doc_name for doc_name, signature in signatures.items()
+                   if signature != self._signatures.get(doc_name)]
+        if not changed:
+            return False
+
+        with self._reload_lock:
+            if self._reloading:
+                return False
+            self._reloading = True
+        if wait:
+            self._reload(changed, signatures)
+        else:
+            threading.Thread(target=self._reload, args=(changed, signatures),
+                             name="knowledge-reload", daemon=True).start()
+        return True
+
+    def _reload(self, changed, signatures):
+        started = time.perf_counter()
+        try:
+            previous = self.snapshot
+            documents = dict(previous.documents)
+            signatures = dict(signatures)
+            for doc_name in changed:
+                try:
+                    documents[doc_name] = self._read_document(self.paths[doc_name])
+                except Exception as e:
+                    # Keep serving the last good version of the document, and
+                    # its old signature so the next poll tries it again
+                    self.reload_errors += 1
+                    print(f"Failed to reload knowledge document {doc_name}: {e}")
+                    signatures[doc_name] = self._signatures.get(doc_name)
+
+            index = KnowledgeIndex(
+                {doc_name: data["content"] for doc_name, data in documents.items()},
+                previous=previous.index
+            )
+            self._signatures = signatures
+            if index.embedded_documents:
+                self.snapshot = KnowledgeSnapshot(previous.version + 1, documents, index)
+                self.reloads += 1
+                self.last_reload_ms = (time.perf_counter() - started) * 1000
+                self.reloaded_at = time.time()
+                print(f"Knowledge base v{self.snapshot.version}: re-indexed {index.embedded_documents} "
+                      f"in {self.last_reload_ms:.1f} ms")
+        except Exception as e:
+            self.reload_errors += 1
+            print(f"Knowledge reload failed: {e}")
+        finally:
+            with self._reload_lock:
+                self._reloading = False
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version,
+            "documents": {doc_name: datetime.fromtimestamp(data["last_modified"]).isoformat()
+                          for doc_name, data in snapshot.documents.items()},
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_reload_ms": round(self.last_reload_ms, 3) if self.last_reload_ms is not None else None,
+            "reloaded_at": datetime.fromtimestamp(self.reloaded_at).isoformat() if self.reloaded_at else None,
+            "load_ms": round(self.load_ms, 3),
+            "index": snapshot.index.stats(),
+        }
@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache for model completions.
+
+    An in-memory LRU tier answers repeated prompts without leaving the
+    process; an optional SQLite tier keeps completions across restarts and
+    sessions. Both tiers expire entries after a TTL. Only low-temperature
+    (near-deterministic) calls are cached, since sampling at higher
+    temperatures is expected to vary between calls.
+
+    Writes to the SQLite tier are queued and committed in one transaction
+    per flush_interval by a background thread, so a request never waits
+    for a disk commit. Writes queued when the process exits are lost.
+
+    Args:
+        max_entries: Size of the in-memory LRU tier
+        ttl: Seconds an entry stays valid (0 disables expiry)
+        disk_path: SQLite file for the on-disk tier, or None for memory only
+        max_temperature: Highest temperature whose completions are cached
+        flush_interval: Seconds between commits of queued disk writes
+    """
+    def __init__(self, max_entries=1024, ttl=3600, disk_path=None, max_temperature=0.3, flush_interval=0.5):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.max_temperature = max_temperature
+        self.flush_interval = flush_interval
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        # Guards the SQLite connection; never taken while holding _lock
+        self._db_lock = threading.Lock()
+        self._writes = []
+        self._writes_ready = threading.Event()
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            self._db.commit()
+            threading.Thread(target=self._write_loop, name="llm-cache-writer", daemon=True).start()
+
+        self.disk_commits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model_name, prompt, temperature, max_tokens):
+        """Key on everything that determines the completion"""
+        payload = json.dumps([model_name, prompt, temperature, max_tokens])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, temperature):
+        return temperature <= self.max_temperature
+
+    def _expires_at(self):
+        return time.time() + self.ttl if self.ttl else None
+
+    def get(self, key):
+        """Return the cached completion for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+            if self._db is None:
+                self.misses += 1
+                return None
+
+        # The disk tier is read without holding up memory-tier lookups
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        with self._lock:
+            if row is not None:
+                value, expires_at = row
+                if expires_at is None or expires_at > now:
+                    self._remember(key, value, expires_at)
+                    self.disk_hits += 1
+                    return value
+                self._queue_write("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Store a completion in memory, and queue it for the disk tier"""
+        if value is None:
+            return
+        expires_at = self._expires_at()
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self.stores += 1
+            if self._db is not None:
+                self._queue_write(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+
+    def _queue_write(self, statement, parameters):
+        self._writes.append((statement, parameters))
+        self._writes_ready.set()
+
+    def _write_loop(self):
+        while True:
+            self._writes_ready.wait()
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Commit the queued disk writes in one transaction"""
+        if self._db is None:
+            return
+        with self._lock:
+            writes, self._writes = self._writes, []
+            self._writes_ready.clear()
+        if not writes:
+            return
+        try:
+            with self._db_lock:
+                for statement, parameters in writes:
+                    self._db.execute(statement, parameters)
+                self._db.commit()
+                self.disk_commits += 1
+        except sqlite3.Error as e:
+            print(f"Failed to write LLM cache: {e}")
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def purge_expired(self):
+        """Drop expired entries from both tiers"""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (_, exp) in self._memory.items() if exp is not None and exp <= now]:
+                del self._memory[key]
+        if self._db is not None:
+            self.flush()
+            with self._db_lock:
+                self._db.execute("DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._writes = []
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self):
+        """Report hit/miss counters and tier sizes"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_enabled": self._db is not None,
+                "disk_pending_writes": len(self._writes),
+                "disk_commits": self.disk_commits
+            }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Return the process-wide LLMResponseCache, configured from:
+        LLM_CACHE_SIZE: in-memory entries (default 1024)
+        LLM_CACHE_TTL: seconds before an entry expires (default 3600)
+        LLM_CACHE_PATH: SQLite file enabling the on-disk tier (default off)
+        LLM_CACHE_MAX_TEMPERATURE: highest cacheable temperature (default 0.3)
+    """
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = LLMResponseCache(
+                    max_entries=int(os.getenv("LLM_CACHE_SIZE", 1024)),
+                    ttl=float(os.getenv("LLM_CACHE_TTL", 3600)),
+                    disk_path=os.getenv("LLM_CACHE_PATH") or None,
+                    max_temperature=float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", 0.3))
+                )
+    return _response_cache
+
+
+def response_cache_stats():
+    """Stats of the shared cache, or None if no agent has opted in"""
+    return _response_cache.stats() if _response_cache is not None else None
+
+
+def get_agent_cache(agent_name):
+    """
+    Return the shared cache if agent_name is opted in, otherwise None.
+    Opt-in is controlled by LLM_CACHE_AGENTS, a comma-separated list of agent
+    names (default: none, e.g. "guard_agent,classification_agent,details_agent").
+    """
+    enabled = os.getenv("LLM_CACHE_AGENTS", "")
+    if agent_name not in {name.strip() for name in enabled.split(",")}:
+        return None
+    return get_response_cache()
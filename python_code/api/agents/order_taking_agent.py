@@ -2,21 +2,34 @@ import os
 import json
 from copy import deepcopy
 import re
-import boto3
 from dotenv import load_dotenv
 from datetime import datetime
-from .utils import get_chatbot_response
+from .call_policy import get_call_policy
+from .keyword_engine import get_keyword_engine
+from .llm_cache import get_agent_cache
+from .session_state import ConversationState
+from .tracing import get_tracer, annotate
+from .utils import get_chatbot_response, get_chatbot_response_async, stream_chatbot_response, stream_answer, get_bedrock_client
 
 load_dotenv()
 
 class OrderTakingAgent():
-    def __init__(self):
-        # Initialize Bedrock client
-        self.client = boto3.client(
-            service_name='bedrock-runtime',
-            region_name=os.getenv("AWS_REGION", "us-east-1")
-        )
+    STREAM_ERROR_RESPONSE = "I'm sorry, there was an error processing your order. Please try again."
+
+    def __init__(self, client=None, call_limiter=None):
+        # Shared, pooled bedrock-runtime client
+        self.client = client or get_bedrock_client()
         self.model_name = os.getenv("BEDROCK_MODEL_NAME", "mistral.mistral-7b-instruct-v0:2")
+        # Optional ModelCallLimiter for the async API
+        self.call_limiter = call_limiter
+        # Shared response cache, if this agent is opted in (LLM_CACHE_AGENTS)
+        self.response_cache = get_agent_cache("order_taking_agent")
+        # Deadline, retry and hedging policy for this agent's model calls
+        self.call_policy = get_call_policy("order_taking_agent")
+        # Per-stage spans and latency histograms
+        self.tracer = get_tracer()
+        # Shared keyword/intent engine (lists live in intent_keywords.json)
+        self.keywords = get_keyword_engine()
         
         # Product catalog with prices
         self.products = [
@@ -206,23 +219,15 @@ class OrderTakingAgent():
             "total": round(total, 2)
         }
     
-    def _parse_memory(self, messages):
+    def _parse_memory(self, messages, state=None):
         """
-        Extract memory from previous messages
+        Cart and discount codes from the session's ConversationState, or
+        replayed from the transcript's memory without one. Copies are
+        returned, so earlier replies are not modified when the cart changes.
         """
-        cart = []
-        discount_codes = []
-        
-        for message in messages:
-            if message.get("role") == "assistant" and "memory" in message:
-                memory = message.get("memory", {})
-                if memory.get("agent") == "order_taking_agent":
-                    if "cart" in memory:
-                        cart = memory["cart"]
-                    if "discount_codes" in memory:
-                        discount_codes = memory["discount_codes"]
-        
-        return cart, discount_codes
+        if state is None:
+            state = ConversationState.from_messages(messages)
+        return state.cart_snapshot()
     
     def _format_cart_summary(self, cart, totals):
         """
@@ -255,188 +260,188 @@ class OrderTakingAgent():
         
         return summary
     
-    def get_response(self, messages):
+    def _handle_locally(self, user_message, cart, discount_codes):
         """
-        Process user message and generate response for order taking
+        Handle checkout, discount codes, cart inquiries and item extraction
+        without the model. Returns a response dict, or None when the request
+        needs the LLM fallback.
         """
-        try:
-            # Extract latest user message
-            user_message = messages[-1]['content']
+        intents = self.keywords.intents_in(user_message)
+        
+        # Handle checkout intent
+        if "checkout" in intents:
+            # Calculate totals
+            totals = self._calculate_total(cart, discount_codes)
             
-            # Get existing cart and discount codes from memory
-            cart, discount_codes = self._parse_memory(messages)
+            # Generate checkout response
+            summary = self._format_cart_summary(cart, totals)
+            response = f"Thank you for your order! Here's your order summary:\n\n{summary}\n\nYour order has been confirmed. You'll receive a confirmation email shortly."
             
-            # Handle checkout intent
-            if re.search(r'\b(checkout|place\s+order|pay|finish|complete\s+order)\b', user_message.lower()):
-                # Calculate totals
-                totals = self._calculate_total(cart, discount_codes)
-                
-                # Generate checkout response
-                summary = self._format_cart_summary(cart, totals)
-                response = f"Thank you for your order! Here's your order summary:\n\n{summary}\n\nYour order has been confirmed. You'll receive a confirmation email shortly."
-                
-                # Reset cart after checkout
-                cart = []
-                discount_codes = []
-                
+            # Reset cart after checkout
+            cart = []
+            discount_codes = []
+            
+            return {
+                "role": "assistant",
+                "content": response,
+                "memory": {
+                    "agent": "order_taking_agent",
+                    "action": "checkout_complete",
+                    "cart": cart,
+                    "discount_codes": discount_codes,
+                    "totals": totals
+                }
+            }
+        
+        # Handle discount code
+        discount_match = re.search(r'\b(code|discount|promo|coupon)[\s:]*([\w\d]+)\b', user_message, re.IGNORECASE)
+        if discount_match:
+            code = discount_match.group(2).upper()
+            if code in self.discounts:
+                if code not in discount_codes:
+                    discount_codes.append(code)
+                    discount_info = self.discounts[code]
+                    discount_type = f"{discount_info['value']}% off" if discount_info['type'] == 'percent' else "free shipping"
+                    response = f"Great! I've applied discount code {code} for {discount_type} on orders over ${discount_info['min_purchase']:.2f}."
+                else:
+                    response = f"The discount code {code} is already applied to your order."
+            else:
+                response = f"Sorry, the discount code {code} is not valid. Please try another code."
+            
+            # Calculate updated totals
+            totals = self._calculate_total(cart, discount_codes)
+            
+            # Add cart summary if there are items
+            if cart:
+                response += "\n\n" + self._format_cart_summary(cart, totals)
+            
+            return {
+                "role": "assistant",
+                "content": response,
+                "memory": {
+                    "agent": "order_taking_agent",
+                    "action": "apply_discount",
+                    "cart": cart,
+                    "discount_codes": discount_codes,
+                    "totals": totals
+                }
+            }
+        
+        # Handle cart inquiry
+        if "cart_inquiry" in intents:
+            if not cart:
                 return {
                     "role": "assistant",
-                    "content": response,
+                    "content": "Your cart is currently empty. Would you like to add some plants or supplies?",
                     "memory": {
                         "agent": "order_taking_agent",
-                        "action": "checkout_complete",
+                        "action": "show_cart",
                         "cart": cart,
-                        "discount_codes": discount_codes,
-                        "totals": totals
+                        "discount_codes": discount_codes
                     }
                 }
             
-            # Handle discount code
-            discount_match = re.search(r'\b(code|discount|promo|coupon)[\s:]*([\w\d]+)\b', user_message, re.IGNORECASE)
-            if discount_match:
-                code = discount_match.group(2).upper()
-                if code in self.discounts:
-                    if code not in discount_codes:
-                        discount_codes.append(code)
-                        discount_info = self.discounts[code]
-                        discount_type = f"{discount_info['value']}% off" if discount_info['type'] == 'percent' else "free shipping"
-                        response = f"Great! I've applied discount code {code} for {discount_type} on orders over ${discount_info['min_purchase']:.2f}."
+            # Calculate totals
+            totals = self._calculate_total(cart, discount_codes)
+            
+            # Generate cart summary
+            summary = self._format_cart_summary(cart, totals)
+            response = f"{summary}\n\nWould you like to add more items or proceed to checkout?"
+            
+            return {
+                "role": "assistant",
+                "content": response,
+                "memory": {
+                    "agent": "order_taking_agent",
+                    "action": "show_cart",
+                    "cart": cart,
+                    "discount_codes": discount_codes,
+                    "totals": totals
+                }
+            }
+        
+        # Extract items from message
+        extracted_items = self._extract_items(user_message)
+        
+        # If items found, add to cart
+        if extracted_items:
+            added_items = []
+            not_found_items = []
+            
+            for item_name, quantity in extracted_items:
+                product_info = self._find_product_in_catalog(item_name)
+                
+                if product_info:
+                    category, product_name, price = product_info
+                    
+                    # Check if item already in cart
+                    existing_item = next((i for i in cart if i["name"] == product_name), None)
+                    
+                    if existing_item:
+                        existing_item["quantity"] += quantity
+                        added_items.append((product_name, quantity, existing_item["quantity"]))
                     else:
-                        response = f"The discount code {code} is already applied to your order."
+                        cart.append({
+                            "category": category,
+                            "name": product_name,
+                            "price": price,
+                            "quantity": quantity
+                        })
+                        added_items.append((product_name, quantity, quantity))
                 else:
-                    response = f"Sorry, the discount code {code} is not valid. Please try another code."
+                    not_found_items.append(item_name)
+            
+            # Generate response
+            if added_items:
+                response_parts = []
+                for name, qty, total_qty in added_items:
+                    if qty == total_qty:
+                        response_parts.append(f"{qty} {name}")
+                    else:
+                        response_parts.append(f"{qty} more {name} (total: {total_qty})")
+                
+                response = f"I've added {', '.join(response_parts)} to your cart."
                 
-                # Calculate updated totals
+                if not_found_items:
+                    response += f"\n\nI couldn't find these items: {', '.join(not_found_items)}. Would you like me to suggest alternatives?"
+                
+                # Calculate totals
                 totals = self._calculate_total(cart, discount_codes)
                 
-                # Add cart summary if there are items
-                if cart:
-                    response += "\n\n" + self._format_cart_summary(cart, totals)
+                # Add cart summary
+                response += "\n\n" + self._format_cart_summary(cart, totals)
                 
                 return {
                     "role": "assistant",
                     "content": response,
                     "memory": {
                         "agent": "order_taking_agent",
-                        "action": "apply_discount",
+                        "action": "add_to_cart",
                         "cart": cart,
                         "discount_codes": discount_codes,
                         "totals": totals
                     }
                 }
-            
-            # Handle cart inquiry
-            if re.search(r'\b(cart|basket|order|what.*added|what.*ordered|show.*items)\b', user_message.lower()):
-                if not cart:
-                    return {
-                        "role": "assistant",
-                        "content": "Your cart is currently empty. Would you like to add some plants or supplies?",
-                        "memory": {
-                            "agent": "order_taking_agent",
-                            "action": "show_cart",
-                            "cart": cart,
-                            "discount_codes": discount_codes
-                        }
-                    }
-                
-                # Calculate totals
-                totals = self._calculate_total(cart, discount_codes)
-                
-                # Generate cart summary
-                summary = self._format_cart_summary(cart, totals)
-                response = f"{summary}\n\nWould you like to add more items or proceed to checkout?"
+            elif not_found_items:
+                response = f"I couldn't find these items: {', '.join(not_found_items)}. Could you please specify which plants or supplies you're looking for?"
                 
                 return {
                     "role": "assistant",
                     "content": response,
                     "memory": {
                         "agent": "order_taking_agent",
-                        "action": "show_cart",
+                        "action": "items_not_found",
                         "cart": cart,
                         "discount_codes": discount_codes,
-                        "totals": totals
+                        "not_found": not_found_items
                     }
                 }
-            
-            # Extract items from message
-            extracted_items = self._extract_items(user_message)
-            
-            # If items found, add to cart
-            if extracted_items:
-                added_items = []
-                not_found_items = []
-                
-                for item_name, quantity in extracted_items:
-                    product_info = self._find_product_in_catalog(item_name)
-                    
-                    if product_info:
-                        category, product_name, price = product_info
-                        
-                        # Check if item already in cart
-                        existing_item = next((i for i in cart if i["name"] == product_name), None)
-                        
-                        if existing_item:
-                            existing_item["quantity"] += quantity
-                            added_items.append((product_name, quantity, existing_item["quantity"]))
-                        else:
-                            cart.append({
-                                "category": category,
-                                "name": product_name,
-                                "price": price,
-                                "quantity": quantity
-                            })
-                            added_items.append((product_name, quantity, quantity))
-                    else:
-                        not_found_items.append(item_name)
-                
-                # Generate response
-                if added_items:
-                    response_parts = []
-                    for name, qty, total_qty in added_items:
-                        if qty == total_qty:
-                            response_parts.append(f"{qty} {name}")
-                        else:
-                            response_parts.append(f"{qty} more {name} (total: {total_qty})")
-                    
-                    response = f"I've added {', '.join(response_parts)} to your cart."
-                    
-                    if not_found_items:
-                        response += f"\n\nI couldn't find these items: {', '.join(not_found_items)}. Would you like me to suggest alternatives?"
-                    
-                    # Calculate totals
-                    totals = self._calculate_total(cart, discount_codes)
-                    
-                    # Add cart summary
-                    response += "\n\n" + self._format_cart_summary(cart, totals)
-                    
-                    return {
-                        "role": "assistant",
-                        "content": response,
-                        "memory": {
-                            "agent": "order_taking_agent",
-                            "action": "add_to_cart",
-                            "cart": cart,
-                            "discount_codes": discount_codes,
-                            "totals": totals
-                        }
-                    }
-                elif not_found_items:
-                    response = f"I couldn't find these items: {', '.join(not_found_items)}. Could you please specify which plants or supplies you're looking for?"
-                    
-                    return {
-                        "role": "assistant",
-                        "content": response,
-                        "memory": {
-                            "agent": "order_taking_agent",
-                            "action": "items_not_found",
-                            "cart": cart,
-                            "discount_codes": discount_codes,
-                            "not_found": not_found_items
-                        }
-                    }
-            
-            # If we reach here, use LLM to handle the request
-            system_prompt = """<<SYS>> You are a helpful assistant for an Indian plant shop. Your task is to help customers with their plant orders.
+
+        return None
+
+    def _build_model_messages(self, user_message, cart, discount_codes):
+        """Build the LLM fallback prompt for requests not handled locally"""
+        system_prompt = """<<SYS>> You are a helpful assistant for an Indian plant shop. Your task is to help customers with their plant orders.
 
 Available product categories:
 1. Plants: White Butterfly (Syngonium), Peace Lily, Spider Plant, Money Plant, Snake Plant, Aglaonema Lipstick, Jade Plant, Rubber Tree
@@ -460,47 +465,118 @@ When helping customers:
 Reply in a friendly, helpful manner fitting for an Indian plant shop assistant.
 <</SYS>>"""
 
-            # Prepare context for the model
-            context = f"The customer currently has {len(cart)} items in their cart."
-            if cart:
-                totals = self._calculate_total(cart, discount_codes)
-                context += f" Cart total: ${totals['total']:.2f}."
-            if discount_codes:
-                context += f" Applied discount codes: {', '.join(discount_codes)}."
-            
-            # Format messages for the model
-            messages_for_model = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Context: {context}\n\nCustomer: {user_message}"}
-            ]
-            
-            # Get response from the model
-            response = get_chatbot_response(
-                client=self.client,
-                model_name=self.model_name,
-                messages=messages_for_model,
-                temperature=0.7,
-                max_tokens=500
-            )
-            
-            return {
-                "role": "assistant",
-                "content": response.strip(),
-                "memory": {
-                    "agent": "order_taking_agent",
-                    "action": "general_response",
-                    "cart": cart,
-                    "discount_codes": discount_codes
-                }
+        # Prepare context for the model
+        context = f"The customer currently has {len(cart)} items in their cart."
+        if cart:
+            totals = self._calculate_total(cart, discount_codes)
+            context += f" Cart total: ${totals['total']:.2f}."
+        if discount_codes:
+            context += f" Applied discount codes: {', '.join(discount_codes)}."
+        
+        # Format messages for the model
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Context: {context}\n\nCustomer: {user_message}"}
+        ]
+
+    def _error_response(self, error):
+        print(f"OrderTakingAgent error: {str(error)}")
+        return {
+            "role": "assistant",
+            "content": "I'm sorry, there was an error processing your order. Please try again.",
+            "memory": {
+                "agent": "order_taking_agent",
+                "error": str(error)
             }
-            
+        }
+
+    def _prepare(self, messages, state=None):
+        """
+        Parse the cart and answer cart operations locally.
+
+        Returns:
+            (local reply, None), or (None, (model call arguments, cart, discount codes))
+            when the model has to answer
+        """
+        # Extract latest user message
+        user_message = messages[-1]['content']
+
+        # Get existing cart and discount codes from memory
+        with self.tracer.span("load_cart", agent="order_taking_agent"):
+            cart, discount_codes = self._parse_memory(messages, state)
+
+        local_response = self._handle_locally(user_message, cart, discount_codes)
+        annotate(handled_locally=local_response is not None)
+        if local_response is not None:
+            return local_response, None
+
+        call = {
+            "client": self.client,
+            "model_name": self.model_name,
+            "messages": self._build_model_messages(user_message, cart, discount_codes),
+            "temperature": 0.7,
+            "max_tokens": 500,
+            "cache": self.response_cache,
+            "policy": self.call_policy
+        }
+        return None, (call, cart, discount_codes)
+
+    def _model_reply(self, content, cart, discount_codes):
+        return {
+            "role": "assistant",
+            "content": content,
+            "memory": {
+                "agent": "order_taking_agent",
+                "action": "general_response",
+                "cart": cart,
+                "discount_codes": discount_codes
+            }
+        }
+
+    def get_response(self, messages, state=None):
+        """
+        Process user message and generate response for order taking
+        """
+        try:
+            local_response, model_call = self._prepare(messages, state)
+            if local_response is not None:
+                return local_response
+
+            # If we reach here, use LLM to handle the request
+            call, cart, discount_codes = model_call
+            return self._model_reply(get_chatbot_response(**call).strip(), cart, discount_codes)
         except Exception as e:
-            print(f"OrderTakingAgent error: {str(e)}")
-            return {
-                "role": "assistant",
-                "content": "I'm sorry, there was an error processing your order. Please try again.",
-                "memory": {
-                    "agent": "order_taking_agent",
-                    "error": str(e)
-                }
-            }
\ No newline at end of file
+            return self._error_response(e)
+
+    async def get_response_async(self, messages, state=None):
+        """
+        Async variant of get_response; only the LLM fallback is awaited
+        """
+        try:
+            local_response, model_call = self._prepare(messages, state)
+            if local_response is not None:
+                return local_response
+
+            call, cart, discount_codes = model_call
+            response = await get_chatbot_response_async(limiter=self.call_limiter, **call)
+            return self._model_reply(response.strip(), cart, discount_codes)
+        except Exception as e:
+            return self._error_response(e)
+
+    def stream_response(self, messages, state=None):
+        """
+        Streaming variant of get_response.
+        
+        Cart operations are answered locally as usual; only the LLM fallback
+        is streamed, with "content" as an iterator of text chunks.
+        """
+        try:
+            local_response, model_call = self._prepare(messages, state)
+            if local_response is not None:
+                return local_response
+        except Exception as e:
+            return self._error_response(e)
+
+        call, cart, discount_codes = model_call
+        chunks = stream_chatbot_response(**call)
+        return self._model_reply(stream_answer(chunks, self.STREAM_ERROR_RESPONSE), cart, discount_codes)
@@ -0,0 +1,160 @@
+import os
+import time
+import importlib
+import threading
+from .tracing import get_tracer
+
+
+# Agent name -> "module:Class"; modules starting with a dot are relative to
+# this package. Nothing is imported until an agent is first used.
+DEFAULT_AGENTS = {
+    "guard_agent": ".guard_agent:GuardAgent",
+    "classification_agent": ".classification_agent:ClassificationAgent",
+    "details_agent": ".details_agent:DetailsAgent",
+    "order_taking_agent": ".order_taking_agent:OrderTakingAgent",
+}
+
+# Agents that decide the route rather than answer
+ROUTING_AGENTS = ("guard_agent", "classification_agent")
+
+
+def load_factory(spec):
+    """Import and return the object named by a "module:attribute" path"""
+    module_name, _, attribute = spec.partition(":")
+    module = importlib.import_module(module_name, package=__package__)
+    return getattr(module, attribute)
+
+
+def _env_factories():
+    """Extra or replacement agents from AGENT_FACTORIES ("name=module:Class,...")"""
+    factories = {}
+    for entry in os.getenv("AGENT_FACTORIES", "").split(","):
+        name, _, spec = entry.strip().partition("=")
+        if name and spec:
+            factories[name.strip()] = spec.strip()
+    return factories
+
+
+class AgentRegistry:
+    """
+    Maps agent names to factories and builds each agent on first use.
+
+    A factory is either a callable taking client and call_limiter keyword
+    arguments and returning an AgentProtocol, or a "module:Class" path that
+    is imported only when the agent is first needed. Import and construction
+    times are recorded per agent.
+
+    Answering agents (all but ROUTING_AGENTS) are offered to the classifier
+    by name, with their description when one is given.
+
+    Args:
+        client: Bedrock client passed to every factory (None = shared client)
+        call_limiter: ModelCallLimiter passed to every factory
+        factories: Extra or replacement {name: factory} entries
+        descriptions: {name: what the agent handles}, shown to the classifier
+    """
+    def __init__(self, client=None, call_limiter=None, factories=None, descriptions=None):
+        self.client = client
+        self.call_limiter = call_limiter
+        self._factories = {**DEFAULT_AGENTS, **_env_factories(), **(factories or {})}
+        self._descriptions = dict(descriptions or {})
+        self._agents = {}
+        self._timings = {}
+        self._lock = threading.Lock()
+        self.tracer = get_tracer()
+
+    def register(self, name, factory, description=None):
+        """Add or replace an agent; a replaced agent is rebuilt on next use"""
+        with self._lock:
+            self._factories[name] = factory
+            if description is not None:
+                self._descriptions[name] = description
+            self._agents.pop(name, None)
+            self._timings.pop(name, None)
+
+    def get(self, name):
+        """Return the agent, building it on first use"""
+        agent = self._agents.get(name)
+        if agent is None:
+            with self._lock:
+                agent = self._agents.get(name)
+                if agent is None:
+                    agent = self._agents[name] = self._build(name)
+        return agent
+
+    def _build(self, name):
+        if name not in self._factories:
+            raise KeyError(f"Unknown agent: {name}")
+        factory = self._factories[name]
+
+        started = time.perf_counter()
+        if isinstance(factory, str):
+            factory = load_factory(factory)
+        imported = time.perf_counter()
+        with self.tracer.span("agent_init", agent=name):
+            agent = factory(client=self.client, call_limiter=self.call_limiter)
+        built = time.perf_counter()
+
+        self._timings[name] = {
+            "import_ms": round((imported - started) * 1000, 3),
+            "init_ms": round((built - imported) * 1000, 3),
+        }
+        print(f"Loaded {name} (import {self._timings[name]['import_ms']:.1f} ms, "
+              f"init {self._timings[name]['init_ms']:.1f} ms)")
+        return agent
+
+    def preload(self, names=None):
+        """Build agents ahead of the first request (all registered ones by default)"""
+        for name in names or self.names():
+            self.get(name)
+
+    def names(self):
+        return list(self._factories)
+
+    def routes(self):
+        """{name: description or None} of the agents the classifier can choose"""
+        return {name: self._descriptions.get(name) for name in self._factories if name not in ROUTING_AGENTS}
+
+    def __contains__(self, name):
+        return name in self._factories
+
+    def is_built(self, name):
+        return name in self._agents
+
+    def name_of(self, agent):
+        """Registered name of a built agent"""
+        for name, built in list(self._agents.items()):
+            if built is agent:
+                return name
+        return type(agent).__name__
+
+    def report(self):
+        """Per-agent build state and import/construction times"""
+        return {name: {"built": name in self._agents, **self._timings.get(name, {})} for name in self._factories}
+
+
+def main():
+    """Report import and construction times of the router and each agent"""
+    os.environ.setdefault("BEDROCK_RUNTIME", "fake")
+
+    started = time.perf_counter()
+    router_module = importlib.import_module(".router", package=__package__)
+    imported = time.perf_counter()
+    router = router_module.RouterAgent()
+    constructed = time.perf_counter()
+    print(f"import router:  {(imported - started) * 1000:.1f} ms")
+    print(f"RouterAgent():  {(constructed - imported) * 1000:.1f} ms")
+
+    messages = [{"role": "user", "content": "add 2 peace lily"}]
+    turn_started = time.perf_counter()
+    router.process_message(messages)
+    print(f"first order turn: {(time.perf_counter() - turn_started) * 1000:.1f} ms")
+
+    router.agents.preload()
+    print("\nagents:")
+    for name, timing in router.agents.report().items():
+        print(f"  {name:<22} import={timing['import_ms']:.1f} ms init={timing['init_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,389 @@
+import os
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List
-from .guard_agent import GuardAgent
-from .classification_agent import ClassificationAgent
-from .details_agent import DetailsAgent
-from .order_taking_agent import OrderTakingAgent
+from .keyword_engine import get_keyword_engine
+from .history import MessageView
+from .registry import AgentRegistry, ROUTING_AGENTS
+from .session_state import ConversationState
+from .tracing import get_tracer
+from .llm_cache import response_cache_stats
+from .utils import ModelCallLimiter, get_client_provider
+
+_speculation_executor = None
+_speculation_executor_lock = threading.Lock()
+
+
+def _get_speculation_executor():
+    """Process-wide thread pool shared by all routers for speculative work"""
+    global _speculation_executor
+    if _speculation_executor is None:
+        with _speculation_executor_lock:
+            if _speculation_executor is None:
+                _speculation_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("ROUTER_SPECULATION_WORKERS", 32)),
+                    thread_name_prefix="router-speculation"
+                )
+    return _speculation_executor
+
 
 class RouterAgent:
     """
     Main router that orchestrates the flow between different agents
     """
-    def __init__(self):
-        self.guard_agent = GuardAgent()
-        self.classification_agent = ClassificationAgent()
-        self.details_agent = DetailsAgent()
-        self.order_taking_agent = OrderTakingAgent()
+    def __init__(self, client=None, max_inflight_calls=None, speculative=None, speculate_downstream=None, factories=None,
+                 descriptions=None):
+        # Caps concurrent model calls made through the async pipeline
+        self.call_limiter = ModelCallLimiter(max_inflight_calls)
+        
+        # Speculative mode runs guard, classifier and the likely answering
+        # agent at the same time instead of one after the other
+        if speculative is None:
+            speculative = os.getenv("ROUTER_SPECULATIVE", "false").lower() in ("1", "true", "yes")
+        if speculate_downstream is None:
+            speculate_downstream = os.getenv("ROUTER_SPECULATE_DOWNSTREAM", "true").lower() in ("1", "true", "yes")
+        self.speculative = speculative
+        self.speculate_downstream = speculate_downstream
+        self._speculation_lock = threading.Lock()
+        self.speculation_stats = {"turns": 0, "launched": 0, "used": 0, "wasted": 0, "cancelled": 0}
+        
+        # Shared keyword/intent engine (lists live in intent_keywords.json)
+        self.keywords = get_keyword_engine()
         
-    def process_message(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Per-stage spans and rolling latency histograms
+        self.tracer = get_tracer()
+        
+        # Agents are built on first use and share one pooled bedrock-runtime
+        # client per process; extra agents can be registered by name
+        self.agents = AgentRegistry(client=client, call_limiter=self.call_limiter, factories=factories,
+                                    descriptions=descriptions)
+        
+    @property
+    def guard_agent(self):
+        return self.agents.get("guard_agent")
+
+    @property
+    def classification_agent(self):
+        agent = self.agents.get("classification_agent")
+        # Offer every registered answering agent, including ones added later
+        if hasattr(agent, "set_routes"):
+            agent.set_routes(self.agents.routes())
+        return agent
+
+    @property
+    def details_agent(self):
+        return self.agents.get("details_agent")
+
+    @property
+    def order_taking_agent(self):
+        return self.agents.get("order_taking_agent")
+
+    def _route(self, messages: List[Dict[str, Any]], state: ConversationState = None):
         """
-        Process a user message through the appropriate agent pipeline
+        Run the guard and classification steps for the latest message
         
-        Args:
-            messages: List of message dictionaries in the conversation history
-            
         Returns:
-            A response dictionary from the appropriate agent
+            (agent, guard_response): the agent that should answer, or None
+            together with the guard's reply when the message is blocked
         """
         print(f"=== New Request === User Input: {messages[-1]['content']}")
         
         # Step 1: Guard Agent - First line of defense
-        guard_response = self.guard_agent.get_response(messages)
+        with self.tracer.span("guard"):
+            guard_response = self.guard_agent.get_response(messages, state=state)
         
         # If not allowed, return guard response
         if guard_response["memory"]["guard_decision"] == "not allowed":
             print(f"Routing to: guard_agent (blocked)")
-            return guard_response
+            return None, guard_response
             
         # Step 2: Order Detection Fast Path
-        # Check for obvious ordering intent keywords to bypass classification
-        latest_message = messages[-1]['content'].lower()
-        order_keywords = ["order", "buy", "purchase", "add", "cart", "checkout"]
-        if any(keyword in latest_message for keyword in order_keywords):
+        if self._is_order_fast_path(messages):
             print(f"Routing to: order_taking_agent (fast path)")
-            return self.order_taking_agent.get_response(messages)
+            return self.order_taking_agent, guard_response
         
         # Step 3: Classification Agent
-        classification_response = self.classification_agent.get_response(messages)
+        with self.tracer.span("classify"):
+            classification_response = self.classification_agent.get_response(messages, state=state)
+        
+        # Step 4: Route to appropriate agent
+        return self._agent_for(classification_response), guard_response
+
+    def _route_speculative(self, messages: List[Dict[str, Any]], prefetch: bool = True, state: ConversationState = None):
+        """
+        Speculative variant of _route
+        
+        The guard, the classifier and (when prefetch is set) the details
+        agent start together on a thread pool. Work made unnecessary by the
+        guard's or classifier's decision is cancelled if it has not started,
+        otherwise its result is discarded. Only the side-effect free details
+        agent is prefetched: the order agent's reply changes the cart.
+        
+        Returns:
+            (agent, guard_response, prefetched): as _route, plus a future
+            holding the answering agent's response when it was prefetched
+        """
+        print(f"=== New Request === User Input: {messages[-1]['content']}")
+        executor = _get_speculation_executor()
+        fast_path = self._is_order_fast_path(messages)
+        
+        guard_future = self._submit_traced(executor, "guard", self.guard_agent.get_response, messages, state)
+        speculative = {}
+        if not fast_path:
+            speculative["classification"] = self._submit_traced(
+                executor, "classify", self.classification_agent.get_response, messages, state
+            )
+            if prefetch:
+                speculative["details"] = self._submit_traced(
+                    executor, "answer", self.details_agent.get_response, messages, state,
+                    agent="details_agent", speculative=True
+                )
+        self._record_speculation(turns=1, launched=len(speculative))
+        
+        guard_response = guard_future.result()
+        if guard_response["memory"]["guard_decision"] == "not allowed":
+            print(f"Routing to: guard_agent (blocked)")
+            self._discard(*speculative.values())
+            return None, guard_response, None
+        
+        if fast_path:
+            print(f"Routing to: order_taking_agent (fast path)")
+            return self.order_taking_agent, guard_response, None
+        
+        classification_response = speculative["classification"].result()
+        self._record_speculation(used=1)
+        agent = self._agent_for(classification_response)
+        
+        prefetched = speculative.get("details")
+        if prefetched is not None:
+            if agent is self.details_agent:
+                self._record_speculation(used=1)
+            else:
+                self._discard(prefetched)
+                prefetched = None
+        return agent, guard_response, prefetched
+
+    def _submit_traced(self, executor, stage, fn, messages, state, **attributes):
+        """Run fn in a span on the executor, as a child of the caller's current span"""
+        def run():
+            with self.tracer.span(stage, **attributes):
+                return fn(messages, state=state)
+        # Pool threads do not inherit context variables, so pass them along
+        return executor.submit(contextvars.copy_context().run, run)
+
+    def _discard(self, *futures):
+        """Cancel speculative work that is no longer needed"""
+        for future in futures:
+            if future.cancel():
+                self._record_speculation(wasted=1, cancelled=1)
+            else:
+                self._record_speculation(wasted=1)
+
+    def _record_speculation(self, **counts):
+        with self._speculation_lock:
+            for name, amount in counts.items():
+                self.speculation_stats[name] += amount
+
+    def guard_report(self) -> Dict[str, Any]:
+        """Guard pre-filter counters, including the guard calls it saved, once the guard is built with one"""
+        if not self.agents.is_built("guard_agent"):
+            return None
+        prefilter = getattr(self.guard_agent, "prefilter", None)
+        return prefilter.stats() if prefilter is not None else None
+
+    def cache_report(self) -> Dict[str, Any]:
+        """LLM response cache hits, misses and disk writes, once an agent uses it"""
+        return response_cache_stats()
+
+    def connection_report(self) -> Dict[str, Any]:
+        """Shared Bedrock connection pool: leased, idle and waits for a free slot"""
+        return get_client_provider().stats()
+
+    def speculation_report(self) -> Dict[str, Any]:
+        """Speculation counters, plus the share of launched work that was wasted"""
+        with self._speculation_lock:
+            report = dict(self.speculation_stats)
+        report["waste_ratio"] = round(report["wasted"] / report["launched"], 4) if report["launched"] else 0.0
+        return report
+
+    async def _route_async(self, messages: List[Dict[str, Any]], state: ConversationState = None):
+        """Async variant of _route"""
+        print(f"=== New Request === User Input: {messages[-1]['content']}")
+        
+        with self.tracer.span("guard"):
+            guard_response = await self.guard_agent.get_response_async(messages, state=state)
+        if guard_response["memory"]["guard_decision"] == "not allowed":
+            print(f"Routing to: guard_agent (blocked)")
+            return None, guard_response
+        
+        if self._is_order_fast_path(messages):
+            print(f"Routing to: order_taking_agent (fast path)")
+            return self.order_taking_agent, guard_response
+        
+        with self.tracer.span("classify"):
+            classification_response = await self.classification_agent.get_response_async(messages, state=state)
+        return self._agent_for(classification_response), guard_response
+
+    def _is_order_fast_path(self, messages: List[Dict[str, Any]]) -> bool:
+        """Check for obvious ordering intent keywords to bypass classification"""
+        with self.tracer.span("fast_path") as span:
+            hit = self.keywords.has_intent(messages[-1]['content'], "order_fast_path")
+            if span is not None:
+                span.set_attribute("hit", hit)
+        return hit
+
+    def _agent_for(self, classification_response: Dict[str, Any]):
         agent_decision = classification_response["memory"]["classification_decision"]
         print(f"Routing to: {agent_decision}")
         
-        # Step 4: Route to appropriate agent
-        if agent_decision == "order_taking_agent":
-            return self.order_taking_agent.get_response(messages)
-        else:
-            # Step 5: Route to details agent
-            details_response = self.details_agent.get_response(messages)
-            
-            # Step 6: Detect if details agent flagged for rerouting to order agent
-            if "needs_rerouting" in details_response.get("memory", {}) and details_response["memory"]["needs_rerouting"]:
+        # Any registered answering agent can be chosen by name; the
+        # classifier is offered all of them (AgentRegistry.routes)
+        if agent_decision in self.agents and agent_decision not in ROUTING_AGENTS:
+            return self.agents.get(agent_decision)
+        return self.details_agent
+
+    def process_message(self, messages: List[Dict[str, Any]], state: ConversationState = None) -> Dict[str, Any]:
+        """
+        Process a user message through the appropriate agent pipeline
+        
+        Args:
+            messages: List of message dictionaries in the conversation history
+            state: Optional ConversationState of this session. It is synced
+                with the messages added since the last turn and updated with
+                the reply, so agents do not replay the whole history. The
+                caller is expected to append the reply to messages.
+            
+        Returns:
+            A response dictionary from the appropriate agent
+        """
+        with self.tracer.span("process_message", message_chars=len(messages[-1]['content'])) as turn:
+            self._sync_state(state, messages)
+            # Agents get a read-only view of the history instead of the list
+            history = MessageView(messages)
+            prefetched = None
+            if self.speculative:
+                agent, guard_response, prefetched = self._route_speculative(
+                    history, prefetch=self.speculate_downstream, state=state
+                )
+            else:
+                agent, guard_response = self._route(history, state)
+            if agent is None:
+                return self._finish_turn(turn, state, messages, None, guard_response)
+            
+            if prefetched is not None:
+                response = prefetched.result()
+            else:
+                with self.tracer.span("answer", agent=self._agent_name(agent)):
+                    response = agent.get_response(history, state=state)
+            
+            # Step 5: Detect if details agent flagged for rerouting to order agent
+            if response.get("memory", {}).get("needs_rerouting"):
                 print(f"Rerouting order intent to: order_taking_agent")
-                return self.order_taking_agent.get_response(messages)
-                
-            return details_response
\ No newline at end of file
+                agent = self.order_taking_agent
+                with self.tracer.span("answer", agent="order_taking_agent", rerouted=True):
+                    response = agent.get_response(history, state=state)
+            
+            return self._finish_turn(turn, state, messages, agent, response)
+
+    async def process_message_async(self, messages: List[Dict[str, Any]], state: ConversationState = None) -> Dict[str, Any]:
+        """
+        Async variant of process_message
+        
+        Model calls are awaited and capped by the router's call limiter, so
+        one event loop can serve many conversations concurrently.
+        """
+        with self.tracer.span("process_message", message_chars=len(messages[-1]['content'])) as turn:
+            self._sync_state(state, messages)
+            # Agents get a read-only view of the history instead of the list
+            history = MessageView(messages)
+            agent, guard_response = await self._route_async(history, state)
+            if agent is None:
+                return self._finish_turn(turn, state, messages, None, guard_response)
+            
+            with self.tracer.span("answer", agent=self._agent_name(agent)):
+                response = await agent.get_response_async(history, state=state)
+            
+            if response.get("memory", {}).get("needs_rerouting"):
+                print(f"Rerouting order intent to: order_taking_agent")
+                agent = self.order_taking_agent
+                with self.tracer.span("answer", agent="order_taking_agent", rerouted=True):
+                    response = await agent.get_response_async(history, state=state)
+            
+            return self._finish_turn(turn, state, messages, agent, response)
+
+    def stream_message(self, messages: List[Dict[str, Any]], state: ConversationState = None) -> Dict[str, Any]:
+        """
+        Streaming variant of process_message
+        
+        Guard and classification still run buffered (their JSON output is
+        needed before routing); only the answering agent's reply is streamed.
+        The turn's span covers routing and opening the stream; the streamed
+        model call is recorded as its own llm_call span.
+        
+        Returns:
+            A response dictionary whose "content" is an iterator of text chunks
+        """
+        with self.tracer.span("stream_message", message_chars=len(messages[-1]['content'])) as turn:
+            self._sync_state(state, messages)
+            # Agents get a read-only view of the history instead of the list
+            history = MessageView(messages)
+            if self.speculative:
+                # The reply itself is streamed, so only routing is speculative
+                agent, guard_response, _ = self._route_speculative(history, prefetch=False, state=state)
+            else:
+                agent, guard_response = self._route(history, state)
+            if agent is None:
+                return self._finish_turn(turn, state, messages, None, self._as_stream(guard_response))
+            
+            with self.tracer.span("answer", agent=self._agent_name(agent), stream=True):
+                response = agent.stream_response(history, state=state)
+            
+            if response.get("memory", {}).get("needs_rerouting"):
+                print(f"Rerouting order intent to: order_taking_agent")
+                agent = self.order_taking_agent
+                with self.tracer.span("answer", agent="order_taking_agent", stream=True, rerouted=True):
+                    response = agent.stream_response(history, state=state)
+            
+            return self._finish_turn(turn, state, messages, agent, self._as_stream(response))
+
+    def _agent_name(self, agent) -> str:
+        return self.agents.name_of(agent)
+
+    def _sync_state(self, state, messages):
+        if state is not None:
+            with self.tracer.span("sync_state"):
+                state.sync(messages)
+
+    def _finish_turn(self, span, state, messages, agent, response):
+        """Record the route on the turn's span and fold the reply into the session state"""
+        if span is not None:
+            span.set_attribute("route", "guard_agent" if agent is None else self._agent_name(agent))
+        if state is not None:
+            state.record_response(response, len(messages))
+        return response
+
+    def startup_report(self) -> Dict[str, Any]:
+        """Which agents have been built, with their import and construction times"""
+        return self.agents.report()
+
+    def knowledge_report(self) -> Dict[str, Any]:
+        """Knowledge base version, reload and semantic cache stats, once the details agent is built"""
+        if not self.agents.is_built("details_agent"):
+            return None
+        details_agent = self.details_agent
+        report = details_agent.knowledge_store.stats()
+        if details_agent.semantic_cache is not None:
+            report["semantic_cache"] = details_agent.semantic_cache.stats()
+        return report
+
+    def latency_report(self) -> Dict[str, Any]:
+        """Rolling p50/p95/p99 latency per stage (guard, classify, answer, llm_call, ...)"""
+        return self.tracer.stats()
+
+    def _as_stream(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Wrap a buffered reply so callers can always iterate over content"""
+        if isinstance(response["content"], str):
+            response = dict(response)
+            response["content"] = iter([response["content"]])
+        return response
@@ -0,0 +1,214 @@
+import os
+import re
+import time
+import threading
+from copy import deepcopy
+import numpy as np
+from .bm25 import tokenize
+
+try:
+    import faiss
+except ImportError:  # NumPy fallback below
+    faiss = None
+
+
+_CONTRACTION = re.compile(r"n['’]t\b")
+_WORD = re.compile(r"[a-z0-9]+")
+# Folded into one "not" term, so "don't deliver" and "do not deliver" share a key
+NEGATIONS = frozenset({
+    "not", "no", "never", "nothing", "none", "nor", "without", "cannot", "dont", "doesnt", "didnt",
+    "isnt", "arent", "wasnt", "werent", "cant", "wont", "wouldnt", "shouldnt", "couldnt", "havent",
+    "hasnt", "hadnt"
+})
+
+
+def normalise_question(text):
+    """
+    Stemmed content words, sorted and deduplicated, with any negation kept
+    as "not": "What time do you open?" -> "open time",
+    "Don't you open on Sunday?" -> "not open sunday"
+    """
+    words = _WORD.findall(_CONTRACTION.sub("nt", text.lower()))
+    return " ".join(sorted(set(tokenize(" ".join("not" if word in NEGATIONS else word for word in words)))))
+
+
+def _negated(key):
+    return "not" in key.split()
+
+
+class SemanticCache:
+    """
+    Answers to past questions, found again by meaning rather than wording.
+
+    Each question is normalised and embedded, and compared with the
+    embeddings of earlier questions; the stored answer of the most similar
+    one is returned when the similarity reaches threshold and both questions
+    are negated or neither is, since embeddings barely tell "do you deliver"
+    from "don't you deliver". Questions that normalise to the same text skip
+    the search. Entries are tied to the
+    knowledge base version they were answered from, and the whole cache is
+    dropped when that version changes. The oldest entry is replaced once
+    max_entries is reached.
+
+    Paraphrases only meet the threshold with a semantic embedding model.
+    The local hashing embedder scores different wordings far apart
+    ("opening time?" against "when do you open" is about 0.7), so with it
+    the cache only finds questions that normalise to the same key.
+
+    Args:
+        embedder: Object with embed_query(text) -> normalised vector
+        threshold: Lowest cosine similarity that counts as a hit
+        max_entries: Most cached answers
+    """
+    def __init__(self, embedder=None, threshold=0.9, max_entries=1024):
+        if embedder is None:
+            from .knowledge_index import LocalEmbedder
+            embedder = LocalEmbedder()
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        self.backend = "faiss" if faiss is not None else "numpy"
+        self._lock = threading.Lock()
+        self.version = None
+        self._reset()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.latency_saved_ms = 0.0
+        self.lookup_ms = 0.0
+
+    def _reset(self):
+        self._entries = [None] * self.max_entries
+        self._slots = {}
+        self._next = 0
+        self._vectors = None
+        self._index = None
+
+    def _ensure_index(self, dimension):
+        if self._vectors is not None or self._index is not None:
+            return
+        if self.backend == "faiss":
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        else:
+            self._vectors = np.zeros((self.max_entries, dimension), dtype=np.float32)
+            self._valid = np.zeros(self.max_entries, dtype=bool)
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._slots:
+                self.invalidations += 1
+            self._reset()
+            self.version = version
+
+    def _search(self, vector):
+        """(similarity, slot) of the nearest cached question, or (None, None)"""
+        if not self._slots:
+            return None, None
+        vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(1, -1)
+        if self._index is not None:
+            scores, slots = self._index.search(vector, 1)
+            return float(scores[0][0]), int(slots[0][0])
+        scores = np.where(self._valid, self._vectors @ vector[0], -np.inf)
+        slot = int(np.argmax(scores))
+        return float(scores[slot]), slot
+
+    def lookup(self, question, version):
+        """
+        Find the answer of an earlier question like this one.
+
+        Returns:
+            (answer, similarity) on a hit, (None, similarity of the nearest entry) on a miss
+        """
+        started = time.perf_counter()
+        key = normalise_question(question)
+        vector = None
+        if key and key not in self._slots:
+            # Embed outside the lock; the key is checked again below
+            vector = self.embedder.embed_query(key)
+
+        with self._lock:
+            self._check_version(version)
+            slot = self._slots.get(key)
+            similarity = 1.0 if slot is not None else None
+            if slot is None and vector is not None:
+                similarity, slot = self._search(vector)
+                if slot is not None and (similarity < self.threshold
+                                         or _negated(self._entries[slot]["key"]) != _negated(key)):
+                    slot = None
+
+            elapsed = (time.perf_counter() - started) * 1000
+            self.lookup_ms += elapsed
+            if slot is None:
+                self.misses += 1
+                return None, similarity
+            entry = self._entries[slot]
+            self.hits += 1
+            self.latency_saved_ms += max(0.0, entry["latency_ms"] - elapsed)
+            return deepcopy(entry["answer"]), similarity
+
+    def store(self, question, answer, version, latency_ms):
+        """Remember answer for question, as answered from knowledge base version in latency_ms"""
+        key = normalise_question(question)
+        if not key:
+            return
+        vector = np.asarray(self.embedder.embed_query(key), dtype=np.float32)
+        with self._lock:
+            self._check_version(version)
+            if key in self._slots:
+                return
+            self._ensure_index(len(vector))
+            slot = self._next
+            self._next = (self._next + 1) % self.max_entries
+            old = self._entries[slot]
+            if old is not None:
+                self._slots.pop(old["key"], None)
+
+            self._entries[slot] = {"key": key, "answer": deepcopy(answer), "latency_ms": latency_ms}
+            self._slots[key] = slot
+            if self._index is not None:
+                ids = np.array([slot], dtype=np.int64)
+                if old is not None:
+                    self._index.remove_ids(ids)
+                self._index.add_with_ids(vector.reshape(1, -1), ids)
+            else:
+                self._vectors[slot] = vector
+                self._valid[slot] = True
+            self.stores += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._slots),
+                "backend": self.backend,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "invalidations": self.invalidations,
+                "latency_saved_ms": round(self.latency_saved_ms, 3),
+                "avg_lookup_ms": round(self.lookup_ms / lookups, 3) if lookups else 0.0,
+            }
+
+
+def get_semantic_cache(embedder=None):
+    """
+    A SemanticCache configured from the environment, or None when
+    SEMANTIC_CACHE is off or there is no semantic embedding model
+    (KNOWLEDGE_EMBEDDING_MODEL) to compare questions with
+    """
+    if os.getenv("SEMANTIC_CACHE", "false").lower() not in ("1", "true", "yes"):
+        return None
+    if embedder is None or getattr(embedder, "name", "").startswith("local-"):
+        print("SEMANTIC_CACHE needs a semantic embedding model (KNOWLEDGE_EMBEDDING_MODEL); "
+              "the local embedder does not match paraphrases, so the cache stays off")
+        return None
+    return SemanticCache(
+        embedder=embedder,
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.9)),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", 1024))
+    )
@@ -0,0 +1,92 @@
+class ConversationState:
+    """
+    Per-session conversation state: cart, discount codes, last agent and
+    ordering flags.
+
+    The state is folded from the "memory" dicts that agents attach to their
+    replies, one message at a time, so a turn only processes the messages
+    added since the previous turn instead of replaying the whole history.
+    Old transcripts are loaded with from_messages.
+    """
+    def __init__(self):
+        self.cart = []
+        self.discount_codes = []
+        self.last_agent = None
+        self.in_ordering_process = False
+        self.has_cart_items = False
+        # Number of messages of the transcript already folded in
+        self.messages_seen = 0
+        # (position, response) recorded by the router, not yet seen in the transcript
+        self._pending = None
+
+    @classmethod
+    def from_messages(cls, messages):
+        """Rebuild the state from a full transcript"""
+        state = cls()
+        state.sync(messages)
+        return state
+
+    def apply(self, message):
+        """Fold one message into the state"""
+        if message.get("role") != "assistant" or not message.get("memory"):
+            return
+        memory = message["memory"]
+        agent = memory.get("agent")
+        if agent:
+            self.last_agent = agent
+        if agent == "order_taking_agent":
+            self.in_ordering_process = True
+            if "cart" in memory:
+                self.cart = memory["cart"]
+                if memory["cart"]:
+                    self.has_cart_items = True
+            if "discount_codes" in memory:
+                self.discount_codes = memory["discount_codes"]
+
+    def record_response(self, response, position):
+        """
+        Fold in a reply the router just produced; the caller is expected to
+        append it to the transcript at the given position.
+        """
+        self.apply(response)
+        self._pending = (position, response)
+
+    def sync(self, messages):
+        """
+        Fold in messages added to the transcript since the last sync. If the
+        transcript no longer matches what was folded in (edited, truncated or
+        the recorded reply was not appended), the state is rebuilt.
+        """
+        if self._pending is not None:
+            position, response = self._pending
+            self._pending = None
+            appended = len(messages) > position and (
+                messages[position] is response or messages[position].get("memory") == response.get("memory")
+            )
+            if not appended:
+                return self._rebuild(messages)
+            self.messages_seen = position + 1
+
+        if len(messages) < self.messages_seen:
+            return self._rebuild(messages)
+
+        for message in messages[self.messages_seen:]:
+            self.apply(message)
+        self.messages_seen = len(messages)
+        return self
+
+    def _rebuild(self, messages):
+        self.__init__()
+        return self.sync(messages)
+
+    def cart_snapshot(self):
+        """Copies of the cart and discount codes that an agent may modify"""
+        return [dict(item) for item in self.cart], list(self.discount_codes)
+
+    def context(self):
+        """Routing context used by ClassificationAgent and the intent model"""
+        return {
+            "in_ordering_process": self.in_ordering_process,
+            "last_agent": self.last_agent,
+            "has_cart_items": self.has_cart_items
+        }
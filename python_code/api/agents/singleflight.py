@@ -0,0 +1,106 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls.
+
+    The first caller for a key (the leader) runs the call; callers that
+    arrive with the same key while it is in flight wait for the leader's
+    result instead of making their own call, and get its exception if it
+    fails. Once the call finishes the key is forgotten, so this never
+    serves stale results; caching is LLMResponseCache's job.
+
+    Sync and async callers share the same in-flight calls: async followers
+    await the leader's future without holding a thread.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        """Return (future, is_leader) for key"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """
+        Run fn() unless an identical call is in flight.
+
+        Returns:
+            (result, shared): shared is True when another caller's result was reused
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            # KeyboardInterrupt or SystemExit in the leader must not leave followers waiting
+            self._finish(key, future, error=e if isinstance(e, Exception) else RuntimeError("Coalesced call interrupted"))
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    async def do_async(self, key, fn):
+        """Async variant of do; fn is an async callable"""
+        future, leader = self._join(key)
+        if not leader:
+            # Shielded, so a cancelled follower does not cancel the shared future
+            return await asyncio.shield(asyncio.wrap_future(future)), True
+        try:
+            result = await fn()
+        except BaseException as e:
+            # Cancellation of the leader must not leave followers waiting
+            self._finish(key, future, error=e if isinstance(e, Exception) else RuntimeError("Coalesced call cancelled"))
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        calls = self.leaders + self.coalesced
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": in_flight,
+            "coalesced_ratio": round(self.coalesced / calls, 4) if calls else 0.0
+        }
+
+
+_singleflight = None
+_singleflight_lock = threading.Lock()
+
+
+def get_singleflight():
+    """Return the process-wide SingleFlight, or None when LLM_SINGLEFLIGHT is off"""
+    global _singleflight
+    if os.getenv("LLM_SINGLEFLIGHT", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _singleflight is None:
+        with _singleflight_lock:
+            if _singleflight is None:
+                _singleflight = SingleFlight()
+    return _singleflight
@@ -0,0 +1,42 @@
+import re
+import zlib
+import numpy as np
+
+
+def char_ngrams(text, min_n=2, max_n=4):
+    """Character n-grams of each word, padded with spaces to mark word edges"""
+    grams = []
+    for word in text.lower().split():
+        padded = f" {word} "
+        for n in range(min_n, max_n + 1):
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+_WORD = re.compile(r"[a-z0-9']+")
+# Function words carry no topic signal and inflate similarity between topics
+_STOP_WORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "do", "does", "did", "i", "me", "my", "you",
+    "your", "we", "our", "it", "its", "to", "of", "for", "in", "on", "at", "and", "or",
+    "what", "which", "who", "how", "when", "where", "much", "many", "can", "could", "would",
+    "should", "will", "please", "tell", "about", "some", "this", "that", "with", "get"
+}
+
+
+class HashingVectorizer:
+    """
+    Stateless text vectorizer: hashed word unigrams and character n-grams,
+    L2 normalised. Needs no fitting and no embedding service.
+    """
+    def __init__(self, n_features=2 ** 14):
+        self.n_features = n_features
+
+    def transform(self, texts):
+        vectors = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = [word for word in _WORD.findall(text.lower()) if word not in _STOP_WORDS]
+            features = words + char_ngrams(" ".join(words), 3, 4)
+            for feature in features:
+                vectors[row, zlib.crc32(feature.encode("utf-8")) % self.n_features] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
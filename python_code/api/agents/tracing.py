@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from .call_policy import LatencyTracker
+
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed stage of a turn, with attributes such as prompt size or cache hits"""
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_time", "end_time",
+                 "_started", "duration_ms", "attributes", "status", "error")
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start_time = time.time()
+        self.end_time = None
+        self._started = time.perf_counter()
+        self.duration_ms = None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self):
+        """OpenTelemetry (OTLP/JSON) span record"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": int(self.start_time * 1e9),
+            "endTimeUnixNano": int(self.end_time * 1e9),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.status == "error"
+                      else {"code": "STATUS_CODE_OK"},
+        }
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class JsonLinesExporter:
+    """
+    Appends finished spans to a file, one JSON record per line. The file
+    stays open, line buffered, until close().
+
+    Args:
+        path: Output file
+        format: "json" for flat records, "otlp" for OpenTelemetry span records
+    """
+    def __init__(self, path, format="json"):
+        self.path = path
+        self.format = format
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, span):
+        record = span.to_otlp() if self.format == "otlp" else span.to_dict()
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+                self._file.write(line)
+            except OSError as e:
+                print(f"Failed to export span: {e}")
+                # Reopened on the next span
+                self._close()
+
+    def _close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+class Tracer:
+    """
+    Records spans for each stage of a turn and keeps rolling latency
+    histograms per stage: the span name, qualified by its agent attribute
+    when it has one ("answer/details_agent"), so stages shared by several
+    agents are reported separately.
+
+    Spans nest through a context variable, so stages started inside a span
+    (in the same thread or asyncio task) become its children.
+
+    Args:
+        exporter: Optional exporter receiving every finished span
+        window: Samples kept per span name for the percentiles
+        enabled: When False, spans are no-ops
+    """
+    def __init__(self, exporter=None, window=1000, enabled=True):
+        self.exporter = exporter
+        self.window = window
+        self.enabled = enabled
+        self._histograms = {}
+        self._counts = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the enclosed block as a child of the current span"""
+        if not self.enabled:
+            yield None
+            return
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status, span.error = "error", f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def start_span(self, name, **attributes):
+        """
+        Start a span without making it current, for work that outlives the
+        calling frame (e.g. a streamed reply); finish it with end_span.
+        """
+        if not self.enabled:
+            return None
+        return Span(name, parent=_current_span.get(), attributes=attributes)
+
+    def end_span(self, span, error=None):
+        if span is None:
+            return
+        if error is not None:
+            span.status, span.error = "error", str(error)
+        span.end_time = time.time()
+        span.duration_ms = span.elapsed_ms()
+        self._record(span)
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def _record(self, span):
+        agent = span.attributes.get("agent")
+        stage = f"{span.name}/{agent}" if agent else span.name
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyTracker(window=self.window)
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+            if span.status == "error":
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+        histogram.record(span.duration_ms)
+
+    def stats(self):
+        """Rolling p50/p95/p99 latency (ms), counts and errors per stage"""
+        with self._lock:
+            histograms = dict(self._histograms)
+            counts = dict(self._counts)
+            errors = dict(self._errors)
+        report = {}
+        for name, histogram in sorted(histograms.items()):
+            report[name] = {
+                "count": counts.get(name, 0),
+                "errors": errors.get(name, 0),
+                "p50_ms": round(histogram.percentile(50), 3),
+                "p95_ms": round(histogram.percentile(95), 3),
+                "p99_ms": round(histogram.percentile(99), 3),
+            }
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counts.clear()
+            self._errors.clear()
+
+
+def current_span():
+    return _current_span.get()
+
+
+def annotate(**attributes):
+    """Add attributes to the current span, if there is one"""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """
+    Return the process-wide Tracer. TRACING=false disables spans,
+    TRACE_EXPORT_PATH enables the JSON lines exporter and
+    TRACE_EXPORT_FORMAT selects "json" or "otlp" records.
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                path = os.getenv("TRACE_EXPORT_PATH")
+                exporter = JsonLinesExporter(path, os.getenv("TRACE_EXPORT_FORMAT", "json")) if path else None
+                _tracer = Tracer(
+                    exporter=exporter,
+                    window=int(os.getenv("TRACE_HISTOGRAM_WINDOW", 1000)),
+                    enabled=os.getenv("TRACING", "true").lower() in ("1", "true", "yes")
+                )
+    return _tracer
@@ -1,21 +1,145 @@
+import os
 import json
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from .call_policy import CallPolicy, ModelCallError
+from .json_extractor import extract_json, JSONExtractionError
+from .singleflight import get_singleflight
+from .tracing import get_tracer, annotate
 
 
-def get_chatbot_response(client, model_name, messages, temperature=0.9, max_tokens=512):
+class BedrockClientProvider:
     """
-    Gets chatbot response from Mistral 7B on AWS Bedrock
-    
+    Process-wide provider for a shared bedrock-runtime client.
+
+    boto3 clients are thread-safe, so a single client backed by one tuned
+    urllib3 connection pool is shared by every agent of every session instead
+    of each agent building (and TLS-handshaking) its own.
+
     Args:
-        client: boto3 bedrock-runtime client
-        model_name: Model ID (e.g., "mistral.mistral-7b-instruct-v0:2")
-        messages: List of message dicts with "role" and "content"
-        temperature: Creativity control (0-1)
-        max_tokens: Maximum tokens to generate
-        
-    Returns:
-        str: Generated response
+        region_name: AWS region of the Bedrock endpoint
+        max_connections: Upper bound of pooled HTTP connections (and of
+            concurrent model calls leased through the provider)
+        connect_timeout: Seconds to wait for a TCP/TLS connection
+        read_timeout: Seconds to wait for a response from the model
     """
-    # Format conversation history for Mistral
+    def __init__(self, region_name=None, max_connections=None, connect_timeout=None, read_timeout=None):
+        self.region_name = region_name or os.getenv("AWS_REGION", "us-east-1")
+        self.max_connections = int(max_connections or os.getenv("BEDROCK_MAX_CONNECTIONS", 50))
+        self.connect_timeout = float(connect_timeout or os.getenv("BEDROCK_CONNECT_TIMEOUT", 5))
+        self.read_timeout = float(read_timeout or os.getenv("BEDROCK_READ_TIMEOUT", 60))
+
+        self._client = None
+        self._lock = threading.Lock()
+        self._slots = threading.Condition()
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._waits = 0
+        self._leases = 0
+
+    def get_client(self):
+        """Return the shared client, creating it on first use"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def _create_client(self):
+        # BEDROCK_RUNTIME=fake swaps in the offline fake runtime
+        if os.getenv("BEDROCK_RUNTIME", "").lower() == "fake":
+            from .fake_bedrock import FakeBedrockRuntime
+            return FakeBedrockRuntime.from_env()
+
+        import boto3
+        from botocore.config import Config
+
+        config = Config(
+            region_name=self.region_name,
+            max_pool_connections=self.max_connections,
+            connect_timeout=self.connect_timeout,
+            read_timeout=self.read_timeout,
+            tcp_keepalive=True,
+            # Retries are handled by CallPolicy, not hidden inside botocore
+            retries={"max_attempts": 1, "mode": "standard"}
+        )
+        return boto3.client(service_name='bedrock-runtime', config=config)
+
+    @contextmanager
+    def lease(self):
+        """
+        Hold one connection slot for the duration of a model call.
+        Blocks (and counts a wait) when every pooled connection is busy,
+        instead of letting urllib3 silently open and discard extra sockets.
+        """
+        with self._slots:
+            if self._in_use >= self.max_connections:
+                self._waits += 1
+                while self._in_use >= self.max_connections:
+                    self._slots.wait()
+            self._in_use += 1
+            self._leases += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        try:
+            yield
+        finally:
+            with self._slots:
+                self._in_use -= 1
+                self._slots.notify()
+
+    def _idle_connections(self):
+        """Count open keep-alive sockets parked in the urllib3 pools (best effort)"""
+        if self._client is None:
+            return 0
+        try:
+            manager = self._client._endpoint.http_session._manager
+            pools = list(manager.pools._container.values())
+            return sum(1 for pool in pools for conn in list(pool.pool.queue) if conn is not None)
+        except Exception:
+            return None
+
+    def stats(self):
+        """Report pool utilisation: leased, idle and waits for a free slot"""
+        with self._slots:
+            return {
+                "max_connections": self.max_connections,
+                "in_use": self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "idle": self._idle_connections(),
+                "waits": self._waits,
+                "leases": self._leases
+            }
+
+
+_client_provider = None
+_client_provider_lock = threading.Lock()
+
+
+def get_client_provider():
+    """Return the process-wide BedrockClientProvider"""
+    global _client_provider
+    if _client_provider is None:
+        with _client_provider_lock:
+            if _client_provider is None:
+                _client_provider = BedrockClientProvider()
+    return _client_provider
+
+
+def get_bedrock_client():
+    """Return the shared bedrock-runtime client used by all agents"""
+    return get_client_provider().get_client()
+
+
+# Used when a caller passes no policy: no deadline, but the retries botocore
+# would otherwise have made
+DEFAULT_CALL_POLICY = CallPolicy(max_attempts=3)
+
+
+def format_mistral_prompt(messages):
+    """Format conversation history into a Mistral instruct prompt"""
     formatted_prompt = ""
     for message in messages:
         if message["role"] == "system":
@@ -24,64 +148,389 @@ def get_chatbot_response(client, model_name, messages, temperature=0.9, max_toke
             formatted_prompt += f"<s>[INST] {message['content']} [/INST]"
         elif message["role"] == "assistant":
             formatted_prompt += f" {message['content']} </s>"
-    
-    body = {
-        "prompt": formatted_prompt,
+    return formatted_prompt
+
+
+def _build_request_body(messages, temperature, max_tokens):
+    return {
+        "prompt": format_mistral_prompt(messages),
         "max_tokens": max_tokens,
         "temperature": temperature,
         "top_p": 0.8  # Matching your example
     }
+
+
+def _cache_key(cache, model_name, body):
+    """Return the cache key for this call, or None when it must not be cached"""
+    if cache is None or not cache.is_cacheable(body["temperature"]):
+        return None
+    return cache.make_key(model_name, body["prompt"], body["temperature"], body["max_tokens"])
+
+
+def get_chatbot_response(client, model_name, messages, temperature=0.9, max_tokens=512, cache=None, policy=None):
+    """
+    Gets chatbot response from Mistral 7B on AWS Bedrock
     
+    Args:
+        client: boto3 bedrock-runtime client
+        model_name: Model ID (e.g., "mistral.mistral-7b-instruct-v0:2")
+        messages: List of message dicts with "role" and "content"
+        temperature: Creativity control (0-1)
+        max_tokens: Maximum tokens to generate
+        cache: Optional LLMResponseCache; used for low-temperature calls only
+        policy: Optional CallPolicy (deadline, retries, hedging); defaults
+            to three attempts without a deadline
+        
+    Returns:
+        str: Generated response
+        
+    Raises:
+        ModelCallError: The call failed or missed its deadline
+    """
+    body = _build_request_body(messages, temperature, max_tokens)
+    
+    with get_tracer().span("llm_call", model=model_name, prompt_chars=len(body["prompt"]), max_tokens=max_tokens):
+        cache_key = _cache_key(cache, model_name, body)
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                annotate(cache_hit=True, output_chars=len(cached))
+                return cached
+        
+        text = _call_model(client, model_name, body, policy, cache, cache_key)
+        annotate(cache_hit=False, output_chars=len(text))
+        return text
+
+
+def _flight_key(client, model_name, body):
+    """Identical requests to the same client share one in-flight call"""
+    return (id(client), model_name, body["prompt"], body["temperature"], body["max_tokens"], body["top_p"])
+
+
+def _call_model(client, model_name, body, policy=None, cache=None, cache_key=None):
+    """
+    Invoke the model, joining an identical call that is already in flight
+    (see SingleFlight) instead of sending a duplicate request
+    """
+    flight = get_singleflight()
+    if flight is None:
+        return _call_model_once(client, model_name, body, policy, cache, cache_key)
+    text, shared = flight.do(
+        _flight_key(client, model_name, body),
+        lambda: _call_model_once(client, model_name, body, policy, cache, cache_key)
+    )
+    if shared:
+        annotate(coalesced=True)
+    return text
+
+
+def _call_model_once(client, model_name, body, policy=None, cache=None, cache_key=None):
+    """Invoke the model under its call policy and store the result in the cache"""
+    policy = policy or DEFAULT_CALL_POLICY
     try:
+        text = policy.execute(lambda: _invoke_model(client, model_name, body))
+    except ModelCallError as e:
+        print(f"Error invoking model: {e}")
+        raise
+    
+    if cache_key is not None:
+        cache.set(cache_key, text)
+    return text
+
+
+def _invoke_model(client, model_name, body):
+    with get_client_provider().lease():
         response = client.invoke_model(
             body=json.dumps(body),
             modelId=model_name,
             accept='application/json',
             contentType='application/json'
         )
-        
         response_body = json.loads(response['body'].read())
-        return response_body['outputs'][0]['text']
     
-    except Exception as e:
-        print(f"Error invoking model: {e}")
-        return None
+    return response_body['outputs'][0]['text']
 
 
+def stream_chatbot_response(client, model_name, messages, temperature=0.9, max_tokens=512, cache=None, policy=None):
+    """
+    Streams a chatbot response from Mistral 7B on AWS Bedrock
+    
+    Same arguments as get_chatbot_response, but uses
+    invoke_model_with_response_stream and yields text chunks as soon as
+    the model produces them. A cached completion is yielded as one chunk;
+    a fully streamed completion is stored in the cache. The call policy
+    covers opening the stream; errors after that are raised to the consumer.
+    
+    Yields:
+        str: Generated text chunks
+    """
+    body = _build_request_body(messages, temperature, max_tokens)
+    
+    # The stream outlives the caller's frame, so its span is never made current
+    tracer = get_tracer()
+    span = tracer.start_span("llm_call", model=model_name, prompt_chars=len(body["prompt"]),
+                             max_tokens=max_tokens, stream=True)
+    
+    cache_key = _cache_key(cache, model_name, body)
+    if cache_key is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            if span is not None:
+                span.attributes.update(cache_hit=True, output_chars=len(cached))
+            tracer.end_span(span)
+            yield cached
+            return
+    
+    # Each attempt (a hedge is a second attempt) opens its stream under its
+    # own lease; the winner's lease is held until its stream is exhausted or
+    # closed, and the losers' streams are closed and their leases released
+    opened = []
+    opened_lock = threading.Lock()
+    settled = []
 
-def get_embedding(embedding_client,model_name,text_input):
-    output = embedding_client.embeddings.create(input = text_input,model=model_name)
+    def open_stream():
+        lease = get_client_provider().lease()
+        lease.__enter__()
+        try:
+            response = client.invoke_model_with_response_stream(
+                body=json.dumps(body),
+                modelId=model_name,
+                accept='application/json',
+                contentType='application/json'
+            )
+        except BaseException:
+            lease.__exit__(None, None, None)
+            raise
+        stream = (response, lease)
+        with opened_lock:
+            if not settled:
+                opened.append(stream)
+                return stream
+        # The call was already decided; this late attempt is discarded
+        _release_stream(stream)
+        return stream
+
+    def settle(winner=None):
+        with opened_lock:
+            settled.append(True)
+            losers = [stream for stream in opened if stream is not winner]
+        for stream in losers:
+            _release_stream(stream)
+
+    streamed = []
+    error = None
+    winner = None
+    try:
+        try:
+            winner = (policy or DEFAULT_CALL_POLICY).execute(open_stream)
+        finally:
+            settle(winner)
+
+        for event in winner[0]['body']:
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            chunk_body = json.loads(chunk['bytes'])
+            for output in chunk_body.get('outputs', []):
+                if output.get('text'):
+                    if not streamed and span is not None:
+                        span.set_attribute("first_chunk_ms", round(span.elapsed_ms(), 3))
+                    streamed.append(output['text'])
+                    yield output['text']
+        
+        if cache_key is not None and streamed:
+            cache.set(cache_key, "".join(streamed))
     
-    embedings = []
-    for embedding_object in output.data:
-        embedings.append(embedding_object.embedding)
+    except Exception as e:
+        # Re-raised, so callers can tell a failed stream from a finished one
+        error = e
+        raise
+    
+    finally:
+        if winner is not None:
+            _release_stream(winner)
+        if span is not None:
+            span.attributes.update(cache_hit=False, output_chars=sum(len(chunk) for chunk in streamed))
+        tracer.end_span(span, error=error)
 
-    return embedings
 
+def stream_answer(chunks, empty_text, on_complete=None):
+    """
+    Yield a streamed answer without its leading whitespace, for an agent's
+    reply "content".
+
+    Args:
+        chunks: Text chunks, e.g. from stream_chatbot_response
+        empty_text: Yielded instead when the model produced no text
+        on_complete: Optional callable(text), called with the whole answer
+            only once the model stream has finished. A stream that fails or
+            is closed early (a client that went away) is closed at once, so
+            its connection is released rather than left for the garbage
+            collector, and on_complete is not called.
+    """
+    begun = False
+    completed = False
+    parts = []
+    try:
+        for chunk in chunks:
+            if not begun:
+                chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+                begun = True
+            parts.append(chunk)
+            yield chunk
+        completed = True
+    finally:
+        if not completed and hasattr(chunks, "close"):
+            chunks.close()
+    if not begun:
+        yield empty_text
+    elif on_complete is not None:
+        on_complete("".join(parts).strip())
 
 
-def double_check_json_output(client,model_name,json_string):
-    prompt = f""" You will check this json string and correct any mistakes that will make it invalid. Then you will return the corrected json string. Nothing else. 
-    If the Json is correct just return it.
+def _release_stream(stream):
+    """Close an opened response stream and release its connection lease"""
+    response, lease = stream
+    close = getattr(response.get('body'), 'close', None)
+    if close is not None:
+        try:
+            close()
+        except Exception as e:
+            print(f"Error closing model stream: {e}")
+    lease.__exit__(None, None, None)
 
-    if there is any text before order after the json string, remove it.
-    Do Not return a single letter outside of the json string.
-    Make sure that each key and value in the json string is in double quotes.
-    The first thing you write should be open curly brace and the last thing you write should be close curly brace.
 
-    you shoud check  the json string for the following text between triple backticks:
 
-    ```
-    {json_string}
+class ModelCallLimiter:
+    """
+    Caps the number of in-flight async model calls.
     
-    ```
+    asyncio semaphores are bound to one event loop, so a semaphore is created
+    lazily per loop; the limit is shared by all of them.
+    
+    Args:
+        limit: Maximum number of concurrent model calls per event loop
+    """
+    def __init__(self, limit=None):
+        self.limit = int(limit or os.getenv("MAX_INFLIGHT_MODEL_CALLS", 32))
+        self._semaphores = weakref.WeakKeyDictionary()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+        return semaphore
 
+    async def __aenter__(self):
+        await self._semaphore().acquire()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self._semaphore().release()
+        return False
+
+
+_model_call_executor = None
+_model_call_executor_lock = threading.Lock()
+
+
+def get_model_call_executor():
     """
+    Thread pool that runs blocking boto3 calls for the async API.
+    Sized to the connection pool so threads never outnumber connections.
+    """
+    global _model_call_executor
+    if _model_call_executor is None:
+        with _model_call_executor_lock:
+            if _model_call_executor is None:
+                _model_call_executor = ThreadPoolExecutor(
+                    max_workers=get_client_provider().max_connections,
+                    thread_name_prefix="bedrock-call"
+                )
+    return _model_call_executor
 
-    messages = [{"role": "user", "content": prompt}]
 
-    response = get_chatbot_response(client,model_name,messages)
+async def get_chatbot_response_async(client, model_name, messages, temperature=0.9, max_tokens=512, limiter=None, cache=None, policy=None):
+    """
+    Async variant of get_chatbot_response
+    
+    boto3 has no native asyncio support, so the blocking call runs on a
+    thread pool sized to the Bedrock connection pool while the event loop
+    keeps serving other conversations.
+    
+    Args:
+        limiter: Optional ModelCallLimiter capping concurrent model calls
+        cache: Optional LLMResponseCache, as in get_chatbot_response
+        policy: Optional CallPolicy, as in get_chatbot_response
+        (other arguments as in get_chatbot_response)
+        
+    Returns:
+        str: Generated response
+    """
+    body = _build_request_body(messages, temperature, max_tokens)
+    
+    # The span lives on the event loop side: executor threads do not
+    # inherit the task's context
+    with get_tracer().span("llm_call", model=model_name, prompt_chars=len(body["prompt"]), max_tokens=max_tokens):
+        # Serve cache hits on the event loop, without a thread hop
+        cache_key = _cache_key(cache, model_name, body)
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                annotate(cache_hit=True, output_chars=len(cached))
+                return cached
+        
+        loop = asyncio.get_running_loop()
+        call = lambda: _call_model_once(client, model_name, body, policy, cache, cache_key)
+        
+        async def run_call():
+            if limiter is None:
+                return await loop.run_in_executor(get_model_call_executor(), call)
+            async with limiter:
+                return await loop.run_in_executor(get_model_call_executor(), call)
+        
+        # Coalesce before taking a limiter slot or an executor thread, so
+        # callers waiting on an identical call hold neither
+        flight = get_singleflight()
+        if flight is None:
+            text = await run_call()
+        else:
+            text, shared = await flight.do_async(_flight_key(client, model_name, body), run_call)
+            if shared:
+                annotate(coalesced=True)
+        annotate(cache_hit=False, output_chars=len(text))
+        return text
+
+
+def get_embedding(embedding_client,model_name,text_input):
+    output = embedding_client.embeddings.create(input = text_input,model=model_name)
+    
+    embedings = []
+    for embedding_object in output.data:
+        embedings.append(embedding_object.embedding)
+
+    return embedings
+
 
-    response = response.replace("`","")
 
-    return response
\ No newline at end of file
+def double_check_json_output(client, model_name, json_string):
+    """
+    Return a corrected JSON string for json_string.
+    
+    Repairs are done locally by json_extractor (code fences, surrounding
+    text, single quotes, trailing commas) instead of another model round
+    trip; client and model_name are kept for compatibility. If nothing can
+    be recovered the input is returned without backticks, as before.
+    """
+    try:
+        return json.dumps(extract_json(json_string))
+    except JSONExtractionError:
+        return json_string.replace("`", "")
@@ -0,0 +1,76 @@
+import json
+import urllib.request
+import urllib.error
+
+
+class ChatClient:
+    """
+    Minimal client for the HTTP service in server.py, using only the
+    standard library.
+
+    Args:
+        base_url: Service URL, e.g. http://127.0.0.1:8000
+        timeout: Seconds to wait for a reply
+    """
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None, accept="application/json"):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=data,
+            method=method,
+            headers={"content-type": "application/json", "accept": accept}
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", "replace")
+            raise RuntimeError(f"{method} {path} failed with {e.code}: {detail}") from e
+
+    def send_message(self, session_id, content):
+        """Send a user message and return the reply dict (role, content, memory)"""
+        with self._request("POST", f"/sessions/{session_id}/messages", {"content": content}) as response:
+            return json.loads(response.read())["reply"]
+
+    def stream_message(self, session_id, content):
+        """
+        Send a user message and return a reply dict whose "content" is an
+        iterator of text chunks. "memory" is filled in once the stream ends.
+        """
+        reply = {"role": "assistant", "content": None, "memory": {}}
+        reply["content"] = self._stream_chunks(session_id, content, reply)
+        return reply
+
+    def _stream_chunks(self, session_id, content, reply):
+        with self._request("POST", f"/sessions/{session_id}/messages/stream", {"content": content},
+                           accept="text/event-stream") as response:
+            event = None
+            for raw_line in response:
+                line = raw_line.decode("utf-8").rstrip("\r\n")
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):].strip())
+                    if event == "chunk":
+                        yield data["text"]
+                    elif event == "done":
+                        reply["memory"] = data.get("memory", {})
+
+    def get_messages(self, session_id):
+        with self._request("GET", f"/sessions/{session_id}") as response:
+            return json.loads(response.read())["messages"]
+
+    def delete_session(self, session_id):
+        with self._request("DELETE", f"/sessions/{session_id}") as response:
+            return json.loads(response.read())
+
+    def health(self):
+        with self._request("GET", "/health") as response:
+            return json.loads(response.read())
+
+    def stats(self):
+        with self._request("GET", "/stats") as response:
+            return json.loads(response.read())
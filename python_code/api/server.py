@@ -0,0 +1,488 @@
+import os
+import re
+import json
+import time
+import queue
+import asyncio
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .agents.router import RouterAgent
+from .agents.session_state import ConversationState
+from .agents.singleflight import get_singleflight
+from .worker_pool import WorkerPool
+
+
+class Session:
+    """One conversation: its transcript, routing state and a lock serialising its turns"""
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.messages = []
+        self.state = ConversationState()
+        self.lock = asyncio.Lock()
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """
+    Server-side, in-memory session storage with idle expiry and an LRU cap.
+
+    Args:
+        max_sessions: Sessions kept before the least recently used is evicted
+        ttl: Seconds of inactivity after which a session expires
+    """
+    def __init__(self, max_sessions=None, ttl=None):
+        self.max_sessions = int(max_sessions or os.getenv("MAX_SESSIONS", 10000))
+        self.ttl = float(ttl or os.getenv("SESSION_TTL", 3600))
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, create=False):
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.last_access > self.ttl:
+                del self._sessions[session_id]
+                session = None
+            if session is None:
+                if not create:
+                    return None
+                session = self._sessions[session_id] = Session(session_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session_id)
+            session.last_access = now
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Marks the end of a streamed reply in _iterate
+_STREAM_END = object()
+
+_SESSION_ID = r"(?P<session_id>[A-Za-z0-9_\-.]{1,128})"
+_ROUTES = [
+    ("POST", re.compile(rf"^/sessions/{_SESSION_ID}/messages$"), "post_message"),
+    ("POST", re.compile(rf"^/sessions/{_SESSION_ID}/messages/stream$"), "stream_message"),
+    ("GET", re.compile(rf"^/sessions/{_SESSION_ID}$"), "get_session"),
+    ("DELETE", re.compile(rf"^/sessions/{_SESSION_ID}$"), "delete_session"),
+    ("GET", re.compile(r"^/health$"), "health"),
+    ("GET", re.compile(r"^/stats$"), "stats"),
+]
+
+
+class ChatService:
+    """
+    Headless ASGI service around RouterAgent.
+
+    Endpoints:
+        POST   /sessions/{id}/messages         {"content": "..."} -> the reply as JSON
+        POST   /sessions/{id}/messages/stream  the reply as Server-Sent Events:
+                                               "chunk" events, then a "done" event with the memory
+        GET    /sessions/{id}                  the transcript
+        DELETE /sessions/{id}                  forget the session
+        GET    /health, /stats                 liveness, sessions and per-stage latency
+
+    Turns of one session are serialised; different sessions run concurrently.
+    With workers set, sessions live in a WorkerPool of router processes
+    instead of this process.
+
+    Args:
+        router: RouterAgent to use; built on first use when omitted
+        store: SessionStore to use
+        workers: Router worker processes (ROUTER_WORKERS, 0 = route in this process)
+        request_timeout: Seconds to wait for a router worker's reply (WORKER_REQUEST_TIMEOUT)
+        stream_threads: Threads that drive streamed replies (STREAM_THREADS)
+        max_body_bytes: Largest request body accepted; larger ones get a 413 (MAX_REQUEST_BYTES)
+    """
+    def __init__(self, router=None, store=None, workers=None, request_timeout=None, stream_threads=None,
+                 max_body_bytes=None):
+        self._router = router
+        self._router_lock = threading.Lock()
+        self.store = store or SessionStore()
+        self.workers = int(workers if workers is not None else os.getenv("ROUTER_WORKERS", 0))
+        self.request_timeout = float(request_timeout or os.getenv("WORKER_REQUEST_TIMEOUT", 120))
+        self.max_body_bytes = int(max_body_bytes or os.getenv("MAX_REQUEST_BYTES", 65536))
+        self.pool = None
+        self.started = time.time()
+        # Streams block on the model or a worker between chunks; they get their
+        # own threads so they cannot starve the default executor
+        self._stream_executor = ThreadPoolExecutor(
+            max_workers=int(stream_threads or os.getenv("STREAM_THREADS", 32)), thread_name_prefix="sse-stream"
+        )
+
+    @property
+    def router(self):
+        if self._router is None:
+            with self._router_lock:
+                if self._router is None:
+                    self._router = RouterAgent()
+        return self._router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        try:
+            handler, params = self._resolve(scope["method"], scope["path"])
+            await getattr(self, handler)(scope, receive, send, **params)
+        except HTTPError as e:
+            await self._send_json(send, e.status, {"error": e.message})
+        except Exception as e:
+            print(f"Server error: {e}")
+            await self._send_json(send, 500, {"error": "Internal server error"})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            loop = asyncio.get_running_loop()
+            if message["type"] == "lifespan.startup":
+                # Build the router (and its clients) or start the workers before the first request
+                if self.workers:
+                    self.pool = await loop.run_in_executor(None, lambda: WorkerPool(workers=self.workers))
+                else:
+                    await loop.run_in_executor(None, lambda: self.router)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.pool is not None:
+                    await loop.run_in_executor(None, self.pool.shutdown)
+                self._stream_executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _resolve(self, method, path):
+        path_matched = False
+        for route_method, pattern, handler in _ROUTES:
+            match = pattern.match(path)
+            if match:
+                path_matched = True
+                if route_method == method:
+                    return handler, match.groupdict()
+        if path_matched:
+            raise HTTPError(405, "Method not allowed")
+        raise HTTPError(404, "Not found")
+
+    async def _read_json(self, scope, receive):
+        too_large = HTTPError(413, f"Body must be at most {self.max_body_bytes} bytes")
+        headers = dict(scope.get("headers") or [])
+        try:
+            declared = int(headers.get(b"content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if declared > self.max_body_bytes:
+            raise too_large
+
+        # Content-Length may be absent (chunked) or wrong, so the bytes read are capped too
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > self.max_body_bytes:
+                raise too_large
+            if not message.get("more_body"):
+                break
+        try:
+            payload = json.loads(bytes(body) or b"{}")
+        except json.JSONDecodeError:
+            raise HTTPError(400, "Body must be JSON")
+        content = payload.get("content") if isinstance(payload, dict) else None
+        if not isinstance(content, str) or not content.strip():
+            raise HTTPError(400, "Field 'content' must be a non-empty string")
+        return content
+
+    async def _send_json(self, send, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _start_sse(self, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]
+        })
+
+    async def _await_pool(self, future):
+        """Result of a worker pool future, or a 504 once request_timeout passes"""
+        try:
+            # Shielded, so timing out does not cancel the pool's own future
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.request_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPError(504, "Router worker did not reply in time")
+
+    async def post_message(self, scope, receive, send, session_id):
+        content = await self._read_json(scope, receive)
+        if self.pool is not None:
+            response = await self._await_pool(self.pool.submit(session_id, content).future)
+            await self._send_json(send, 200, {"session_id": session_id, "reply": response})
+            return
+        session = self.store.get(session_id, create=True)
+
+        async with session.lock:
+            session.messages.append({"role": "user", "content": content})
+            try:
+                response = await self.router.process_message_async(session.messages, state=session.state)
+            except Exception:
+                session.messages.pop()
+                raise
+            session.messages.append(response)
+
+        await self._send_json(send, 200, {
+            "session_id": session_id,
+            "reply": response,
+            "message_count": len(session.messages)
+        })
+
+    async def _wait_disconnect(self, receive):
+        """Return once the client has gone away"""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def _send_chunk(self, send, event, payload, more_body=True):
+        """Send one SSE event; False when the client is gone"""
+        try:
+            await send({"type": "http.response.body", "body": _sse(event, payload), "more_body": more_body})
+            return True
+        except Exception as e:
+            print(f"Stream closed by client: {e}")
+            return False
+
+    async def _iterate(self, iterator, disconnected):
+        """
+        Async generator over a blocking iterator of chunks.
+
+        One stream thread pulls the chunks and hands them to the event loop
+        through an asyncio.Queue. When the consumer stops early (the client
+        disconnected, or a send failed), the thread stops after the chunk it
+        is waiting on and closes the iterator, which ends the model stream.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        stopped = threading.Event()
+
+        def deliver(item):
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, item)
+            except RuntimeError:  # The event loop has closed
+                pass
+
+        def pump():
+            try:
+                for chunk in iterator:
+                    if stopped.is_set():
+                        break
+                    deliver((chunk, None))
+            except Exception as e:
+                deliver((None, e))
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+                deliver((_STREAM_END, None))
+
+        self._stream_executor.submit(pump)
+        try:
+            while True:
+                getter = asyncio.ensure_future(chunks.get())
+                done, _ = await asyncio.wait({getter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    return
+                chunk, error = getter.result()
+                if error is not None:
+                    raise error
+                if chunk is _STREAM_END:
+                    return
+                yield chunk
+        finally:
+            stopped.set()
+
+    async def stream_message(self, scope, receive, send, session_id):
+        content = await self._read_json(scope, receive)
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            if self.pool is not None:
+                await self._stream_from_pool(send, session_id, content, disconnected)
+            else:
+                await self._stream_local(send, session_id, content, disconnected)
+        finally:
+            disconnected.cancel()
+
+    async def _stream_local(self, send, session_id, content, disconnected):
+        session = self.store.get(session_id, create=True)
+        loop = asyncio.get_running_loop()
+
+        async with session.lock:
+            session.messages.append({"role": "user", "content": content})
+            try:
+                # Routing and the streamed model call block, so they run off the event loop
+                response = await loop.run_in_executor(
+                    self._stream_executor, lambda: self.router.stream_message(session.messages, state=session.state)
+                )
+            except Exception:
+                session.messages.pop()
+                raise
+
+            await self._start_sse(send)
+
+            chunks = []
+            connected = True
+            try:
+                async for chunk in self._iterate(response["content"], disconnected):
+                    chunks.append(chunk)
+                    if not await self._send_chunk(send, "chunk", {"text": chunk}):
+                        connected = False
+                        break
+            except Exception as e:
+                print(f"Server error: stream for session {session_id} failed: {e}")
+                await self._send_chunk(send, "error", {"session_id": session_id}, more_body=False)
+                connected = False
+            finally:
+                # The router recorded this reply dict; store it with the text that was produced
+                response["content"] = "".join(chunks)
+                session.messages.append(response)
+
+        if connected and not disconnected.done():
+            await self._send_chunk(send, "done", {
+                "session_id": session_id,
+                "memory": response.get("memory", {}),
+                "message_count": len(session.messages)
+            }, more_body=False)
+
+    async def _stream_from_pool(self, send, session_id, content, disconnected):
+        pending = self.pool.submit(session_id, content, stream=True)
+        started = False
+        try:
+            async for chunk in self._iterate(pending.iter_chunks(timeout=self.request_timeout), disconnected):
+                if not started:
+                    await self._start_sse(send)
+                    started = True
+                if not await self._send_chunk(send, "chunk", {"text": chunk}):
+                    return
+        except queue.Empty:
+            if not started:
+                raise HTTPError(504, "Router worker did not reply in time")
+            print(f"Server error: stream for session {session_id} stalled in its worker")
+            await self._send_chunk(send, "error", {"session_id": session_id}, more_body=False)
+            return
+        if disconnected.done():
+            return
+
+        try:
+            response = await self._await_pool(pending.future)
+        except Exception:
+            if not started:
+                raise
+            print(f"Server error: stream for session {session_id} failed in its worker")
+            await self._send_chunk(send, "error", {"session_id": session_id}, more_body=False)
+            return
+        if not started:
+            await self._start_sse(send)
+        await self._send_chunk(send, "done", {
+            "session_id": session_id,
+            "memory": response.get("memory", {})
+        }, more_body=False)
+
+    async def get_session(self, scope, receive, send, session_id):
+        if self.pool is not None:
+            messages = await self._await_pool(self.pool.get_messages(session_id))
+        else:
+            session = self.store.get(session_id)
+            messages = session.messages if session is not None else None
+        if messages is None:
+            raise HTTPError(404, "Unknown session")
+        await self._send_json(send, 200, {"session_id": session_id, "messages": messages})
+
+    async def delete_session(self, scope, receive, send, session_id):
+        if self.pool is not None:
+            deleted = await self._await_pool(self.pool.delete_session(session_id))
+        else:
+            deleted = self.store.delete(session_id)
+        if not deleted:
+            raise HTTPError(404, "Unknown session")
+        await self._send_json(send, 200, {"session_id": session_id, "deleted": True})
+
+    async def health(self, scope, receive, send):
+        if self.pool is not None:
+            workers = await asyncio.get_running_loop().run_in_executor(None, self.pool.stats)
+            alive = all(worker["alive"] or worker["draining"] for worker in workers)
+            await self._send_json(send, 200 if alive else 503, {
+                "status": "ok" if alive else "degraded",
+                "workers": workers,
+                "uptime_seconds": round(time.time() - self.started, 1)
+            })
+            return
+        await self._send_json(send, 200, {
+            "status": "ok",
+            "sessions": len(self.store),
+            "uptime_seconds": round(time.time() - self.started, 1)
+        })
+
+    async def stats(self, scope, receive, send):
+        if self.pool is not None:
+            loop = asyncio.get_running_loop()
+            workers = await loop.run_in_executor(None, self.pool.stats)
+            reports = await loop.run_in_executor(None, self.pool.worker_stats)
+            for worker, report in zip(workers, reports):
+                worker.update(report)
+            await self._send_json(send, 200, {
+                "sessions": sum(worker["sessions"] for worker in workers),
+                "workers": workers
+            })
+            return
+        router = self.router
+        flight = get_singleflight()
+        await self._send_json(send, 200, {
+            "sessions": len(self.store),
+            "latency": router.latency_report(),
+            "speculation": router.speculation_report(),
+            "agents": router.startup_report(),
+            "connections": router.connection_report(),
+            "guard_prefilter": router.guard_report(),
+            "llm_cache": router.cache_report(),
+            "knowledge": router.knowledge_report(),
+            "coalescing": flight.stats() if flight is not None else None
+        })
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n".encode("utf-8")
+
+
+app = ChatService()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve RouterAgent over HTTP")
+    parser.add_argument("--host", default=os.getenv("PLANTIFY_API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PLANTIFY_API_PORT", 8000)))
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+import os
+import time
+import zlib
+import queue
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+_STREAM_END = None
+
+
+def _worker_main(index, requests, results, sessions, threads):
+    """
+    Worker process: one RouterAgent, the sessions assigned to this worker and
+    a thread pool so model calls of different sessions overlap.
+    """
+    from .agents.router import RouterAgent
+    from .agents.session_state import ConversationState
+    from .agents.singleflight import get_singleflight
+
+    router = RouterAgent()
+    flight = get_singleflight()
+    store = {}
+    store_lock = threading.Lock()
+    for session_id, messages in (sessions or {}).items():
+        store[session_id] = (messages, ConversationState.from_messages(messages), threading.Lock())
+
+    def session(session_id, create=True):
+        with store_lock:
+            entry = store.get(session_id)
+            if entry is None and create:
+                entry = store[session_id] = ([], ConversationState(), threading.Lock())
+            return entry
+
+    def turn(request_id, session_id, content, stream):
+        messages, state, lock = session(session_id)
+        with lock:
+            messages.append({"role": "user", "content": content})
+            try:
+                if stream:
+                    response = router.stream_message(messages, state=state)
+                    chunks = []
+                    for chunk in response["content"]:
+                        chunks.append(chunk)
+                        results.put(("chunk", request_id, chunk))
+                    response["content"] = "".join(chunks)
+                else:
+                    response = router.process_message(messages, state=state)
+            except Exception as e:
+                messages.pop()
+                results.put(("error", request_id, f"{type(e).__name__}: {e}"))
+                return
+            messages.append(response)
+        results.put(("done", request_id, response))
+
+    def control(request_id, kind, session_id):
+        if kind == "messages":
+            entry = session(session_id, create=False)
+            if entry is None:
+                payload = None
+            else:
+                with entry[2]:
+                    payload = list(entry[0])
+        elif kind == "delete":
+            with store_lock:
+                payload = store.pop(session_id, None) is not None
+        else:
+            with store_lock:
+                session_count = len(store)
+            payload = {"pid": os.getpid(), "sessions": session_count, "latency": router.latency_report(),
+                       "agents": router.startup_report(), "connections": router.connection_report(),
+                       "guard_prefilter": router.guard_report(), "llm_cache": router.cache_report(),
+                       "knowledge": router.knowledge_report(),
+                       "coalescing": flight.stats() if flight else None}
+        results.put(("done", request_id, payload))
+
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"router-worker-{index}")
+    results.put(("ready", index, os.getpid()))
+    while True:
+        item = requests.get()
+        kind = item[0]
+        if kind == "stop":
+            break
+        if kind == "turn":
+            executor.submit(turn, *item[1:])
+        elif kind == "export":
+            # Only sent once the worker is drained, so no turn is running
+            with store_lock:
+                exported = {session_id: entry[0] for session_id, entry in store.items()}
+            results.put(("done", item[1], exported))
+        else:
+            executor.submit(control, item[1], kind, item[2] if len(item) > 2 else None)
+    executor.shutdown(wait=True)
+
+
+class PendingRequest:
+    """A dispatched request: its future and, for streamed turns, a queue of chunks"""
+    def __init__(self, slot, kind, stream=False):
+        self.slot = slot
+        self.kind = kind
+        self.future = Future()
+        self.chunks = queue.Queue() if stream else None
+
+    def iter_chunks(self, timeout=None):
+        """Yield streamed text chunks until the reply is complete"""
+        while True:
+            chunk = self.chunks.get(timeout=timeout)
+            if chunk is _STREAM_END:
+                return
+            yield chunk
+
+
+class _WorkerSlot:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.requests = None
+        self.pid = None
+        self.started_at = None
+        self.active = 0
+        self.handled = 0
+        self.handled_since_start = 0
+        self.errors = 0
+        self.recycles = 0
+        self.crashes = 0
+        self.draining = False
+        self.backlog = []
+
+
+class WorkerPool:
+    """
+    Supervisor for N RouterAgent worker processes with session affinity.
+
+    Each session is always dispatched to the same worker (crc32 of its id
+    modulo the pool size), so its transcript and ConversationState stay in
+    that process. Local CPU work (regexes, keyword and document matching,
+    JSON repair) then runs in parallel across processes instead of
+    contending for one GIL.
+
+    Workers are recycled after max_requests turns: new requests for the
+    worker are held back, in-flight turns finish, the worker's sessions are
+    exported to its replacement and the old process exits. shutdown()
+    drains the same way.
+
+    Args:
+        workers: Number of worker processes (ROUTER_WORKERS, default CPU count)
+        max_requests: Turns before a worker is recycled (WORKER_MAX_REQUESTS, 0 = never)
+        threads: Concurrent turns per worker (WORKER_THREADS)
+        start_timeout: Seconds to wait for a worker to start
+        check_interval: Seconds between liveness checks of the workers (WORKER_CHECK_INTERVAL)
+    """
+    def __init__(self, workers=None, max_requests=None, threads=None, start_timeout=120, check_interval=None):
+        self.size = int(workers or os.getenv("ROUTER_WORKERS") or os.cpu_count() or 1)
+        self.max_requests = int(max_requests if max_requests is not None else os.getenv("WORKER_MAX_REQUESTS", 0))
+        self.threads = int(threads or os.getenv("WORKER_THREADS", 16))
+        self.start_timeout = start_timeout
+        self.check_interval = float(check_interval or os.getenv("WORKER_CHECK_INTERVAL", 1))
+
+        # spawn: the parent runs threads, which fork would copy in a broken state
+        self._context = multiprocessing.get_context("spawn")
+        self._results = self._context.Queue()
+        self._pending = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._ready = {}
+        self._closed = False
+        self._check_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._recyclers = []
+
+        self._slots = [_WorkerSlot(index) for index in range(self.size)]
+        self._listener = threading.Thread(target=self._listen, name="worker-pool-results", daemon=True)
+        self._listener.start()
+        for slot in self._slots:
+            self._start(slot)
+        # Finds crashed workers without waiting for someone to ask for stats
+        self._supervisor = threading.Thread(target=self._supervise, name="worker-pool-supervisor", daemon=True)
+        self._supervisor.start()
+
+    def _start(self, slot, sessions=None):
+        ready = threading.Event()
+        with self._lock:
+            self._ready[slot.index] = ready
+        slot.requests = self._context.Queue()
+        slot.process = self._context.Process(
+            target=_worker_main,
+            args=(slot.index, slot.requests, self._results, sessions, self.threads),
+            name=f"router-worker-{slot.index}",
+            daemon=True
+        )
+        slot.process.start()
+        if not ready.wait(self.start_timeout):
+            slot.process.terminate()
+            raise RuntimeError(f"Router worker {slot.index} did not start within {self.start_timeout}s")
+        slot.started_at = time.time()
+        slot.handled_since_start = 0
+
+    def slot_for(self, session_id):
+        return zlib.crc32(session_id.encode("utf-8")) % self.size
+
+    def submit(self, session_id, content, stream=False):
+        """
+        Dispatch a user message to the session's worker.
+
+        Returns:
+            PendingRequest: .future resolves to the reply dict; for streamed
+            turns, .iter_chunks() yields the text as it is produced
+        """
+        return self._dispatch(self._slots[self.slot_for(session_id)], "turn", (session_id, content, stream), stream)
+
+    def get_messages(self, session_id):
+        """Future resolving to the session's transcript, or None if unknown"""
+        return self._dispatch(self._slots[self.slot_for(session_id)], "messages", (session_id,)).future
+
+    def delete_session(self, session_id):
+        """Future resolving to True if the session existed"""
+        return self._dispatch(self._slots[self.slot_for(session_id)], "delete", (session_id,)).future
+
+    def _dispatch(self, slot, kind, args, stream=False):
+        request_id = next(self._ids)
+        pending = PendingRequest(slot, kind, stream)
+        item = (kind, request_id) + tuple(args)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Worker pool is shut down")
+            self._pending[request_id] = pending
+            # A dead worker's queue is never read; hold the request for its replacement
+            if slot.draining or not slot.process.is_alive():
+                slot.backlog.append(item)
+            else:
+                slot.active += 1
+                slot.requests.put(item)
+        return pending
+
+    def _listen(self):
+        while True:
+            kind, request_id, payload = self._results.get()
+            if kind == "shutdown":
+                return
+            if kind == "ready":
+                with self._lock:
+                    self._slots[request_id].pid = payload
+                    ready = self._ready.pop(request_id, None)
+                if ready is not None:
+                    ready.set()
+                continue
+
+            with self._lock:
+                pending = self._pending.get(request_id)
+            if pending is None:
+                continue
+            if kind == "chunk":
+                pending.chunks.put(payload)
+                continue
+
+            self._finish(request_id, pending, error=payload if kind == "error" else None, result=payload)
+
+    def _finish(self, request_id, pending, error=None, result=None):
+        slot = pending.slot
+        recycle = False
+        with self._lock:
+            if self._pending.pop(request_id, None) is None:
+                return
+            if pending.kind != "export":
+                slot.active -= 1
+            if pending.kind == "turn":
+                slot.handled += 1
+                slot.handled_since_start += 1
+                slot.errors += error is not None
+                recycle = (self.max_requests and slot.handled_since_start >= self.max_requests
+                           and not slot.draining and not self._closed)
+                if recycle:
+                    slot.draining = True
+            self._drained.notify_all()
+
+        # A caller that gave up may have cancelled the future
+        if not pending.future.done():
+            if error is not None:
+                pending.future.set_exception(RuntimeError(error))
+            else:
+                pending.future.set_result(result)
+        if pending.chunks is not None:
+            pending.chunks.put(_STREAM_END)
+        if recycle:
+            # The listener must keep running while the worker drains
+            recycler = threading.Thread(target=self._recycle, args=(slot,), name=f"recycle-worker-{slot.index}", daemon=True)
+            self._recyclers = [thread for thread in self._recyclers if thread.is_alive()] + [recycler]
+            recycler.start()
+
+    def _wait_idle(self, slot, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while slot.active:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._drained.wait(remaining)
+        return True
+
+    def _recycle(self, slot):
+        """Replace a drained worker with a fresh process that takes over its sessions"""
+        try:
+            while not self._wait_idle(slot, self.check_interval):
+                if not slot.process.is_alive():
+                    raise RuntimeError(f"exited with code {slot.process.exitcode} while draining")
+            request_id = next(self._ids)
+            pending = PendingRequest(slot, "export")
+            with self._lock:
+                self._pending[request_id] = pending
+            slot.requests.put(("export", request_id))
+            sessions = pending.future.result(timeout=self.start_timeout)
+
+            slot.requests.put(("stop",))
+            slot.process.join(timeout=30)
+            if slot.process.is_alive():
+                slot.process.terminate()
+            slot.requests.close()
+            if self._closed:
+                self._fail_backlog(slot, "Worker pool is shut down")
+                return
+            print(f"Recycling router worker {slot.index} after {slot.handled_since_start} requests ({len(sessions)} sessions)")
+
+            self._start(slot, sessions)
+        except Exception as e:
+            # The supervisor restarts the worker once it is no longer draining
+            print(f"Failed to recycle router worker {slot.index}: {e}")
+            self._fail_backlog(slot, f"Router worker could not be recycled: {e}")
+            return
+
+        with self._lock:
+            slot.recycles += 1
+            slot.draining = False
+            backlog, slot.backlog = slot.backlog, []
+            for item in backlog:
+                slot.active += 1
+                slot.requests.put(item)
+
+    def _fail_backlog(self, slot, error):
+        """Fail the requests held back for slot and stop holding new ones"""
+        with self._lock:
+            slot.draining = False
+            backlog, slot.backlog = slot.backlog, []
+            failed = [self._pending.pop(item[1], None) for item in backlog]
+            self._drained.notify_all()
+        self._fail(failed, error)
+
+    def _fail(self, failed, error):
+        for pending in failed:
+            if pending is None:
+                continue
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError(error))
+            if pending.chunks is not None:
+                pending.chunks.put(_STREAM_END)
+
+    def _supervise(self):
+        while not self._stopping.wait(self.check_interval):
+            try:
+                self.check_workers()
+            except Exception as e:
+                print(f"Worker check failed: {e}")
+
+    def check_workers(self):
+        """Restart workers that died unexpectedly; their in-flight requests fail"""
+        # One checker at a time; a restart can take a while, and callers such as stats() should not wait for it
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            for slot in self._slots:
+                if slot.draining or self._closed or slot.process.is_alive():
+                    continue
+                self._restart(slot)
+        finally:
+            self._check_lock.release()
+
+    def _restart(self, slot):
+        """Fail the requests a dead worker had taken, and start a replacement that gets the held ones"""
+        with self._lock:
+            # From here new requests are held back until the replacement is up
+            slot.draining = True
+            held = {item[1] for item in slot.backlog}
+            lost = [request_id for request_id, pending in self._pending.items()
+                    if pending.slot is slot and request_id not in held]
+            failed = [self._pending.pop(request_id) for request_id in lost]
+            for pending in failed:
+                if pending.kind == "turn":
+                    slot.handled += 1
+                    slot.errors += 1
+            slot.active = 0
+            slot.crashes += 1
+            self._drained.notify_all()
+        self._fail(failed, "Router worker exited")
+        print(f"Router worker {slot.index} exited with code {slot.process.exitcode}; restarting")
+
+        try:
+            slot.requests.close()
+            self._start(slot)
+        except Exception as e:
+            # Tried again on the next check
+            print(f"Failed to restart router worker {slot.index}: {e}")
+            self._fail_backlog(slot, f"Router worker could not be restarted: {e}")
+            return
+        with self._lock:
+            slot.draining = False
+            backlog, slot.backlog = slot.backlog, []
+            for item in backlog:
+                slot.active += 1
+                slot.requests.put(item)
+
+    def stats(self):
+        """Per-worker health and counters"""
+        self.check_workers()
+        with self._lock:
+            return [{
+                "worker": slot.index,
+                "pid": slot.pid,
+                "alive": slot.process.is_alive(),
+                "draining": slot.draining,
+                "active": slot.active,
+                "backlog": len(slot.backlog),
+                "handled": slot.handled,
+                "errors": slot.errors,
+                "recycles": slot.recycles,
+                "crashes": slot.crashes,
+                "uptime_seconds": round(time.time() - slot.started_at, 1) if slot.started_at else None,
+            } for slot in self._slots]
+
+    def worker_stats(self, timeout=10):
+        """Ask each worker for its session count and per-stage latencies"""
+        futures = [self._dispatch(slot, "stats", ()).future for slot in self._slots]
+        return [future.result(timeout=timeout) for future in futures]
+
+    def shutdown(self, drain=True, timeout=30):
+        """Stop accepting requests, let in-flight turns finish (when drain is set) and stop the workers"""
+        with self._lock:
+            self._closed = True
+        self._stopping.set()
+        self._supervisor.join(timeout=5)
+        if drain:
+            for slot in self._slots:
+                self._wait_idle(slot, timeout)
+        # A recycle in progress sees the pool closed and stops before starting a new worker
+        for recycler in list(self._recyclers):
+            recycler.join(timeout=self.start_timeout)
+        for slot in self._slots:
+            if slot.process.is_alive():
+                slot.requests.put(("stop",))
+        for slot in self._slots:
+            slot.process.join(timeout=timeout)
+            if slot.process.is_alive():
+                slot.process.terminate()
+            slot.requests.close()
+        self._results.put(("shutdown", None, None))
+        self._listener.join(timeout=5)
+        self._results.close()
+
+
+def main():
+    """Measure pool throughput for 1..N workers against the fake Bedrock runtime"""
+    import argparse
+    from .agents.fake_bedrock import SAMPLE_CONVERSATIONS
+
+    parser = argparse.ArgumentParser(description="Benchmark WorkerPool scaling")
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--max-requests", type=int, default=0)
+    args = parser.parse_args()
+    os.environ.setdefault("BEDROCK_RUNTIME", "fake")
+    os.environ.setdefault("FAKE_BEDROCK_LATENCY_MS", "0")
+
+    for workers in args.workers:
+        pool = WorkerPool(workers=workers, max_requests=args.max_requests)
+        started = time.perf_counter()
+        in_flight = []
+        for turn in range(max(len(c) for c in SAMPLE_CONVERSATIONS)):
+            for session in range(args.sessions):
+                conversation = SAMPLE_CONVERSATIONS[session % len(SAMPLE_CONVERSATIONS)]
+                if turn < len(conversation):
+                    in_flight.append(pool.submit(f"session-{session}", conversation[turn]).future)
+            for future in in_flight:
+                future.result()
+            in_flight.clear()
+        elapsed = time.perf_counter() - started
+        turns = sum(worker["handled"] for worker in pool.stats())
+        print(f"workers={workers}: {turns} turns in {elapsed:.2f}s ({turns / elapsed:.1f} turns/s), "
+              f"recycles={sum(worker['recycles'] for worker in pool.stats())}")
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
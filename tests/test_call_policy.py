@@ -0,0 +1,80 @@
+import io
+import json
+import threading
+import time
+import pytest
+from python_code.api.agents.call_policy import CallPolicy, DeadlineExceeded, ModelCallError
+from python_code.api.agents.fake_bedrock import FakeClientError
+from python_code.api.agents.utils import get_chatbot_response
+
+
+class ScriptedClient:
+    """bedrock-runtime stand-in: each call takes the next (delay, error code or None) step"""
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, body, modelId, accept=None, contentType=None):
+        with self._lock:
+            step = self.calls
+            self.calls += 1
+        delay, code = self.steps[min(step, len(self.steps) - 1)]
+        time.sleep(delay)
+        if code is not None:
+            raise FakeClientError(code)
+        return {"body": io.BytesIO(json.dumps({"outputs": [{"text": f"answer {step}"}]}).encode("utf-8"))}
+
+
+def ask(client, policy):
+    return get_chatbot_response(client, "model", [{"role": "user", "content": f"q {id(client)}"}],
+                                temperature=0.1, policy=policy)
+
+
+def test_throttling_is_retried():
+    client = ScriptedClient((0, "ThrottlingException"), (0, "ThrottlingException"), (0, None))
+    policy = CallPolicy(max_attempts=3, base_delay=0.001)
+
+    assert ask(client, policy) == "answer 2"
+    assert client.calls == 3
+    assert policy.stats()["throttled"] == 2 and policy.stats()["retries"] == 2
+
+
+def test_fatal_errors_are_not_retried():
+    client = ScriptedClient((0, "ValidationException"))
+    policy = CallPolicy(max_attempts=3, base_delay=0.001)
+
+    with pytest.raises(ModelCallError):
+        ask(client, policy)
+    assert client.calls == 1
+    assert policy.stats()["fatal"] == 1
+
+
+def test_deadline_exceeded():
+    client = ScriptedClient((0.5, None))
+    policy = CallPolicy(deadline=0.05, max_attempts=3)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        ask(client, policy)
+    assert time.monotonic() - started < 0.3
+    assert policy.stats()["deadline_exceeded"] == 1
+    assert policy.stats()["abandoned"] == 1
+
+
+def test_hedge_wins_over_a_slow_attempt():
+    client = ScriptedClient((0.5, None), (0, None))
+    policy = CallPolicy(deadline=2.0, hedge=True, hedge_delay=0.05)
+
+    assert ask(client, policy) == "answer 1"
+    assert client.calls == 2
+    assert policy.stats()["hedges_fired"] == 1 and policy.stats()["hedge_wins"] == 1
+
+
+def test_no_hedge_after_throttling():
+    client = ScriptedClient((0, "ThrottlingException"), (0.2, None), (0, None))
+    policy = CallPolicy(deadline=2.0, max_attempts=2, base_delay=0.001, hedge=True, hedge_delay=0.05)
+
+    assert ask(client, policy) == "answer 1"
+    assert client.calls == 2
+    assert policy.stats()["hedges_fired"] == 0
@@ -0,0 +1,49 @@
+import os
+import zlib
+import numpy as np
+from python_code.api.agents.embedding_store import EmbeddingStore
+
+
+class CountingEmbedder:
+    name = "counting"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return np.vstack([self.embed_query(text) for text in texts])
+
+    def embed_query(self, text):
+        vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).random(8).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+def test_append_twice_then_reopen(tmp_path):
+    embedder = CountingEmbedder()
+    store = EmbeddingStore(embedder, directory=str(tmp_path))
+    first = store.embed(["peace lily", "snake plant"])
+    mapped = store._vectors
+    second = store.embed(["snake plant", "jade plant"])
+
+    # The first vector file is still mapped, and was not replaced underneath it
+    assert np.array_equal(np.asarray(mapped), first)
+    assert embedder.embedded == ["peace lily", "snake plant", "jade plant"]
+
+    reopened_embedder = CountingEmbedder()
+    reopened = EmbeddingStore(reopened_embedder, directory=str(tmp_path))
+    vectors = reopened.embed(["peace lily", "snake plant", "jade plant"])
+
+    assert reopened_embedder.embedded == []
+    assert reopened.stats()["rows"] == 3
+    assert np.array_equal(vectors, np.vstack([first, second[1:]]))
+
+
+def test_old_vector_files_are_removed(tmp_path):
+    store = EmbeddingStore(CountingEmbedder(), directory=str(tmp_path))
+    for text in ("rose", "tulsi", "aloe vera", "marigold"):
+        store.embed([text])
+
+    vector_files = sorted(name for name in os.listdir(tmp_path) if name.endswith(".npy"))
+    assert vector_files == ["counting.3.npy", "counting.4.npy"]
+    assert store.vectors_path == os.path.join(str(tmp_path), "counting.4.npy")
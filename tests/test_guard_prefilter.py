@@ -0,0 +1,77 @@
+import json
+import pytest
+from python_code.api.agents import guard_prefilter
+from python_code.api.agents.fake_bedrock import FakeBedrockRuntime
+from python_code.api.agents.router import RouterAgent
+from python_code.api.agents.guard_prefilter import (
+    ALLOWED_TOPICS, BLOCKED_TOPICS, GuardPrefilter, calibrate, get_guard_prefilter
+)
+
+
+def labelled(topics, decision, suffixes=("", " now", " today")):
+    return [{"message": phrase + suffix, "decision": decision}
+            for phrases in topics.values() for phrase in phrases for suffix in suffixes]
+
+
+@pytest.fixture(autouse=True)
+def fresh_prefilter(monkeypatch):
+    monkeypatch.setattr(guard_prefilter, "_prefilter", None)
+
+
+def test_thresholds_decide_clear_messages_and_pass_the_rest():
+    prefilter = GuardPrefilter()
+
+    assert prefilter.check("add 2 peace lily to my cart")[0] == "allowed"
+    assert prefilter.check("who will win the election")[0] == "not allowed"
+    assert prefilter.check("hello")[0] is None
+
+    strict = GuardPrefilter(allow_threshold=1.01, block_threshold=1.01)
+    assert strict.check("add 2 peace lily to my cart")[0] is None
+    assert strict.stats() == {"checked": 1, "allowed_locally": 0, "blocked_locally": 0,
+                              "passed_to_llm": 1, "guard_calls_saved": 0}
+
+
+def test_calibration_reports_error_rates_and_picks_a_setting_within_bounds():
+    records = labelled(ALLOWED_TOPICS, "allowed") + labelled(BLOCKED_TOPICS, "not allowed")
+    report = calibrate(records, max_false_block=0.0, max_false_allow=0.0, min_examples=20)
+
+    chosen = report["calibration"]
+    assert chosen["false_block_rate"] == 0.0 and chosen["false_allow_rate"] == 0.0
+    assert chosen["coverage"] == max(setting["coverage"] for setting in report["settings"]
+                                     if setting["false_block_rate"] == setting["false_allow_rate"] == 0.0)
+    assert all({"false_block_rate", "false_allow_rate", "coverage"} <= set(s) for s in report["settings"])
+
+
+def test_calibration_needs_enough_examples_of_each_decision():
+    with pytest.raises(ValueError):
+        calibrate(labelled(ALLOWED_TOPICS, "allowed"), min_examples=20)
+
+
+def test_prefilter_is_off_by_default_and_needs_a_calibration(monkeypatch, tmp_path):
+    monkeypatch.delenv("GUARD_PREFILTER", raising=False)
+    monkeypatch.delenv("GUARD_PREFILTER_CALIBRATION", raising=False)
+    assert get_guard_prefilter() is None
+
+    monkeypatch.setenv("GUARD_PREFILTER", "true")
+    assert get_guard_prefilter() is None
+
+    calibration = tmp_path / "guard_prefilter.json"
+    calibration.write_text(json.dumps({"allow_threshold": 0.4, "block_threshold": 0.5, "margin": 0.2}))
+    monkeypatch.setenv("GUARD_PREFILTER_CALIBRATION", str(calibration))
+    prefilter = get_guard_prefilter()
+    assert (prefilter.allow_threshold, prefilter.block_threshold, prefilter.margin) == (0.4, 0.5, 0.2)
+
+
+def test_router_reports_the_guard_calls_saved(monkeypatch, tmp_path):
+    calibration = tmp_path / "guard_prefilter.json"
+    calibration.write_text(json.dumps({"allow_threshold": 0.3, "block_threshold": 0.35, "margin": 0.1}))
+    monkeypatch.setenv("GUARD_PREFILTER", "true")
+    monkeypatch.setenv("GUARD_PREFILTER_CALIBRATION", str(calibration))
+    client = FakeBedrockRuntime(latency_ms=0, latency_distribution="fixed")
+    router = RouterAgent(client=client)
+    assert router.guard_report() is None
+
+    router.process_message([{"role": "user", "content": "who will win the election"}])
+
+    assert router.guard_report()["guard_calls_saved"] == 1
+    assert client.stats()["calls"] == 0
@@ -0,0 +1,70 @@
+import json
+from copy import deepcopy
+import pytest
+from python_code.api.agents.history import FrozenMapping, FrozenSequence, MessageView
+
+
+def thaw(value):
+    if isinstance(value, FrozenMapping):
+        return {key: thaw(value[key]) for key in value}
+    if isinstance(value, (FrozenSequence, MessageView, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+MESSAGES = [
+    {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}",
+     **({"memory": {"agent": "order_taking_agent", "cart": [{"item": "Rose", "quantity": i}]}} if i % 2 else {})}
+    for i in range(12)
+]
+
+
+@pytest.mark.parametrize("window", [None, 0, 1, 3, 5, 12, 50])
+def test_window_matches_list_copy(window):
+    expected = deepcopy(MESSAGES) if window is None else deepcopy(MESSAGES)[-window:] if window else []
+    view = MessageView(MESSAGES, window=window)
+
+    assert thaw(view) == expected
+    assert len(view) == len(expected)
+
+
+@pytest.mark.parametrize("window, index", [
+    (5, slice(None)), (5, slice(1, 3)), (5, slice(-2, None)), (5, slice(None, -1)), (5, slice(4, 1)),
+    (5, slice(None, None, 2)), (None, slice(-5, -1)), (3, slice(10, 20)), (None, slice(None, None, -1)),
+])
+def test_slices_match_list_copy(window, index):
+    expected = deepcopy(MESSAGES)[-window:] if window else deepcopy(MESSAGES)
+
+    assert thaw(MessageView(MESSAGES, window=window)[index]) == expected[index]
+
+
+def test_indexing_and_nested_windows():
+    view = MessageView(MESSAGES).window(6)
+
+    assert thaw(view[0]) == MESSAGES[6]
+    assert thaw(view[-1]) == MESSAGES[-1]
+    assert thaw(view.window(2)) == MESSAGES[-2:]
+    assert thaw(MessageView(view, window=4)) == MESSAGES[-4:]
+    with pytest.raises(IndexError):
+        view[6]
+
+
+def test_view_is_read_only_and_copy_free():
+    original = json.dumps(MESSAGES)
+    message = MessageView(MESSAGES)[1]
+
+    with pytest.raises(TypeError):
+        message["content"] = "changed"
+    with pytest.raises(TypeError):
+        message["memory"]["cart"][0]["quantity"] = 99
+    assert json.dumps(MESSAGES) == original
+    assert message["memory"]._data is MESSAGES[1]["memory"]
+
+
+def test_view_is_a_snapshot_of_the_length():
+    messages = list(MESSAGES)
+    view = MessageView(messages)
+    messages.append({"role": "user", "content": "later"})
+
+    assert len(view) == len(MESSAGES)
+    assert thaw(view[-1]) == MESSAGES[-1]
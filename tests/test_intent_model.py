@@ -0,0 +1,75 @@
+import sys
+import json
+import pytest
+from python_code.api.agents import intent_model
+from python_code.api.agents.intent_model import IntentClassifier, load_intent_model
+
+ORDERING = ["add 2 roses to my cart", "order a money plant", "buy a tulsi plant", "checkout my order",
+            "add the jade plant", "i want to buy aloe vera"]
+DETAILS = ["what are your opening hours", "where is the store", "price of the cactus",
+           "how often do I water a peace lily", "what do you sell", "do you deliver to lucknow"]
+
+
+def examples():
+    texts = ORDERING + DETAILS
+    labels = ["order_taking_agent"] * len(ORDERING) + ["details_agent"] * len(DETAILS)
+    return texts, [{} for _ in texts], labels
+
+
+def test_fit_predicts_training_intents():
+    model = IntentClassifier().fit(*examples())
+
+    assert model.predict("add 3 roses to my cart")[0] == "order_taking_agent"
+    assert model.predict("what are the store hours")[0] == "details_agent"
+    assert sum(model.predict_proba("hello").values()) == pytest.approx(1.0)
+
+
+def test_context_features_shift_the_prediction():
+    texts, _, labels = examples()
+    contexts = [{"in_ordering_process": label == "order_taking_agent"} for label in labels]
+    model = IntentClassifier().fit(texts, contexts, labels)
+
+    ordering = model.predict_proba("yes", {"in_ordering_process": True})["order_taking_agent"]
+    idle = model.predict_proba("yes", {"in_ordering_process": False})["order_taking_agent"]
+    assert ordering > idle
+
+
+def test_save_and_load_round_trip(tmp_path):
+    model = IntentClassifier().fit(*examples())
+    path = tmp_path / "intent_model.npz"
+    model.save(path)
+
+    loaded = load_intent_model(str(path))
+    assert loaded.labels == model.labels
+    assert loaded.vocabulary == model.vocabulary
+    for text in ("add 3 roses", "where are you", "hello"):
+        assert loaded.predict_proba(text) == pytest.approx(model.predict_proba(text))
+
+
+def test_load_intent_model_without_a_file_returns_none(tmp_path):
+    assert load_intent_model(str(tmp_path / "missing.npz")) is None
+
+
+def test_fit_refuses_single_label_and_scarce_labels():
+    with pytest.raises(ValueError, match="at least two labels"):
+        IntentClassifier().fit(ORDERING, [{}] * len(ORDERING), ["order_taking_agent"] * len(ORDERING))
+
+    texts = ORDERING + DETAILS[:2]
+    labels = ["order_taking_agent"] * len(ORDERING) + ["details_agent"] * 2
+    with pytest.raises(ValueError, match="at least 5 examples per label"):
+        IntentClassifier().fit(texts, [{}] * len(texts), labels)
+    assert IntentClassifier(min_examples_per_class=2).fit(texts, [{}] * len(texts), labels).labels == sorted(set(labels))
+
+
+def test_train_refuses_an_empty_held_out_split(tmp_path, monkeypatch):
+    log = tmp_path / "routing.jsonl"
+    texts, contexts, labels = examples()
+    log.write_text("".join(json.dumps({"message": t, "context": c, "decision": d}) + "\n"
+                           for t, c, d in zip(texts, contexts, labels)))
+    out = tmp_path / "intent_model.npz"
+    monkeypatch.setattr(sys, "argv", ["intent_model", "train", "--log", str(log), "--out", str(out),
+                                      "--test-split", "0", "--min-examples", "2"])
+
+    with pytest.raises(SystemExit, match="no held-out examples"):
+        intent_model.main()
+    assert not out.exists()
@@ -0,0 +1,52 @@
+import pytest
+from python_code.api.agents.json_extractor import JSONExtractionError, extract_json
+
+SCHEMA = {
+    "decision": {"choices": ("allowed", "not allowed")},
+    "message": {"default": ""},
+}
+
+
+def test_code_fences_and_surrounding_prose():
+    text = 'Sure, here it is:\n```json\n{"decision": "allowed", "message": ""}\n```\nAnything else?'
+    assert extract_json(text) == {"decision": "allowed", "message": ""}
+
+
+def test_single_quotes_and_apostrophes():
+    text = "{'decision': 'allowed', 'message': 'We're open till 8'}"
+    assert extract_json(text) == {"decision": "allowed", "message": "We're open till 8"}
+
+
+def test_trailing_commas_python_literals_and_unquoted_keys():
+    assert extract_json('{"items": [1, 2,], "ok": true,}') == {"items": [1, 2], "ok": True}
+    assert extract_json("{ordering: True, cart: None}") == {"ordering": True, "cart": None}
+
+
+def test_truncated_output_is_closed():
+    assert extract_json('{"decision": "allowed", "details": {"reason": "plant care') == {
+        "decision": "allowed", "details": {"reason": "plant care"}
+    }
+
+
+def test_braces_inside_strings_do_not_split_objects():
+    assert extract_json('{"message": "use {code} at checkout"}') == {"message": "use {code} at checkout"}
+
+
+def test_schema_normalises_choices_and_fills_defaults():
+    assert extract_json('{"decision": " Not Allowed "}', SCHEMA) == {"decision": "not allowed", "message": ""}
+
+
+def test_schema_skips_objects_that_do_not_validate():
+    text = '{"thinking": "step one"} then {"decision": "allowed", "message": "hi"}'
+    assert extract_json(text, SCHEMA) == {"decision": "allowed", "message": "hi"}
+
+
+@pytest.mark.parametrize("text, schema", [
+    ("", None),
+    ("I cannot help with that.", None),
+    ('{"decision": "maybe"}', SCHEMA),
+    ('{"message": "no decision"}', SCHEMA),
+])
+def test_unrecoverable_output_raises(text, schema):
+    with pytest.raises(JSONExtractionError):
+        extract_json(text, schema)
@@ -0,0 +1,57 @@
+import pytest
+from python_code.api.agents.keyword_engine import KeywordEngine, get_keyword_engine
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return KeywordEngine.from_file()
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("I want to order 2 roses", "order_fast_path"),
+    ("please add a snake plant", "order_fast_path"),
+    ("add to cart", "order_redirect"),
+    ("how much is the jade plant", "price"),
+    ("what are your opening hours", "store"),
+    ("place order now", "checkout"),
+    ("what's in my basket", "cart_inquiry"),
+])
+def test_bundled_phrases(engine, text, intent):
+    assert engine.has_intent(text, intent)
+
+
+def test_prefix_keywords_match_word_continuations(engine):
+    assert engine.has_intent("I'm purchasing a cactus", "order_fast_path")
+    assert engine.has_intent("what are the PRICES", "price")
+    assert not engine.has_intent("repurchase", "order_fast_path")
+
+
+def test_phrases_match_any_whitespace_and_punctuation_keywords(engine):
+    assert engine.has_intent("how   much\tfor roses", "price")
+    assert engine.has_intent("is it $$ or $$$", "price")
+
+
+def test_regex_keywords(engine):
+    assert engine.has_intent("what have I added so far", "cart_inquiry")
+    assert engine.has_intent("show me my items", "cart_inquiry")
+    assert not engine.has_intent("show me roses", "cart_inquiry")
+
+
+def test_word_boundaries(engine):
+    assert not engine.has_intent("what is your address", "order_fast_path")
+    assert engine.has_intent("what is your address", "store")
+    assert not engine.has_intent("sometime soon", "store")
+    assert not engine.has_intent("a paying guest", "checkout")
+
+
+def test_overlapping_keywords_report_every_intent():
+    engine = KeywordEngine({"short": ["add"], "long": ["add to cart"], "raw": ["re:\\d+ roses"]})
+
+    assert set(engine.match("add to cart")) == {"short", "long"}
+    assert engine.match("add roses") == {"short": ["add"]}
+    assert engine.match("added") == {}
+    assert engine.match("buy 12 roses") == {"raw": ["12 roses"]}
+
+
+def test_shared_engine_is_built_once():
+    assert get_keyword_engine() is get_keyword_engine()
@@ -0,0 +1,23 @@
+from python_code.api.agents.knowledge_index import LocalEmbedder
+from python_code.api.agents.knowledge_store import KnowledgeStore
+
+
+def test_failed_document_is_retried_on_the_next_check(tmp_path):
+    path = tmp_path / "store_info.txt"
+    path.write_text("Plantify opens at 9 am.", encoding="utf-8")
+    store = KnowledgeStore({"store_info": str(path)}, embedder=LocalEmbedder(), poll_interval=0)
+
+    path.write_text("", encoding="utf-8")
+    assert store.check(wait=True)
+    assert store.reload_errors == 1
+    assert store.snapshot.documents["store_info"]["content"] == "Plantify opens at 9 am."
+
+    # Not marked as loaded, so it is read again until it loads
+    assert store.check(wait=True)
+    assert store.reload_errors == 2
+
+    path.write_text("Plantify opens at 10 am on Sundays.", encoding="utf-8")
+    assert store.check(wait=True)
+    assert store.snapshot.version == 2
+    assert store.snapshot.documents["store_info"]["content"] == "Plantify opens at 10 am on Sundays."
+    assert not store.check(wait=True)
@@ -0,0 +1,54 @@
+import time
+from python_code.api.agents.llm_cache import LLMResponseCache, get_agent_cache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LLMResponseCache(max_entries=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    cache = LLMResponseCache(ttl=0.05)
+    cache.set("a", "A")
+    assert cache.get("a") == "A"
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+
+def test_key_is_stable_and_covers_every_parameter():
+    key = LLMResponseCache.make_key("model", "prompt", 0.1, 100)
+
+    assert key == LLMResponseCache.make_key("model", "prompt", 0.1, 100)
+    assert len({key,
+                LLMResponseCache.make_key("other", "prompt", 0.1, 100),
+                LLMResponseCache.make_key("model", "prompt!", 0.1, 100),
+                LLMResponseCache.make_key("model", "prompt", 0.2, 100),
+                LLMResponseCache.make_key("model", "prompt", 0.1, 200)}) == 5
+
+
+def test_disk_writes_are_batched_and_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = LLMResponseCache(disk_path=path, flush_interval=60)
+    for i in range(10):
+        cache.set(f"k{i}", f"v{i}")
+    assert cache.stats()["disk_pending_writes"] == 10
+    cache.flush()
+    assert cache.stats()["disk_commits"] == 1
+
+    reopened = LLMResponseCache(disk_path=path)
+    assert reopened.get("k3") == "v3"
+    assert reopened.stats()["disk_hits"] == 1
+
+
+def test_no_agent_is_cached_by_default(monkeypatch):
+    monkeypatch.delenv("LLM_CACHE_AGENTS", raising=False)
+    assert get_agent_cache("guard_agent") is None
+    monkeypatch.setenv("LLM_CACHE_AGENTS", "guard_agent")
+    assert get_agent_cache("guard_agent") is not None
@@ -0,0 +1,43 @@
+import asyncio
+from python_code.api.agents.fake_bedrock import FakeBedrockRuntime
+from python_code.api.agents.order_taking_agent import OrderTakingAgent
+from python_code.api.agents.utils import stream_answer
+
+
+def make_agent():
+    return OrderTakingAgent(client=FakeBedrockRuntime(latency_ms=0, latency_distribution="fixed", stream_chunk_delay_ms=0))
+
+
+def test_buffered_async_and_streamed_replies_agree():
+    agent = make_agent()
+    messages = [{"role": "user", "content": "Can you help me decide?"}]
+
+    buffered = agent.get_response(messages)
+    awaited = asyncio.run(agent.get_response_async(messages))
+    streamed = agent.stream_response(messages)
+    streamed["content"] = "".join(streamed["content"])
+
+    assert buffered["memory"]["action"] == "general_response"
+    assert buffered == awaited == streamed
+
+
+def test_closing_a_stream_closes_the_model_stream():
+    closed = []
+
+    def model_stream():
+        try:
+            yield " Hello"
+            yield " there"
+        finally:
+            closed.append(True)
+
+    answer = stream_answer(model_stream(), "empty")
+    assert next(answer) == "Hello"
+    answer.close()
+    assert closed == [True]
+
+
+def test_empty_stream_yields_the_fallback():
+    completed = []
+    assert list(stream_answer(iter([" ", ""]), "empty", completed.append)) == ["empty"]
+    assert completed == []
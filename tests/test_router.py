@@ -0,0 +1,83 @@
+import json
+import time
+import pytest
+from python_code.api.agents.fake_bedrock import FakeBedrockRuntime, CLASSIFIER_MARKER, GUARD_MARKER, rule_based_completion
+from python_code.api.agents.router import RouterAgent
+
+
+class CareAgent:
+    def __init__(self, client=None, call_limiter=None):
+        pass
+
+    def get_response(self, messages, state=None):
+        return {"role": "assistant", "content": "Water less often.", "memory": {"agent": "care_agent"}}
+
+
+def care_responder(prompt):
+    # Chooses care_agent only when the classifier is offered it
+    if CLASSIFIER_MARKER in prompt and "**care_agent**" in prompt and "yellow" in prompt:
+        return json.dumps({"chain_of_thought": "Plant care", "decision": "care_agent", "message": ""})
+    return rule_based_completion(prompt)
+
+
+@pytest.fixture
+def client():
+    return FakeBedrockRuntime(latency_ms=0, latency_distribution="fixed", responder=care_responder)
+
+
+def test_registered_agent_is_offered_to_the_classifier_and_routed_to(client):
+    router = RouterAgent(client=client, factories={"care_agent": CareAgent},
+                         descriptions={"care_agent": "Plant care: watering, light and pests"})
+
+    response = router.process_message([{"role": "user", "content": "My fern leaves are turning yellow"}])
+
+    assert response["memory"]["agent"] == "care_agent"
+    assert router.classification_agent.output_schema["decision"]["choices"] == [
+        "details_agent", "order_taking_agent", "care_agent"]
+
+
+def test_agent_registered_later_is_offered_too(client):
+    router = RouterAgent(client=client)
+    router.agents.register("care_agent", CareAgent, description="Plant care")
+
+    response = router.process_message([{"role": "user", "content": "My fern leaves are turning yellow"}])
+
+    assert response["memory"]["agent"] == "care_agent"
+
+
+def slow_guard_responder(prompt):
+    # The guard answers last, so speculative work has finished when it rejects
+    if GUARD_MARKER in prompt:
+        time.sleep(0.2)
+    return rule_based_completion(prompt)
+
+
+def test_guard_rejection_discards_the_speculative_answer():
+    client = FakeBedrockRuntime(latency_ms=0, latency_distribution="fixed", responder=slow_guard_responder)
+    router = RouterAgent(client=client, speculative=True)
+
+    response = router.process_message([{"role": "user", "content": "Who will win the election?"}])
+
+    assert response["memory"]["agent"] == "guard_agent"
+    assert response["memory"]["guard_decision"] == "not allowed"
+    assert response["content"].startswith("Sorry, I can't help you with that")
+    assert client.stats()["calls"] == 3  # guard, classifier and the discarded details answer
+    report = router.speculation_report()
+    assert report["launched"] == 2 and report["wasted"] == 2 and report["used"] == 0
+    assert report["cancelled"] == 0 and report["waste_ratio"] == 1.0
+
+
+def test_speculation_counts_used_and_wasted_runs():
+    router = RouterAgent(client=FakeBedrockRuntime(latency_ms=0, latency_distribution="fixed"), speculative=True)
+
+    # Classifier picks the details agent: both runs are used
+    assert router.process_message([{"role": "user", "content": "What are your opening hours?"}])["memory"]["agent"] == "details_agent"
+    # Classifier picks the order agent: the prefetched details answer is wasted
+    assert router.process_message([{"role": "user", "content": "I want roses"}])["memory"]["agent"] == "order_taking_agent"
+    # Order fast path: nothing is launched
+    router.process_message([{"role": "user", "content": "add 2 roses"}])
+
+    report = router.speculation_report()
+    assert {key: report[key] for key in ("turns", "launched", "used", "wasted")} == {
+        "turns": 3, "launched": 4, "used": 3, "wasted": 1}
+    assert report["waste_ratio"] == 0.25
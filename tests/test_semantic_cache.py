@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from python_code.api.agents.details_agent import DetailsAgent
+from python_code.api.agents.knowledge_index import LocalEmbedder
+from python_code.api.agents.semantic_cache import SemanticCache, get_semantic_cache, normalise_question
+
+
+class ConstantEmbedder:
+    """Every question embeds to the same vector, so only the key decides a hit"""
+    def embed_query(self, text):
+        return np.ones(4, dtype=np.float32) / 2
+
+
+class TopicEmbedder:
+    """Embeds a question by the topic its words belong to, like a semantic model would"""
+    name = "topic-stub"
+    TOPICS = [{"open", "time", "timing", "hour", "store"}, {"deliv", "delivery", "ship", "sunday"}]
+
+    def embed_query(self, text):
+        words = set(text.split())
+        vector = np.array([len(words & topic) for topic in self.TOPICS] + [0.2], dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+def answer(content):
+    return {"role": "assistant", "content": content, "memory": {"knowledge_version": 1}}
+
+
+def test_negation_is_kept_in_the_key():
+    assert normalise_question("Don't you deliver on Sunday?") == normalise_question("do you not deliver on sunday")
+    assert normalise_question("Do you deliver on Sunday?") != normalise_question("Don't you deliver on Sunday?")
+
+
+def test_negated_question_does_not_reuse_an_affirmative_answer():
+    cache = SemanticCache(ConstantEmbedder(), threshold=0.9)
+    cache.store("Do you deliver on Sunday?", answer("Yes"), 1, 100.0)
+
+    assert cache.lookup("Don't you deliver on Sunday?", 1)[0] is None
+    assert cache.lookup("Sunday deliveries?", 1)[0]["content"] == "Yes"
+
+
+def stream_agent():
+    agent = DetailsAgent.__new__(DetailsAgent)
+    agent.semantic_cache = SemanticCache(ConstantEmbedder())
+    return agent
+
+
+def test_only_completed_streams_are_cached():
+    memory = {"sources": [], "knowledge_version": 1}
+
+    def failing():
+        yield "We open "
+        raise ConnectionError("stream dropped")
+
+    agent = stream_agent()
+    with pytest.raises(ConnectionError):
+        list(agent._stream_answer(failing(), "when do you open", memory, 0.0))
+    closed = agent._stream_answer(iter(["We open ", "at 9"]), "when do you open", memory, 0.0)
+    next(closed)
+    closed.close()
+    assert agent.semantic_cache.stats()["stores"] == 0
+
+    list(agent._stream_answer(iter(["We open ", "at 9"]), "when do you open", memory, 0.0))
+    assert agent.semantic_cache.lookup("when do you open", 1)[0]["content"] == "We open at 9"
+
+
+def test_paraphrases_hit_above_the_threshold():
+    cache = SemanticCache(TopicEmbedder(), threshold=0.9)
+    cache.store("when do you open", answer("9 am"), 1, 100.0)
+
+    assert cache.lookup("opening time?", 1)[0]["content"] == "9 am"
+    assert cache.lookup("store timings", 1)[0]["content"] == "9 am"
+    missed, similarity = cache.lookup("do you ship on sunday", 1)
+    assert missed is None and similarity < 0.9
+
+
+def test_threshold_decides_a_hit():
+    strict = SemanticCache(TopicEmbedder(), threshold=0.999)
+    strict.store("when do you open", answer("9 am"), 1, 100.0)
+
+    assert strict.lookup("opening time?", 1)[0] is None
+    assert strict.lookup("when do you open", 1)[0]["content"] == "9 am"
+
+
+def test_new_knowledge_version_drops_the_cache():
+    cache = SemanticCache(TopicEmbedder())
+    cache.store("when do you open", answer("9 am"), 1, 100.0)
+
+    assert cache.lookup("when do you open", 2)[0] is None
+    assert cache.stats()["invalidations"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_cache_stays_off_without_a_semantic_embedder(monkeypatch):
+    monkeypatch.setenv("SEMANTIC_CACHE", "true")
+    assert get_semantic_cache(LocalEmbedder()) is None
+    assert get_semantic_cache(TopicEmbedder()) is not None
@@ -0,0 +1,117 @@
+import json
+import asyncio
+import pytest
+from python_code.api.server import ChatService, SessionStore
+from python_code.api.agents.fake_bedrock import FakeBedrockRuntime
+from python_code.api.agents.router import RouterAgent
+
+
+def request(app, method, path, body=b"", chunks=None, headers=None):
+    """Drive the ASGI app in-process; returns (status, headers, body bytes)"""
+    chunks = list(chunks) if chunks is not None else [body]
+    if headers is None:
+        headers = [(b"content-length", str(sum(map(len, chunks))).encode())]
+    scope = {"type": "http", "method": method, "path": path, "headers": headers}
+    sent = []
+
+    async def run():
+        pending = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                   for i, chunk in enumerate(chunks)]
+
+        async def receive():
+            if pending:
+                return pending.pop(0)
+            await asyncio.Event().wait()  # The client stays connected
+
+        async def send(message):
+            sent.append(message)
+
+        await app(scope, receive, send)
+
+    asyncio.run(run())
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def sse_events(body):
+    events = []
+    for block in body.decode().strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+@pytest.fixture
+def app():
+    router = RouterAgent(client=FakeBedrockRuntime(latency_ms=0, latency_distribution="fixed"))
+    return ChatService(router=router, store=SessionStore(), workers=0, max_body_bytes=1024)
+
+
+def post(app, path, payload):
+    return request(app, "POST", path, json.dumps(payload).encode())
+
+
+def test_post_message_replies_and_keeps_the_transcript(app):
+    status, _, body = post(app, "/sessions/s1/messages", {"content": "What are your opening hours?"})
+
+    reply = json.loads(body)
+    assert status == 200
+    assert reply["reply"]["memory"]["agent"] == "details_agent"
+    assert reply["message_count"] == 2
+
+    status, _, body = request(app, "GET", "/sessions/s1")
+    assert status == 200
+    assert [m["role"] for m in json.loads(body)["messages"]] == ["user", "assistant"]
+
+
+def test_stream_sends_chunks_then_done(app):
+    status, headers, body = post(app, "/sessions/s2/messages/stream", {"content": "What do you sell?"})
+
+    events = sse_events(body)
+    assert status == 200
+    assert headers[b"content-type"] == b"text/event-stream"
+    assert len(events) > 1
+    assert all(name == "chunk" for name, _ in events[:-1])
+    assert events[-1][0] == "done"
+    assert events[-1][1]["memory"]["agent"] == "details_agent"
+
+    stored = app.store.get("s2").messages[-1]["content"]
+    assert stored == "".join(payload["text"] for _, payload in events[:-1])
+
+
+def test_stats_reports_every_section(app):
+    post(app, "/sessions/s3/messages", {"content": "What are your opening hours?"})
+
+    status, _, body = request(app, "GET", "/stats")
+
+    stats = json.loads(body)
+    assert status == 200
+    assert stats["sessions"] == 1
+    for key in ("latency", "speculation", "agents", "connections", "guard_prefilter", "llm_cache", "knowledge"):
+        assert key in stats
+
+
+@pytest.mark.parametrize("body", [b"{not json", b'{"content": ""}', b"[1, 2]"])
+def test_bad_body_is_a_400(app, body):
+    status, _, response = request(app, "POST", "/sessions/s4/messages", body)
+
+    assert status == 400
+    assert "error" in json.loads(response)
+    assert app.store.get("s4") is None
+
+
+def test_oversized_body_is_a_413(app):
+    payload = json.dumps({"content": "x" * 2048}).encode()
+
+    # Declared in Content-Length
+    assert request(app, "POST", "/sessions/s5/messages", payload)[0] == 413
+    # Streamed without Content-Length
+    chunks = [payload[i:i + 256] for i in range(0, len(payload), 256)]
+    assert request(app, "POST", "/sessions/s5/messages/stream", chunks=chunks, headers=[])[0] == 413
+    assert app.store.get("s5") is None
+
+
+def test_unknown_routes(app):
+    assert request(app, "GET", "/nowhere")[0] == 404
+    assert request(app, "GET", "/sessions/s6/messages")[0] == 405
+    assert request(app, "GET", "/sessions/unknown")[0] == 404
@@ -0,0 +1,84 @@
+import pytest
+from python_code.api.agents.fake_bedrock import FakeBedrockRuntime
+from python_code.api.agents.router import RouterAgent
+from python_code.api.agents.session_state import ConversationState
+
+
+def user(content):
+    return {"role": "user", "content": content}
+
+
+def assistant(agent, **memory):
+    return {"role": "assistant", "content": "ok", "memory": {"agent": agent, **memory}}
+
+
+TRANSCRIPT = [
+    user("hi"),
+    assistant("details_agent"),
+    user("add 2 roses"),
+    assistant("order_taking_agent", cart=[{"item": "Rose", "quantity": 2}], discount_codes=[]),
+    user("and a code"),
+    assistant("order_taking_agent", discount_codes=["WELCOME10"]),
+    user("what are your hours"),
+    assistant("details_agent"),
+    user("remove the roses"),
+    assistant("order_taking_agent", cart=[]),
+]
+
+
+def snapshot(state):
+    return state.cart, state.discount_codes, state.context()
+
+
+def test_incremental_sync_matches_full_replay_at_every_turn():
+    state = ConversationState()
+    for length in range(len(TRANSCRIPT) + 1):
+        state.sync(TRANSCRIPT[:length])
+        assert snapshot(state) == snapshot(ConversationState.from_messages(TRANSCRIPT[:length]))
+
+
+def test_recorded_reply_is_not_folded_twice():
+    state = ConversationState.from_messages(TRANSCRIPT[:2])
+    reply = assistant("order_taking_agent", cart=[{"item": "Rose", "quantity": 2}])
+    state.record_response(reply, 3)
+
+    state.sync(TRANSCRIPT[:2] + [user("add 2 roses"), reply, user("thanks")])
+
+    assert state.messages_seen == 5
+    assert snapshot(state) == snapshot(ConversationState.from_messages(TRANSCRIPT[:2] + [user("x"), reply]))
+
+
+@pytest.mark.parametrize("transcript", [
+    TRANSCRIPT[:3] + [assistant("details_agent")],  # a different reply was appended
+    TRANSCRIPT[:3],                                  # the reply was never appended
+])
+def test_reply_missing_from_transcript_rebuilds(transcript):
+    state = ConversationState.from_messages(TRANSCRIPT[:3])
+    state.record_response(TRANSCRIPT[3], 3)
+
+    state.sync(transcript)
+
+    assert snapshot(state) == snapshot(ConversationState.from_messages(transcript))
+
+
+def test_truncated_transcript_rebuilds():
+    state = ConversationState.from_messages(TRANSCRIPT)
+
+    state.sync(TRANSCRIPT[:2])
+
+    assert snapshot(state) == snapshot(ConversationState.from_messages(TRANSCRIPT[:2]))
+    assert not state.in_ordering_process
+
+
+def test_router_keeps_state_in_step_with_the_transcript():
+    router = RouterAgent(client=FakeBedrockRuntime(latency_ms=0, latency_distribution="fixed"))
+    state = ConversationState()
+    messages = []
+    for text in ("What are your opening hours?", "I want to order 2 Peace Lily", "What do you sell?"):
+        messages.append(user(text))
+        messages.append(router.process_message(messages, state=state))
+
+    state.sync(messages)
+
+    assert snapshot(state) == snapshot(ConversationState.from_messages(messages))
+    assert state.messages_seen == len(messages)
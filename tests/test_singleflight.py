@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import pytest
+from python_code.api.agents.singleflight import SingleFlight
+
+
+def test_cancelled_follower_does_not_affect_leader_or_other_followers():
+    flight = SingleFlight()
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "answer"
+
+        leader = asyncio.create_task(flight.do_async("key", call))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(flight.do_async("key", call))
+        follower = asyncio.create_task(flight.do_async("key", call))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await leader == ("answer", False)
+        assert await follower == ("answer", True)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+
+    asyncio.run(scenario())
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_leader_interrupt_releases_sync_followers():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def interrupted():
+        started.set()
+        release.wait()
+        raise KeyboardInterrupt
+
+    def leader():
+        try:
+            flight.do("key", interrupted)
+        except KeyboardInterrupt:
+            pass
+
+    def follower():
+        try:
+            flight.do("key", lambda: "unused")
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    started.wait()
+    follower_thread = threading.Thread(target=follower)
+    follower_thread.start()
+    while flight.coalesced == 0:
+        pass
+    release.set()
+    leader_thread.join(5)
+    follower_thread.join(5)
+
+    assert not follower_thread.is_alive()
+    assert len(errors) == 1
@@ -0,0 +1,30 @@
+import json
+from python_code.api.agents.tracing import JsonLinesExporter, Tracer
+
+
+def test_stages_shared_by_agents_are_reported_per_agent():
+    tracer = Tracer()
+    with tracer.span("retrieve", agent="details_agent"):
+        pass
+    with tracer.span("load_cart", agent="order_taking_agent"):
+        pass
+    with tracer.span("llm_call"):
+        pass
+
+    assert set(tracer.stats()) == {"retrieve/details_agent", "load_cart/order_taking_agent", "llm_call"}
+
+
+def test_exporter_keeps_one_file_open(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    exporter = JsonLinesExporter(str(path))
+    tracer = Tracer(exporter=exporter)
+    with tracer.span("process_message"):
+        with tracer.span("guard"):
+            pass
+        opened = exporter._file
+    assert opened is not None and exporter._file is opened
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [record["name"] for record in records] == ["guard", "process_message"]
+    assert records[0]["parent_id"] == records[1]["span_id"]
+    exporter.close()
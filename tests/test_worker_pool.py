@@ -0,0 +1,32 @@
+import time
+import pytest
+from python_code.api.worker_pool import WorkerPool
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setenv("BEDROCK_RUNTIME", "fake")
+    monkeypatch.setenv("FAKE_BEDROCK_LATENCY_MS", "1000")
+    monkeypatch.setenv("FAKE_BEDROCK_LATENCY_DISTRIBUTION", "fixed")
+    pool = WorkerPool(workers=1, check_interval=0.1)
+    yield pool
+    pool.shutdown(drain=False, timeout=5)
+
+
+def test_killed_worker_fails_its_request_and_pool_keeps_serving(pool):
+    slot = pool._slots[0]
+    in_flight = pool.submit("session-1", "add 2 peace lily").future
+    time.sleep(0.3)
+    slot.process.kill()
+    slot.process.join()
+    # Dispatched before the supervisor notices: held for the replacement
+    held = pool.submit("session-1", "add 2 peace lily").future
+
+    with pytest.raises(RuntimeError, match="exited"):
+        in_flight.result(timeout=10)
+    assert held.result(timeout=60)["role"] == "assistant"
+
+    worker = pool.stats()[0]
+    assert worker["alive"] and worker["crashes"] == 1
+    assert worker["active"] == 0 and worker["errors"] == 1
+    assert pool._wait_idle(slot, timeout=1)